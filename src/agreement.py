@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from constants import BDA_DAMAGE_CLASSES, BDA_DAMAGE_CLASS_CODES, OBSCURED
+from utils import get_aligned_label_codes
+
+def chi_squared_tests_from_counts(tables):
+    # Batched scipy.stats.chi2_contingency over (n tables, n labels, 2 sources) count tables, after dropping the
+    # labels neither source uses, including Yates' correction for tables left with one degree of freedom.
+    from scipy.stats import chi2
+
+    tables = np.asarray(tables, dtype=float)
+    used = tables.sum(axis=2) > 0
+    dof = np.maximum(used.sum(axis=1) - 1, 0)
+    totals = tables.sum(axis=(1, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = tables.sum(axis=2, keepdims=True) * tables.sum(axis=1, keepdims=True) / totals[:, None, None]
+        difference = expected - tables
+        yates = (dof == 1)[:, None, None]
+        observed = np.where(yates, tables + np.minimum(0.5, np.abs(difference)) * np.sign(difference), tables)
+        terms = np.where(used[:, :, None], (observed - expected) ** 2 / expected, 0.0)
+    statistics = terms.sum(axis=(1, 2))
+    return np.where(dof > 0, chi2.sf(statistics, np.maximum(dof, 1)), 1.0)
+
+class AgreementCounts:
+    # Confusion matrices of every unordered pair of K label sources (e.g. sUAS and the view selection strategies)
+    # over the buildings they share, counted from one stacked (K, n buildings) label code array with a single
+    # bincount. Can be updated chunk by chunk, so it also works when the labels are streamed. As in
+    # chi_squared_test, comparisons ignore the buildings where the second source of a pair is obscured, so the
+    # reference source (sUAS) should come first.
+    def __init__(self, names):
+        self.names = list(names)
+        self.first, self.second = np.triu_indices(len(self.names), 1)
+        n_labels = len(BDA_DAMAGE_CLASSES)
+        self.confusion = np.zeros((len(self.first), n_labels, n_labels), dtype=np.int64)
+        self.n_buildings = 0
+
+    @classmethod
+    def from_labels(cls, sources):
+        # sources is {name: id -> label}, only the buildings labeled by every source are counted.
+        counts = cls(sources.keys())
+        _, codes = get_aligned_label_codes(*sources.values())
+        counts.update(np.stack(codes))
+        return counts
+
+    def update(self, codes, sign=1):
+        # codes is a (K, n buildings) array of label codes, one row per source in the order of names. sign=-1
+        # removes buildings that were counted before, e.g. when their labels change.
+        codes = np.asarray(codes, dtype=np.int64).reshape(len(self.names), -1)
+        n_labels = len(BDA_DAMAGE_CLASSES)
+        pair_offsets = np.arange(len(self.first))[:, None] * n_labels * n_labels
+        flat = (pair_offsets + codes[self.first] * n_labels + codes[self.second]).ravel()
+        self.confusion += sign * np.bincount(flat, minlength=self.confusion.size).reshape(self.confusion.shape)
+        self.n_buildings += sign * codes.shape[1]
+
+    def get_confusion(self, name_1, name_2, ignore_obscured=True):
+        # (label of name_1, label of name_2) counts, without the buildings name_2 sees as obscured.
+        i, j = self.names.index(name_1), self.names.index(name_2)
+        if i < j:
+            confusion = self.confusion[np.flatnonzero((self.first == i) & (self.second == j))[0]].copy()
+        else:
+            confusion = self.confusion[np.flatnonzero((self.first == j) & (self.second == i))[0]].T.copy()
+        if ignore_obscured:
+            confusion[:, BDA_DAMAGE_CLASS_CODES[OBSCURED]] = 0
+        return confusion
+
+    def get_label_counts(self, name_1, name_2, ignore_obscured=True):
+        confusion = self.get_confusion(name_1, name_2, ignore_obscured)
+        return confusion.sum(axis=1), confusion.sum(axis=0)
+
+    def get_pair_table(self, ignore_obscured=True, correction="holm", names=None):
+        # One row per unordered pair (of names, by default all sources): the compared buildings, the probability
+        # of disagreement and the chi squared p-value of the two label distributions, raw and corrected for the
+        # number of pairs (any statsmodels multipletests method).
+        from statsmodels.stats.multitest import multipletests
+
+        pairs = np.arange(len(self.first))
+        if names is not None:
+            codes = [self.names.index(name) for name in names]
+            pairs = pairs[np.isin(self.first, codes) & np.isin(self.second, codes)]
+        first, second = self.first[pairs], self.second[pairs]
+        confusion = self.confusion[pairs]
+        if ignore_obscured:
+            confusion[:, :, BDA_DAMAGE_CLASS_CODES[OBSCURED]] = 0
+        n = confusion.sum(axis=(1, 2))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            disagreement = (n - np.trace(confusion, axis1=1, axis2=2)) / n
+        p_values = chi_squared_tests_from_counts(np.stack([confusion.sum(axis=2), confusion.sum(axis=1)], axis=2))
+        corrected = multipletests(p_values, method=correction)[1] if len(p_values) else p_values
+        return pd.DataFrame({"source_1": [self.names[i] for i in first], "source_2": [self.names[j] for j in second],
+                             "n": n, "disagreement_probability": disagreement, "chi_squared_p": p_values, "chi_squared_p_corrected": corrected})
@@ -1,44 +1,59 @@
 from collections import defaultdict
 
-from scipy.stats import chi2_contingency, ttest_ind
-from statsmodels.stats.proportion import proportions_ztest
+import numpy as np
 
-from constants import NO_DAMAGE, MINOR_DAMAGE, MAJOR_DAMAGE, DESTROYED, UNCLASSIFIED, OBSCURED, EVENT, FILENAME, SOURCE
+from constants import BDA_DAMAGE_CLASSES, BDA_DAMAGE_CLASS_CODES, NO_DAMAGE, MINOR_DAMAGE, MAJOR_DAMAGE, DESTROYED, UNCLASSIFIED, OBSCURED
+from utils import as_building_index, as_multiview_index, get_aligned_label_codes, get_obscured_mask, get_label_counts
 
-def chi_squared_test(suas_labels, sat_labels, ignore_sat_obscured):
-    suas_label_counts = defaultdict(lambda: 0)
-    sat_label_counts = defaultdict(lambda: 0)
-    for suas_label, sat_label in zip(suas_labels.values(), sat_labels.values()):
-        if (ignore_sat_obscured and sat_label != OBSCURED) or not ignore_sat_obscured:
-            suas_label_counts[suas_label] += 1
-            sat_label_counts[sat_label] += 1
+def get_paired_label_counts(suas_labels, sat_labels, ignore_sat_obscured):
+    # Label counts of both sources over the buildings they share, paired by building id.
+    _, (suas_codes, sat_codes) = get_aligned_label_codes(suas_labels, sat_labels)
+    mask = get_obscured_mask(sat_codes, ignore_sat_obscured)
+    return get_label_counts(suas_codes, mask), get_label_counts(sat_codes, mask)
+
+def get_confusion_matrix(suas_labels, sat_labels):
+    # Buildings labeled by both sources, counted per (sUAS label code, satellite label code). Every statistic
+    # below can be computed from it, so it is all that has to be kept per strategy when the labels do not fit in memory.
+    _, (suas_codes, sat_codes) = get_aligned_label_codes(suas_labels, sat_labels)
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    return np.bincount(suas_codes.astype(np.int64) * n_labels + sat_codes, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+
+def get_label_counts_from_confusion(confusion, ignore_sat_obscured):
+    if ignore_sat_obscured:
+        confusion = confusion.copy()
+        confusion[:, BDA_DAMAGE_CLASS_CODES[OBSCURED]] = 0
+    return confusion.sum(axis=1), confusion.sum(axis=0)
 
-    data = []
-    for label in set(list(suas_label_counts.keys()) + list(sat_label_counts.keys())):
-        data.append([suas_label_counts[label], sat_label_counts[label]])
+# scipy and statsmodels are imported by the tests that use them, the counting functions do not need them.
+def chi_squared_test_from_counts(suas_label_counts, sat_label_counts):
+    from scipy.stats import chi2_contingency
+
+    data = np.stack([suas_label_counts, sat_label_counts], axis=1)
+    data = data[data.sum(axis=1) > 0]
 
     _, p, _, _ = chi2_contingency(data)
 
     return float(p)
 
-def z_test_per_label(suas_labels, sat_labels, ignore_sat_obscured):
-    p_values = {}
+def chi_squared_test(suas_labels, sat_labels, ignore_sat_obscured):
+    return chi_squared_test_from_counts(*get_paired_label_counts(suas_labels, sat_labels, ignore_sat_obscured))
 
-    suas_label_counts = defaultdict(lambda: 0)
-    sat_label_counts = defaultdict(lambda: 0)
-    for suas_label, sat_label in zip(suas_labels.values(), sat_labels.values()):
-        if (ignore_sat_obscured and sat_label != OBSCURED) or not ignore_sat_obscured:
-            suas_label_counts[suas_label] += 1
-            sat_label_counts[sat_label] += 1
+def z_test_per_label(suas_labels, sat_labels, ignore_sat_obscured):
+    suas_label_counts, sat_label_counts = get_paired_label_counts(suas_labels, sat_labels, ignore_sat_obscured)
+    return z_test_per_label_from_counts(suas_label_counts, sat_label_counts, [len(suas_labels), len(sat_labels)])
 
-    n_observations = [len(suas_labels), len(sat_labels)]
+def z_test_per_label_from_counts(suas_label_counts, sat_label_counts, n_observations):
+    from statsmodels.stats.proportion import proportions_ztest
 
+    p_values = {}
     for label in [NO_DAMAGE, MINOR_DAMAGE, MAJOR_DAMAGE, DESTROYED, UNCLASSIFIED]:
-        data = [suas_label_counts[label], sat_label_counts[label]]
+        code = BDA_DAMAGE_CLASS_CODES[label]
+        data = [int(suas_label_counts[code]), int(sat_label_counts[code])]
         p_values[label] = float(proportions_ztest(data, n_observations)[1])
     return p_values
 
 def get_coincident_buildings_per_ortho(valid_ids, suas_data):
+    valid_ids = as_building_index(valid_ids)
     file_to_coincident_count = {}
     for filename, data in suas_data.items():
         file_to_coincident_count[filename] = 0
@@ -48,6 +63,7 @@ def get_coincident_buildings_per_ortho(valid_ids, suas_data):
     return file_to_coincident_count
 
 def get_satellite_building_counts(satellite_data, valid_ids):
+    valid_ids = as_building_index(valid_ids)
     view_count = 0
     for data in satellite_data:
         for building in data:
@@ -55,33 +71,31 @@ def get_satellite_building_counts(satellite_data, valid_ids):
                 view_count += 1
     return view_count
 
-def get_building_count_per_disaster(buildings_per_ortho, multiview_df):
+def get_building_count_per_disaster(buildings_per_ortho, multiview_index):
+    multiview_index = as_multiview_index(multiview_index)
     buildings_per_disaster = defaultdict(lambda:0)
     for ortho, count in buildings_per_ortho.items():
-        event = multiview_df[multiview_df[FILENAME] == ortho][EVENT].iloc[0]
+        event = multiview_index.event(ortho)
         if count > 0:
             buildings_per_disaster[event] += count
     return dict(buildings_per_disaster)
 
-def get_ortho_count_per_disaster(buildings_per_ortho, multiview_df, source):
+def get_ortho_count_per_disaster(buildings_per_ortho, multiview_index, source):
+    multiview_index = as_multiview_index(multiview_index)
     orthos_per_disaster = defaultdict(lambda:0)
     for ortho, count in buildings_per_ortho.items():
-        row = multiview_df[multiview_df[FILENAME] == ortho]
-        event = row[EVENT].iloc[0]
-        ortho_source = row[SOURCE].iloc[0]
+        event = multiview_index.event(ortho)
+        ortho_source = multiview_index.source(ortho)
         if source == ortho_source and count > 0:
             orthos_per_disaster[event] += 1
     return dict(orthos_per_disaster)
 
 def get_underestimation_rate(suas_labels, sat_labels, ignore_sat_obscured):
-    suas_label_counts = defaultdict(lambda: 0)
-    sat_label_counts = defaultdict(lambda: 0)
-    for suas_label, sat_label in zip(suas_labels.values(), sat_labels.values()):
-        if (ignore_sat_obscured and sat_label != OBSCURED) or not ignore_sat_obscured:
-            suas_label_counts[suas_label] += 1
-            sat_label_counts[sat_label] += 1
+    return get_underestimation_rate_from_counts(*get_paired_label_counts(suas_labels, sat_labels, ignore_sat_obscured))
 
+def get_underestimation_rate_from_counts(suas_label_counts, sat_label_counts):
     result = {}
-    for label in set(list(suas_label_counts.keys()) + list(sat_label_counts.keys())):
-        result[label] = (suas_label_counts[label]/sat_label_counts[label]) - 1.0
+    for label, suas_count, sat_count in zip(BDA_DAMAGE_CLASSES, suas_label_counts.tolist(), sat_label_counts.tolist()):
+        if suas_count > 0 or sat_count > 0:
+            result[label] = (suas_count/sat_count) - 1.0
     return result
@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+import inspect
+import subprocess
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from synthetic_data import make_synthetic_dataset
+from utils import remove_obscured_labels, get_intersecting_ids, get_class_counts_from_ids, MultiviewIndex
+from analysis import chi_squared_test, z_test_per_label, get_underestimation_rate
+from replicate import get_probability_of_disagreement, compute_paired_difference_views, group_buildings_temporally
+from strategies import STRATEGIES, PAPER_STRATEGIES, select_views, get_strategies
+from strategy_cache import StrategyCache
+from sensitivity import run_sensitivity_sweep
+from view_table import ViewTable
+
+# The make_synthetic_dataset parameter every --scale option varies, all others keep their default.
+SCALE_PARAMETERS = {"buildings": "n_buildings", "views": "max_views", "dates": "n_dates", "events": "n_events"}
+DEFAULT_SIZES = {"buildings": [1000, 10000, 100000], "views": [1, 2, 4, 8], "dates": [2, 4, 8, 16], "events": [1, 4, 16]}
+
+def prepare_inputs(suas_data, satellite_data, multiview_df):
+    # Everything the benchmarked functions take as input, computed once per dataset so that every benchmark only
+    # times its own function.
+    inputs = {"suas_data": list(suas_data.values()), "satellite_data": list(satellite_data.values()), "multiview_index": MultiviewIndex(multiview_df)}
+    inputs["non_obscured_sat_data"] = remove_obscured_labels(inputs["satellite_data"])
+    inputs["valid_ids"] = get_intersecting_ids(inputs["suas_data"], inputs["non_obscured_sat_data"])
+    inputs["suas_labels"], inputs["sat_labels"] = select_views(inputs["suas_data"], inputs["non_obscured_sat_data"], inputs["valid_ids"], get_strategies(["oracle"]))["oracle"]
+    inputs["temporal_views"] = group_buildings_temporally(inputs["non_obscured_sat_data"], inputs["multiview_index"])
+    inputs["view_table"] = ViewTable.from_annotations(inputs["non_obscured_sat_data"], inputs["multiview_index"])
+    return inputs
+
+def get_strategy_benchmark(names):
+    return lambda inputs: select_views(inputs["suas_data"], inputs["non_obscured_sat_data"], inputs["valid_ids"], get_strategies(names), inputs["multiview_index"])
+
+def run_strategy_sweep(inputs, cache=None):
+    # Every registered strategy with and without ignore_lone_unclassified, one select_views call per combination
+    # or, given a strategy_cache.StrategyCache, from candidate views gathered once.
+    for ignore_lone_unclassified in [True, False]:
+        for name in STRATEGIES:
+            strategies = get_strategies([name], ignore_lone_unclassified)
+            if cache is None:
+                select_views(inputs["suas_data"], inputs["non_obscured_sat_data"], inputs["valid_ids"], strategies, inputs["multiview_index"])
+            else:
+                cache.select_views("benchmark", inputs["suas_data"], inputs["non_obscured_sat_data"], inputs["valid_ids"], strategies, inputs["multiview_index"])
+
+BENCHMARKS = {
+    "remove_obscured_labels": lambda inputs: remove_obscured_labels(inputs["satellite_data"]),
+    "get_intersecting_ids": lambda inputs: get_intersecting_ids(inputs["suas_data"], inputs["non_obscured_sat_data"]),
+    "group_buildings_temporally": lambda inputs: group_buildings_temporally(inputs["non_obscured_sat_data"], inputs["multiview_index"]),
+    "compute_paired_difference_views": lambda inputs: compute_paired_difference_views(inputs["temporal_views"], "days"),
+    "get_class_counts_from_ids": lambda inputs: get_class_counts_from_ids(inputs["sat_labels"], True),
+    "chi_squared_test": lambda inputs: chi_squared_test(inputs["suas_labels"], inputs["sat_labels"], True),
+    "z_test_per_label": lambda inputs: z_test_per_label(inputs["suas_labels"], inputs["sat_labels"], True),
+    "get_probability_of_disagreement": lambda inputs: get_probability_of_disagreement(inputs["suas_labels"], inputs["sat_labels"], True),
+    "get_underestimation_rate": lambda inputs: get_underestimation_rate(inputs["suas_labels"], inputs["sat_labels"], True),
+    "paper_strategies": get_strategy_benchmark(PAPER_STRATEGIES),
+    "run_sensitivity_sweep": lambda inputs: run_sensitivity_sweep(inputs["temporal_views"]),
+    "strategy_sweep": lambda inputs: run_strategy_sweep(inputs),
+    "strategy_sweep_cached": lambda inputs: run_strategy_sweep(inputs, StrategyCache()),
+    "view_table": lambda inputs: ViewTable.from_annotations(inputs["non_obscured_sat_data"], inputs["multiview_index"]),
+    "view_table:paper_strategies": lambda inputs: inputs["view_table"].select_views(inputs["suas_data"], inputs["valid_ids"], get_strategies(PAPER_STRATEGIES)),
+    "view_table:compute_paired_difference_views": lambda inputs: compute_paired_difference_views(inputs["view_table"], "days"),
+    "view_table:run_sensitivity_sweep": lambda inputs: run_sensitivity_sweep(inputs["view_table"]),
+}
+for strategy_name in STRATEGIES:
+    BENCHMARKS["strategy:" + strategy_name] = get_strategy_benchmark([strategy_name])
+
+# Entry points whose startup (interpreter, imports and argument parsing, but no work) is timed with --startup,
+# next to a bare interpreter as the reference.
+STARTUP_COMMANDS = {
+    "python": ["-c", "pass"],
+    "cli": ["cli.py", "--help"],
+    "cli counts": ["cli.py", "counts", "--help"],
+    "main.py": ["main.py", "--help"],
+    "make_metadata_files.py": ["make_metadata_files.py", "--help"],
+    "import main": ["-c", "import main"],
+}
+
+# Heavy or optional dependencies that only the functions using them import, --startup fails when importing main
+# loads any of them.
+LAZY_MODULES = ["matplotlib", "scipy", "statsmodels", "sklearn", "shapely"]
+
+def get_eager_imports(module="main", lazy_modules=LAZY_MODULES):
+    # The lazy_modules a fresh interpreter has loaded after importing module.
+    code = "import sys, " + module + "; print(' '.join(name for name in " + repr(lazy_modules) + " if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+def time_startup(command, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def run_startup_benchmarks(names=None, repeats=3):
+    # Same columns as run_benchmarks, so that the startup times can be compared to a baseline the same way.
+    if names is None:
+        names = list(STARTUP_COMMANDS.keys())
+    rows = []
+    for name in names:
+        rows.append({"benchmark": "startup:" + name, "scale": "startup", "size": 0, "n_buildings": 0, "n_views": 0, "seconds": time_startup(STARTUP_COMMANDS[name], repeats)})
+    return pd.DataFrame(rows)
+
+def time_benchmark(benchmark, inputs, repeats=3):
+    # Best of repeats, the least noisy estimate of the cost of the function itself.
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        benchmark(inputs)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def get_dataset_kwargs(scale, size, sizes, dataset_kwargs):
+    # The make_synthetic_dataset arguments of one size. make_synthetic_dataset sees every building at most once per
+    # date, so when the views are scaled there are at least max(sizes) dates, otherwise the larger sizes all give
+    # the same dataset.
+    dataset_kwargs = dict(dataset_kwargs)
+    dataset_kwargs[SCALE_PARAMETERS[scale]] = size
+    if scale == "views":
+        default_n_dates = inspect.signature(make_synthetic_dataset).parameters["n_dates"].default
+        dataset_kwargs["n_dates"] = max(dataset_kwargs.get("n_dates", default_n_dates), max(sizes))
+    return dataset_kwargs
+
+def run_benchmarks(scale="buildings", sizes=None, names=None, repeats=3, seed=0, **dataset_kwargs):
+    # Times every benchmark on synthetic datasets where only the scale parameter changes. Returns one row per
+    # (benchmark, size) with the dataset's building and view counts.
+    if sizes is None:
+        sizes = DEFAULT_SIZES[scale]
+    if names is None:
+        names = list(BENCHMARKS.keys())
+    rows = []
+    for size in sizes:
+        suas_data, satellite_data, multiview_df = make_synthetic_dataset(seed=seed, **get_dataset_kwargs(scale, size, sizes, dataset_kwargs))
+        inputs = prepare_inputs(suas_data, satellite_data, multiview_df)
+        n_buildings = len(inputs["valid_ids"])
+        n_views = sum(len(data) for data in inputs["satellite_data"])
+        print("Benchmarking", scale, "=", size, "(" + str(n_buildings), "buildings,", n_views, "views)")
+        for name in names:
+            seconds = time_benchmark(BENCHMARKS[name], inputs, repeats)
+            rows.append({"benchmark": name, "scale": scale, "size": size, "n_buildings": n_buildings, "n_views": n_views, "seconds": seconds})
+    return pd.DataFrame(rows)
+
+def get_scaling_exponents(timings):
+    # Slope of log(seconds) over log(size) per benchmark, 1 is linear scaling and 2 quadratic.
+    exponents = {}
+    for name, rows in timings.groupby("benchmark", sort=False):
+        rows = rows[(rows["seconds"] > 0) & (rows["size"] > 0)]
+        exponents[name] = np.polyfit(np.log(rows["size"]), np.log(rows["seconds"]), 1)[0] if rows["size"].nunique() > 1 else np.nan
+    return exponents
+
+def compare_to_baseline(timings, baseline, tolerance):
+    # The (benchmark, size) pairs that became more than tolerance (relative) slower than in the baseline.
+    merged = timings.merge(baseline, on=["benchmark", "scale", "size"], suffixes=("", "_baseline"))
+    merged["slowdown"] = merged["seconds"] / merged["seconds_baseline"]
+    return merged[merged["slowdown"] > 1.0 + tolerance]
+
+def plot_scaling_curves(timings, plot_folder, fig_format="png"):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    scale = timings["scale"].iloc[0]
+    fig, ax = plt.subplots(figsize=(10, 7))
+    for name, rows in timings.groupby("benchmark", sort=False):
+        ax.plot(rows["size"], rows["seconds"], marker="o", label=name)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel(SCALE_PARAMETERS[scale])
+    ax.set_ylabel("seconds (best of repeats)")
+    ax.legend(fontsize="small", ncol=2)
+    fig.tight_layout()
+    path = os.path.join(plot_folder, "benchmark_scaling_" + scale + "." + fig_format)
+    print("Saving", path)
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="benchmark", description="This program times the replication pipeline on synthetic datasets of increasing size.")
+    parser.add_argument("--scale", type=str, default="buildings", choices=list(SCALE_PARAMETERS.keys()), help="The dataset dimension to scale, every other dimension keeps its default.")
+    parser.add_argument("--sizes", type=str, default=None, help="Comma separated values of the scaled dimension.")
+    parser.add_argument("--benchmarks", type=str, default=None, help="Comma separated subset of: " + ", ".join(BENCHMARKS.keys()) + ".")
+    parser.add_argument("--n_buildings", type=int, default=10000, help="The number of buildings when buildings are not the scaled dimension.")
+    parser.add_argument("--repeats", type=int, default=3, help="The number of times every benchmark is run, the fastest run is reported.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the synthetic data.")
+    parser.add_argument("--output_folder_path", type=str, default=None, help="Where to save the timings csv and the scaling curves.")
+    parser.add_argument("--baseline", type=str, default=None, help="A timings csv of a previous run, any benchmark more than --tolerance slower fails the run.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="The allowed relative slowdown against --baseline.")
+    parser.add_argument("--startup", action="store_true", help="Time the startup of the entry points instead, --benchmarks selects among: " + ", ".join(STARTUP_COMMANDS.keys()) + ".")
+    args = parser.parse_args()
+
+    sizes = None if args.sizes is None else [int(size) for size in args.sizes.split(",")]
+    names = None if args.benchmarks is None else [name.strip() for name in args.benchmarks.split(",")]
+    if args.startup:
+        timings = run_startup_benchmarks(names, args.repeats)
+        print("\n\nStartup seconds per command (best of " + str(args.repeats) + "):")
+        print(timings[["benchmark", "seconds"]].to_string(index=False, float_format=lambda value: "%.3f" % value))
+        eager_imports = get_eager_imports()
+        print("\n\nLazy modules loaded by import main:", ", ".join(eager_imports) if eager_imports else "None")
+    else:
+        dataset_kwargs = {} if args.scale == "buildings" else {"n_buildings": args.n_buildings}
+        timings = run_benchmarks(args.scale, sizes, names, args.repeats, args.seed, **dataset_kwargs)
+
+        print("\n\nSeconds per benchmark (best of " + str(args.repeats) + "):")
+        print(timings.pivot(index="benchmark", columns="size", values="seconds").reindex(timings["benchmark"].unique()).to_string(float_format=lambda value: "%.5f" % value))
+        print("\n\nScaling exponent per benchmark (1 = linear):")
+        for name, exponent in get_scaling_exponents(timings).items():
+            print("\t", name, "%.2f" % exponent)
+
+    if args.output_folder_path is not None:
+        os.makedirs(args.output_folder_path, exist_ok=True)
+        timings_path = os.path.join(args.output_folder_path, "benchmark_" + timings["scale"].iloc[0] + ".csv")
+        print("\n\nSaving", timings_path)
+        timings.to_csv(timings_path, index=False)
+        if not args.startup:
+            plot_scaling_curves(timings, args.output_folder_path)
+
+    if args.baseline is not None:
+        regressions = compare_to_baseline(timings, pd.read_csv(args.baseline), args.tolerance)
+        if len(regressions) > 0:
+            print("\n\nRegressions against", args.baseline)
+            print(regressions[["benchmark", "size", "seconds_baseline", "seconds", "slowdown"]].to_string(index=False))
+            sys.exit(1)
+        print("\n\nNo regressions against", args.baseline)
+
+    if args.startup and eager_imports:
+        sys.exit(1)
\ No newline at end of file
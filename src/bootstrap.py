@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from constants import BDA_DAMAGE_CLASSES
+from utils import get_aligned_label_codes, get_obscured_mask
+
+# Upper bound on the number of elements of one (resamples x units) index matrix, which keeps each chunk at a few
+# hundred MB no matter how many resamples are requested.
+MAX_CHUNK_ELEMENTS = 2 ** 24
+
+def get_unit_statistics(suas_codes, sat_codes, cluster_codes=None):
+    # Per building (or, given cluster_codes, per cluster) sums that every statistic can be computed from:
+    # [n disagreeing, n buildings, sUAS count per label..., satellite count per label...]
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    n_buildings = len(suas_codes)
+    statistics = np.zeros((n_buildings, 2 + 2 * n_labels))
+    statistics[:, 0] = suas_codes != sat_codes
+    statistics[:, 1] = 1
+    statistics[np.arange(n_buildings), 2 + suas_codes] = 1
+    statistics[np.arange(n_buildings), 2 + n_labels + sat_codes] = 1
+    if cluster_codes is None:
+        return statistics
+
+    n_clusters = int(cluster_codes.max()) + 1 if len(cluster_codes) else 0
+    return np.stack([np.bincount(cluster_codes, weights=statistics[:, i], minlength=n_clusters) for i in range(statistics.shape[1])], axis=1)
+
+def get_statistics_from_sums(sums):
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        disagreement = sums[:, 0] / sums[:, 1]
+        underestimation = sums[:, 2:2 + n_labels] / sums[:, 2 + n_labels:] - 1.0
+    return disagreement, underestimation
+
+def resample_sums(unit_statistics, seeds):
+    # Draws one resample of the units with replacement per seed into one index matrix, turns it into per-unit
+    # weights with a single offset bincount and sums the unit statistics with one matrix product.
+    n_resamples = len(seeds)
+    n_units = len(unit_statistics)
+    indices = np.zeros((n_resamples, n_units), dtype=np.int64)
+    for row, seed in enumerate(seeds):
+        indices[row] = np.random.default_rng(seed).integers(0, n_units, size=n_units)
+    indices += n_units * np.arange(n_resamples)[:, None]
+    weights = np.bincount(indices.ravel(), minlength=n_resamples * n_units).reshape(n_resamples, n_units)
+    return weights @ unit_statistics
+
+def get_chunk_sizes(n_resamples, n_units, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = MAX_CHUNK_ELEMENTS // max(n_units, 1)
+    chunk_size = max(1, min(chunk_size, n_resamples))
+    return [chunk_size] * (n_resamples // chunk_size) + ([n_resamples % chunk_size] if n_resamples % chunk_size else [])
+
+def bootstrap_sums(unit_statistics, n_resamples, seed=0, chunk_size=None, executor=None):
+    # Every resample has its own seed spawned from seed, so the results only depend on seed, not on the chunking
+    # or on whether the chunks run serially or in a process pool.
+    chunk_sizes = get_chunk_sizes(n_resamples, len(unit_statistics), chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_resamples)
+    offsets = np.cumsum([0] + chunk_sizes)
+    chunk_seeds = [seeds[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+    map_function = map if executor is None else executor.map
+    return np.concatenate(list(map_function(resample_sums, [unit_statistics] * len(chunk_sizes), chunk_seeds)))
+
+def get_interval(estimate, resampled, confidence):
+    alpha = (1.0 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        low, high = np.nanpercentile(np.where(np.isfinite(resampled), resampled, np.nan), [100 * alpha, 100 * (1 - alpha)])
+    return {"estimate": float(estimate), "low": float(low), "high": float(high)}
+
+def bootstrap_agreement(suas_labels, sat_labels, n_resamples=1000, clusters=None, ignore_sat_obscured=True, confidence=0.95, seed=0, chunk_size=None, executor=None):
+    # Bootstrap confidence intervals of the probability of disagreement and the per label under-estimation rate.
+    # Resamples buildings, or whole clusters (e.g. orthomosaics) when clusters maps building id -> cluster.
+    building_index, (suas_codes, sat_codes) = get_aligned_label_codes(suas_labels, sat_labels)
+    mask = get_obscured_mask(sat_codes, ignore_sat_obscured)
+    suas_codes = suas_codes[mask]
+    sat_codes = sat_codes[mask]
+
+    cluster_codes = None
+    if clusters is not None:
+        building_clusters = [clusters[building_index[position]] for position in np.flatnonzero(mask)]
+        cluster_names = {cluster: code for code, cluster in enumerate(dict.fromkeys(building_clusters))}
+        cluster_codes = np.array([cluster_names[cluster] for cluster in building_clusters], dtype=np.int64)
+
+    unit_statistics = get_unit_statistics(suas_codes, sat_codes, cluster_codes)
+    disagreement, underestimation = get_statistics_from_sums(unit_statistics.sum(axis=0, keepdims=True))
+    resampled_disagreement, resampled_underestimation = get_statistics_from_sums(bootstrap_sums(unit_statistics, n_resamples, seed, chunk_size, executor))
+
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    totals = unit_statistics.sum(axis=0)
+    result = {"n_buildings": len(suas_codes), "n_units": len(unit_statistics),
+              "disagreement": get_interval(disagreement[0], resampled_disagreement, confidence), "underestimation": {}}
+    for code, label in enumerate(BDA_DAMAGE_CLASSES):
+        if totals[2 + code] > 0 or totals[2 + n_labels + code] > 0:
+            result["underestimation"][label] = get_interval(underestimation[0, code], resampled_underestimation[:, code], confidence)
+    return result
+
+def bootstrap_strategies(strategy_results, n_resamples=1000, clusters=None, groups=None, ignore_sat_obscured=True, confidence=0.95, seed=0, chunk_size=None, workers=1):
+    # Runs bootstrap_agreement for every strategy over all buildings and, when groups maps building id -> group
+    # (e.g. disaster event), for every group separately. Returns {(strategy, group or None): result}.
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = {}
+    try:
+        for name, (suas_labels, sat_labels) in strategy_results.items():
+            results[(name, None)] = bootstrap_agreement(suas_labels, sat_labels, n_resamples, clusters, ignore_sat_obscured, confidence, seed, chunk_size, executor)
+            if groups is None:
+                continue
+            for group in sorted(set(groups[bld_id] for bld_id in sat_labels if bld_id in groups), key=str):
+                group_suas_labels = {bld_id: label for bld_id, label in suas_labels.items() if groups.get(bld_id) == group}
+                group_sat_labels = {bld_id: label for bld_id, label in sat_labels.items() if groups.get(bld_id) == group}
+                results[(name, group)] = bootstrap_agreement(group_suas_labels, group_sat_labels, n_resamples, clusters, ignore_sat_obscured, confidence, seed, chunk_size, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+def permutation_test_disagreement(suas_labels, sat_labels_a, sat_labels_b, n_permutations=10000, ignore_sat_obscured=True, seed=0, chunk_size=None):
+    # Paired permutation test of the difference in disagreement rate between two view selection strategies,
+    # randomly swapping the two strategies' labels per building. Returns (observed difference, two sided p-value).
+    _, (suas_codes, sat_codes_a, sat_codes_b) = get_aligned_label_codes(suas_labels, sat_labels_a, sat_labels_b)
+    mask = get_obscured_mask(sat_codes_a, ignore_sat_obscured) & get_obscured_mask(sat_codes_b, ignore_sat_obscured)
+    differences = (suas_codes[mask] != sat_codes_a[mask]).astype(float) - (suas_codes[mask] != sat_codes_b[mask]).astype(float)
+    observed = differences.mean()
+
+    rng = np.random.default_rng(seed)
+    n_extreme = 0
+    for size in get_chunk_sizes(n_permutations, len(differences), chunk_size):
+        signs = rng.integers(0, 2, size=(size, len(differences))) * 2 - 1
+        n_extreme += int(np.count_nonzero(np.abs(signs @ differences / len(differences)) >= abs(observed) - 1e-12))
+    return float(observed), (n_extreme + 1) / (n_permutations + 1)
@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+
+from constants import FILENAME
+
+META_FILE = "building_table.json"
+
+def encode_strings(strings):
+    # Packs strings into one utf-8 byte buffer plus an offsets array, so they can be saved and memory-mapped as .npy.
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def decode_strings(buffer, offsets):
+    raw = np.asarray(buffer).tobytes()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+def encode_categorical(values, categories=None):
+    category_codes = {category: code for code, category in enumerate(categories or [])}
+    codes = np.fromiter((category_codes.setdefault(value, len(category_codes)) for value in values), dtype=np.int32, count=len(values))
+    return codes, list(category_codes)
+
+class BuildingTable:
+    # A normalized, columnar copy of an {ortho: [building, ...]} annotation dict. Orthos, labels and filenames are
+    # stored as int32 codes into a category list, ids and view properties (as JSON) as packed utf-8 strings.
+    def __init__(self, columns, categories):
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.columns["ortho"])
+
+    @classmethod
+    def from_annotations(cls, data_by_ortho):
+        orthos, ids, labels, filenames, view_properties = [], [], [], [], []
+        for ortho, buildings in data_by_ortho.items():
+            for building in buildings:
+                orthos.append(ortho)
+                ids.append(building["id"])
+                labels.append(building["label"])
+                filenames.append(building.get(FILENAME))
+                view_properties.append(json.dumps(building["view_properties"]) if "view_properties" in building else "")
+
+        columns = {}
+        categories = {}
+        columns["ortho"], categories["ortho"] = encode_categorical(orthos, list(data_by_ortho.keys()))
+        columns["label"], categories["label"] = encode_categorical(labels)
+        columns[FILENAME], categories[FILENAME] = encode_categorical(filenames)
+        columns["id_buffer"], columns["id_offsets"] = encode_strings(ids)
+        columns["view_properties_buffer"], columns["view_properties_offsets"] = encode_strings(view_properties)
+        return cls(columns, categories)
+
+    def get_ids(self):
+        return decode_strings(self.columns["id_buffer"], self.columns["id_offsets"])
+
+    def get_labels(self):
+        return [self.categories["label"][code] for code in self.columns["label"].tolist()]
+
+    def to_annotations(self):
+        data_by_ortho = {ortho: [] for ortho in self.categories["ortho"]}
+        orthos = self.categories["ortho"]
+        labels = self.categories["label"]
+        filenames = self.categories[FILENAME]
+        view_properties = decode_strings(self.columns["view_properties_buffer"], self.columns["view_properties_offsets"])
+        rows = zip(self.columns["ortho"].tolist(), self.get_ids(), self.columns["label"].tolist(), self.columns[FILENAME].tolist(), view_properties)
+        for ortho_code, bld_id, label_code, filename_code, properties in rows:
+            building = {"id": bld_id, "label": labels[label_code]}
+            if filenames[filename_code] is not None:
+                building[FILENAME] = filenames[filename_code]
+            if properties:
+                building["view_properties"] = json.loads(properties)
+            data_by_ortho[orthos[ortho_code]].append(building)
+        return data_by_ortho
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(os.path.join(directory, name + ".npy"), column)
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump({"columns": list(self.columns.keys()), "categories": self.categories}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, META_FILE), "r") as f:
+            meta = json.load(f)
+        columns = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None) for name in meta["columns"]}
+        return cls(columns, meta["categories"])
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import shutil
+
+from building_table import BuildingTable
+
+MANIFEST_FILE = "dataset_cache.json"
+
+def get_file_signature(path):
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except (OSError, TypeError):
+        return [path, None, None]
+
+def get_dataset_fingerprint(path_map_files, extra_files=(), extra_values=()):
+    # Hash of the path map contents plus the path, mtime and size of every file they point to, so that any
+    # change to a path map, an annotation file or an extra input (e.g. the multiview csv) yields a new key.
+    # extra_values are settings that change the loaded data, such as how building ids are matched.
+    digest = hashlib.sha256()
+    if extra_values:
+        digest.update(json.dumps(list(extra_values)).encode("utf-8"))
+    for path_map_file in path_map_files:
+        with open(path_map_file, "rb") as f:
+            content = f.read()
+        digest.update(content)
+        for ortho, annotation_path in json.loads(content).items():
+            digest.update(json.dumps([ortho] + get_file_signature(annotation_path)).encode("utf-8"))
+    for extra_file in extra_files:
+        digest.update(json.dumps(get_file_signature(extra_file)).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cached_dataset(cache_dir, fingerprint, mmap=True):
+    # Returns ({name: BuildingTable}, extra metadata) for a cached fingerprint, or None on a cache miss.
+    entry_dir = os.path.join(cache_dir, fingerprint)
+    manifest_path = os.path.join(entry_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    tables = {name: BuildingTable.load(os.path.join(entry_dir, name), mmap) for name in manifest["tables"]}
+    return tables, manifest["metadata"]
+
+def save_cached_dataset(cache_dir, fingerprint, tables, metadata):
+    # Written to a temporary directory first and renamed into place, so an interrupted run never leaves a
+    # half written entry behind that a later run would treat as a hit.
+    entry_dir = os.path.join(cache_dir, fingerprint)
+    tmp_dir = entry_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    for name, table in tables.items():
+        table.save(os.path.join(tmp_dir, name))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump({"tables": list(tables.keys()), "metadata": metadata}, f)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
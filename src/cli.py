@@ -0,0 +1,55 @@
+import argparse
+
+# Every subcommand imports the modules it needs when it runs, so that e.g. counts never loads scipy, statsmodels,
+# sklearn or matplotlib, and the help of the CLI does not load anything.
+
+# Subcommand -> the main.py stages it runs (with the stages they depend on), in memory and with --out_of_core.
+PIPELINE_COMMANDS = {
+    "counts": (["counts"], ["store_counts"]),
+    "strategies": (["strategies"], ["store_strategies"]),
+    "tests": (["tests"], ["store_tests"]),
+    "plots": (["plots"], None),
+}
+COMMANDS = ["build-metadata", "compare"] + list(PIPELINE_COMMANDS.keys())
+
+def run_build_metadata(arguments):
+    import make_metadata_files
+    parser = argparse.ArgumentParser(prog="cli build-metadata", description="Produces the path maps and the multiview stats file of a CRASAR-U-DROIDs folder, like make_metadata_files.py.")
+    make_metadata_files.add_arguments(parser)
+    make_metadata_files.run(parser.parse_args(arguments))
+
+def run_compare(arguments):
+    import compare
+    parser = argparse.ArgumentParser(prog="cli compare", description="Compares the agreement metrics of several revisions of the dataset, like compare.py.")
+    compare.add_arguments(parser)
+    compare.run(parser.parse_args(arguments), parser)
+
+def run_pipeline_command(command, arguments):
+    import main
+    parser = argparse.ArgumentParser(prog="cli " + command, description="Runs the " + command + " of main.py, reusing the persisted output of the stages it depends on.")
+    main.add_arguments(parser)
+    args = parser.parse_args(arguments)
+    if args.stages is not None:
+        parser.error("--stages is set by the subcommand")
+    stages, out_of_core_stages = PIPELINE_COMMANDS[command]
+    if args.out_of_core:
+        if out_of_core_stages is None:
+            parser.error(command + " is not available with --out_of_core")
+        stages = out_of_core_stages
+    args.stages = ",".join(stages)
+    args.no_plots = args.no_plots and command != "plots"
+    main.run(args, parser)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="cli", description="This program runs one step of the replication at a time: build-metadata (make_metadata_files.py), compare (compare.py), or the counts, strategies, tests or plots of main.py.")
+    parser.add_argument("command", choices=COMMANDS, help="The step to run, see cli <command> --help for its arguments.")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="The arguments of the command.")
+    args = parser.parse_args()
+
+    if args.command == "build-metadata":
+        run_build_metadata(args.arguments)
+    elif args.command == "compare":
+        run_compare(args.arguments)
+    else:
+        run_pipeline_command(args.command, args.arguments)
@@ -0,0 +1,185 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from loader import load_annotations, SharedAnnotationLoader
+from utils import remove_obscured_labels, get_intersecting_ids, MultiviewIndex
+from strategies import PAPER_STRATEGIES, get_strategies
+from view_table import ViewTable
+from replicate import compute_paired_difference_views
+from stratify import get_metric_rows
+from results import Results
+
+METRIC_KEYS = ["strategy", "metric", "label"]
+
+def load_revision(shared_loader, name, drone_path_map, satellite_path_map, multiview_stats_file_path, workers=8):
+    # (suas_data, satellite_data, multiview_index) of one revision, loaded through shared_loader. Like main.py, a
+    # sUAS file that fails to load raises and a satellite file that fails to load is skipped.
+    print("\n\nLoading revision", name)
+    multiview_index = MultiviewIndex(pd.read_csv(multiview_stats_file_path))
+    suas_data, suas_load_report = load_annotations(json.load(open(drone_path_map)), "sUAS", workers, on_error="raise", shared_loader=shared_loader)
+    suas_load_report.print_summary()
+    satellite_data, satellite_load_report = load_annotations(json.load(open(satellite_path_map)), "Satellite", workers, on_error="skip", shared_loader=shared_loader)
+    satellite_load_report.print_summary()
+    return suas_data, satellite_data, multiview_index
+
+def load_revisions(revisions, workers=8):
+    # revisions is [(name, drone path map, satellite path map, multiview stats csv), ...]. Returns
+    # {name: (suas_data, satellite_data, multiview_index)} and the SharedAnnotationLoader, which parsed every
+    # annotation file the revisions have in common once.
+    shared_loader = SharedAnnotationLoader()
+    datasets = {revision[0]: load_revision(shared_loader, *revision, workers) for revision in revisions}
+    return datasets, shared_loader
+
+def analyze_revision(revision, suas_data, satellite_data, multiview_index, strategy_names):
+    # The counts, the stratify.get_metric_rows suite of every strategy and the paired view disagreement of one
+    # revision, plus the labels of sUAS and of every strategy per coincident building.
+    non_obscured_sat_data = remove_obscured_labels(list(satellite_data.values()))
+    valid_ids = get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
+    views = ViewTable.from_annotations(non_obscured_sat_data, multiview_index, fields=())
+    strategy_results = views.select_views(list(suas_data.values()), valid_ids, get_strategies(strategy_names))
+
+    rows = [{"strategy": None, "metric": "coincident_buildings", "label": None, "value": len(valid_ids), "n": len(valid_ids)},
+            {"strategy": None, "metric": "coincident_views", "label": None, "value": int(views.get_views_per_building(valid_ids).sum()), "n": len(valid_ids)}]
+    if len(valid_ids) > 0:
+        rows += get_metric_rows(strategy_results)
+    agree_dist, disagree_dist = compute_paired_difference_views(views, "days")
+    n_pairs = len(agree_dist) + len(disagree_dist)
+    rows.append({"strategy": None, "metric": "paired_view_disagreement_probability", "label": None, "value": len(disagree_dist) / n_pairs if n_pairs else float("nan"), "n": n_pairs})
+    for row in rows:
+        row["revision"] = revision
+
+    labels = {"sUAS": strategy_results[strategy_names[0]][0] if strategy_names else {}}
+    labels.update({name: sat_labels for name, (_, sat_labels) in strategy_results.items()})
+    return rows, labels
+
+def analyze_revision_files(revision, strategy_names, loader_workers=8):
+    # Loads and analyzes one revision in a worker process. Only the paths of the revision are sent to the worker,
+    # which loads them through its own SharedAnnotationLoader. Also returns its (n annotation files, n parsed).
+    shared_loader = SharedAnnotationLoader()
+    rows, labels = analyze_revision(revision[0], *load_revision(shared_loader, *revision, loader_workers), strategy_names)
+    return rows, labels, (shared_loader.n_files, shared_loader.n_parsed)
+
+def analyze_revisions(revisions, strategy_names=PAPER_STRATEGIES, workers=1, loader_workers=8):
+    # analyze_revision for every revision of load_revisions' revisions. With workers > 1 and more than two
+    # revisions, every revision is loaded and analyzed in a worker process of its own, so no parsed annotations are
+    # pickled. Otherwise they are loaded in this process through one SharedAnnotationLoader, which parses the
+    # files they have in common once, and analyzed in turn. Returns the tidy metrics of all revisions,
+    # {revision: labels} and the (n annotation files, n parsed) of the loading.
+    names = [revision[0] for revision in revisions]
+    if workers > 1 and len(revisions) > 2:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            analyzed = list(executor.map(analyze_revision_files, revisions, [list(strategy_names)] * len(revisions), [loader_workers] * len(revisions)))
+        load_counts = tuple(map(sum, zip(*[counts for _, _, counts in analyzed])))
+        analyzed = [(rows, labels) for rows, labels, _ in analyzed]
+    else:
+        datasets, shared_loader = load_revisions(revisions, loader_workers)
+        analyzed = [analyze_revision(name, *datasets[name], list(strategy_names)) for name in names]
+        load_counts = (shared_loader.n_files, shared_loader.n_parsed)
+
+    metrics = pd.DataFrame([row for rows, _ in analyzed for row in rows], columns=["revision", "strategy", "metric", "label", "value", "n"])
+    return metrics, {name: labels for name, (_, labels) in zip(names, analyzed)}, load_counts
+
+def get_metric_shifts(metrics, revisions):
+    # One row per metric and pair of consecutive revisions with its value in both and the change. Metrics only one
+    # of the two revisions has (e.g. the z-test of a label that disappeared) have a NaN value in the other.
+    keyed = metrics.assign(**{key: metrics[key].fillna("") for key in METRIC_KEYS})
+    shifts = []
+    for before, after in zip(revisions[:-1], revisions[1:]):
+        pair = keyed[keyed["revision"] == before].merge(keyed[keyed["revision"] == after], on=METRIC_KEYS, how="outer", suffixes=("_before", "_after"), sort=False)
+        pair["revision_before"], pair["revision_after"] = before, after
+        pair["change"] = pair["value_after"] - pair["value_before"]
+        shifts.append(pair[["revision_before", "revision_after"] + METRIC_KEYS + ["value_before", "value_after", "change", "n_before", "n_after"]])
+    return pd.concat(shifts, ignore_index=True)
+
+def get_label_changes(labels_before, labels_after):
+    # (source, id, change, label before, label after) of every building whose sUAS or selected satellite label
+    # differs between two revisions. change is "label" for a building coincident in both, "became_coincident" or
+    # "no_longer_coincident" (with a None label) for a building coincident in only one of them.
+    rows = []
+    for source in labels_after:
+        before, after = labels_before.get(source, {}), labels_after[source]
+        for bld_id in sorted(set(before.keys()) | set(after.keys())):
+            if bld_id not in before:
+                change = "became_coincident"
+            elif bld_id not in after:
+                change = "no_longer_coincident"
+            elif before[bld_id] != after[bld_id]:
+                change = "label"
+            else:
+                continue
+            rows.append({"source": source, "id": bld_id, "change": change, "label_before": before.get(bld_id), "label_after": after.get(bld_id)})
+    return rows
+
+def get_all_label_changes(labels, revisions):
+    changes = []
+    for before, after in zip(revisions[:-1], revisions[1:]):
+        for row in get_label_changes(labels[before], labels[after]):
+            changes.append({"revision_before": before, "revision_after": after, **row})
+    return pd.DataFrame(changes, columns=["revision_before", "revision_after", "source", "id", "change", "label_before", "label_after"])
+
+def report_comparison(results, metrics, shifts, label_changes, revisions):
+    print("\n\nWhat is the Probability of Disagreement for the different view selection strategies in every revision?")
+    disagreement = metrics[metrics["metric"] == "disagreement_probability"].pivot(index="strategy", columns="revision", values="value")
+    print(disagreement.reindex(columns=revisions).to_string())
+
+    print("\n\nHow did the Probability of Disagreement shift between the revisions?")
+    for row in shifts[shifts["metric"] == "disagreement_probability"].itertuples():
+        print("\t", row.strategy, row.revision_before, "->", row.revision_after, row.value_before, "->", row.value_after, "change", results.add("disagreement_probability_change", row.change, row.strategy, "sUAS",
+              revision_before=row.revision_before, revision_after=row.revision_after, value_before=row.value_before, value_after=row.value_after))
+    for row in shifts[shifts["metric"].isin(["coincident_buildings", "coincident_views", "paired_view_disagreement_probability"])].itertuples():
+        print("\t", row.metric, row.revision_before, "->", row.revision_after, row.value_before, "->", row.value_after, "change", results.add(row.metric + "_change", row.change,
+              revision_before=row.revision_before, revision_after=row.revision_after, value_before=row.value_before, value_after=row.value_after))
+
+    print("\n\nWhich buildings changed label between the revisions?")
+    is_label_change = label_changes["change"] == "label"
+    counts = label_changes[is_label_change].groupby(["revision_before", "revision_after", "source"], sort=False).size()
+    for (before, after, source), n_changed in counts.items():
+        print("\t", source, before, "->", after, results.add("changed_labels", n_changed, source, revision_before=before, revision_after=after), "buildings")
+    if len(counts) == 0:
+        print("\tNone")
+
+    # Every source has a row per building that became or stopped being coincident, they are counted once.
+    print("\n\nWhich buildings became or stopped being coincident between the revisions?")
+    counts = label_changes[~is_label_change].groupby(["revision_before", "revision_after", "change"], sort=False)["id"].nunique()
+    for (before, after, change), n_changed in counts.items():
+        print("\t", change, before, "->", after, results.add("coincidence_changes", n_changed, label=change, revision_before=before, revision_after=after), "buildings")
+    if len(counts) == 0:
+        print("\tNone")
+
+def add_arguments(parser):
+    parser.add_argument("--revision", type=str, nargs=4, action="append", required=True, metavar=("NAME", "DRONE_PATH_MAP", "SATELLITE_PATH_MAP", "MULTIVIEW_STATS_FILE"),
+                        help="A dataset revision: its name, its suas and satellite annotation path maps and its multiview information. Given once per revision, in order.")
+    parser.add_argument("--output_folder_path", type=str, help="The path to the output folder file.")
+    parser.add_argument("--loader_workers", type=int, default=8, help="The number of threads used to load the annotation files.")
+    parser.add_argument("--revision_workers", type=int, default=4, help="The number of processes that load the revisions and compute their metrics, with more than two revisions. Two revisions are compared in this process.")
+
+def run(args, parser):
+    revisions = [name for name, _, _, _ in args.revision]
+    if len(revisions) < 2 or len(set(revisions)) != len(revisions):
+        parser.error("--revision needs at least two revisions with distinct names")
+    os.makedirs(args.output_folder_path, exist_ok=True)
+
+    metrics, labels, (n_files, n_parsed) = analyze_revisions(args.revision, workers=args.revision_workers, loader_workers=args.loader_workers)
+    print("\n\nParsed", n_parsed, "of the", n_files, "annotation files of", len(revisions), "revisions, the others had the content of a file already parsed")
+    shifts = get_metric_shifts(metrics, revisions)
+    label_changes = get_all_label_changes(labels, revisions)
+
+    results = Results({"revisions": args.revision})
+    results.add_frame(metrics, comparison="sUAS")
+    report_comparison(results, metrics, shifts, label_changes, revisions)
+
+    paths = {"revision_metrics.csv": metrics, "revision_metric_shifts.csv": shifts, "revision_label_changes.csv": label_changes}
+    for filename, frame in paths.items():
+        frame.to_csv(os.path.join(args.output_folder_path, filename), index=False)
+    saved_paths = [os.path.join(args.output_folder_path, filename) for filename in paths] + results.save(args.output_folder_path)
+    print("\n\nSaving the comparison at", ", ".join(saved_paths))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="compare", description="This program compares the agreement metrics of several revisions of the dataset: which buildings changed label and how the metrics of every strategy shifted.")
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
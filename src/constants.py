@@ -6,6 +6,14 @@ UNCLASSIFIED = "un-classified"
 OBSCURED = "Obscured"
 BDA_DAMAGE_CLASSES = [NO_DAMAGE, MINOR_DAMAGE, MAJOR_DAMAGE, DESTROYED, UNCLASSIFIED, OBSCURED]
 
+# Integer codes used by the array backed label store, one per entry of BDA_DAMAGE_CLASSES.
+BDA_DAMAGE_CLASS_CODES = {label: code for code, label in enumerate(BDA_DAMAGE_CLASSES)}
+BDA_DAMAGE_CLASS_CODES[OBSCURED.lower()] = BDA_DAMAGE_CLASS_CODES[OBSCURED]
+MISSING_LABEL_CODE = -1
+
+# Lower case label -> canonical label, labels are normalized to their canonical case once when they are loaded.
+CANONICAL_LABELS = {label.lower(): label for label in BDA_DAMAGE_CLASSES}
+
 DAYS_AFTER_SUAS_ORTHO = "days_after_suas_ortho"
 PRE_OR_POST_EVENT = "Pre/Post Event"
 DATE = "Date (mm/dd/yyyy)"
@@ -13,4 +21,9 @@ FILENAME = "filename"
 EVENT = "Event"
 SOURCE = "Source"
 
+# The building footprint field of the annotation files, a ring of longitude/latitude points, and the ways
+# geometry.match_footprints pairs footprints.
+GEOMETRY_FIELD = "EPSG:4326"
+MATCH_METHODS = ["centroid", "iou"]
+
 EXCLUDED_FILENAMES = ["090403-Lancaster-Canyon-Gate.geo.tif"]
\ No newline at end of file
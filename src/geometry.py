@@ -0,0 +1,190 @@
+import numpy as np
+
+from constants import GEOMETRY_FIELD, MATCH_METHODS
+# Prefixed to the ids of satellite buildings no sUAS footprint matches, so they cannot pair with a sUAS id.
+UNMATCHED_ID_PREFIX = "satellite:"
+
+# Upper bound on the number of (candidate pair x vertex) elements processed at once by the numpy fallback.
+MAX_CHUNK_ELEMENTS = 2 ** 24
+
+def import_shapely():
+    # shapely is optional and slow to import, it is only imported once footprints are matched. None when it is
+    # not installed.
+    try:
+        import shapely
+    except ImportError:
+        return None
+    return shapely
+
+def get_point(point):
+    if isinstance(point, dict):
+        if "lon" in point:
+            return float(point["lon"]), float(point["lat"])
+        return float(point["x"]), float(point["y"])
+    return float(point[0]), float(point[1])
+
+def get_ring(geometry):
+    # Accepts a list of {"lon", "lat"} / {"x", "y"} points or [x, y] pairs, or a GeoJSON style polygon (the outer
+    # ring is used). Returns an (n, 2) array, empty when the building has no usable footprint.
+    if isinstance(geometry, dict):
+        geometry = geometry.get("coordinates", [[]])[0]
+    if not geometry:
+        return np.zeros((0, 2))
+    return np.array([get_point(point) for point in geometry], dtype=float)
+
+class Footprints:
+    # The footprints of a flat list of buildings as one padded (n, max vertices, 2) array. Rings are padded by
+    # repeating their last vertex, which adds zero length edges that change neither containment nor area.
+    def __init__(self, rings):
+        self.n_vertices = np.array([len(ring) for ring in rings], dtype=np.int64)
+        max_vertices = max(int(self.n_vertices.max()) if len(rings) else 0, 1)
+        self.vertices = np.zeros((len(rings), max_vertices, 2))
+        for i, ring in enumerate(rings):
+            if len(ring):
+                self.vertices[i, :len(ring)] = ring
+                self.vertices[i, len(ring):] = ring[-1]
+        self.valid = self.n_vertices >= 3
+        self.bounds = np.concatenate([self.vertices.min(axis=1), self.vertices.max(axis=1)], axis=1)
+
+    def __len__(self):
+        return len(self.n_vertices)
+
+    @classmethod
+    def from_buildings(cls, buildings, field=GEOMETRY_FIELD):
+        return cls([get_ring(building.get(field)) for building in buildings])
+
+    def get_centroids(self):
+        # Area weighted polygon centroids, the vertex mean for degenerate rings.
+        x, y = self.vertices[:, :, 0], self.vertices[:, :, 1]
+        x_next, y_next = np.roll(x, -1, axis=1), np.roll(y, -1, axis=1)
+        cross = x * y_next - x_next * y
+        area = cross.sum(axis=1) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centroids = np.stack([((x + x_next) * cross).sum(axis=1), ((y + y_next) * cross).sum(axis=1)], axis=1) / (6 * area[:, None])
+        degenerate = ~np.isfinite(centroids).all(axis=1) | (np.abs(area) == 0)
+        centroids[degenerate] = self.vertices[degenerate].mean(axis=1)
+        return centroids
+
+    def to_shapely(self):
+        # Footprints with fewer than 3 vertices become None, which shapely's predicates and STRtree skip.
+        polygons = np.full(len(self), None, dtype=object)
+        if self.vertices.shape[1] >= 3:
+            polygons[self.valid] = import_shapely().polygons(self.vertices[self.valid])
+        return polygons
+
+def points_in_polygons(points, vertices):
+    # Even-odd ray casting of points[i] against the polygon vertices[i], vectorized over all pairs.
+    x, y = points[:, 0:1], points[:, 1:2]
+    xi, yi = vertices[:, :, 0], vertices[:, :, 1]
+    xj, yj = np.roll(xi, 1, axis=1), np.roll(yi, 1, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crosses = ((yi > y) != (yj > y)) & (x < (xj - xi) * (y - yi) / (yj - yi) + xi)
+    return np.count_nonzero(crosses, axis=1) % 2 == 1
+
+def get_grid_candidates(points, bounds, cell_size):
+    # (point, polygon) pairs whose grid cells overlap, i.e. every polygon whose bounding box may contain the point.
+    # Each polygon is registered in all cells its bounding box covers, then points are joined to cells by sorting.
+    origin = bounds[:, :2].min(axis=0)
+    low = np.floor((bounds[:, :2] - origin) / cell_size).astype(np.int64)
+    high = np.floor((bounds[:, 2:] - origin) / cell_size).astype(np.int64)
+    span = high - low + 1
+    n_cells = span[:, 0] * span[:, 1]
+    polygon_ids = np.repeat(np.arange(len(bounds)), n_cells)
+    local = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    cell_x = low[polygon_ids, 0] + local % span[polygon_ids, 0]
+    cell_y = low[polygon_ids, 1] + local // span[polygon_ids, 0]
+    width = int(high[:, 0].max()) + 2
+    polygon_cells = cell_y * width + cell_x
+    order = np.argsort(polygon_cells, kind="stable")
+    polygon_cells, polygon_ids = polygon_cells[order], polygon_ids[order]
+
+    point_cells_xy = np.floor((points - origin) / cell_size).astype(np.int64)
+    inside = (point_cells_xy >= 0).all(axis=1) & (point_cells_xy[:, 0] < width)
+    point_cells = point_cells_xy[:, 1] * width + point_cells_xy[:, 0]
+    starts = np.searchsorted(polygon_cells, point_cells, side="left")
+    ends = np.searchsorted(polygon_cells, point_cells, side="right")
+    counts = np.where(inside, ends - starts, 0)
+    point_ids = np.repeat(np.arange(len(points)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return point_ids, polygon_ids[np.repeat(starts, counts) + offsets]
+
+def match_centroids_grid(query, target):
+    # For every query footprint, the target footprints that contain its centroid, using a uniform grid over the
+    # target bounding boxes (cell size: the median target extent) and chunked vectorized ray casting.
+    centroids = query.get_centroids()
+    target_ids = np.flatnonzero(target.valid)
+    if len(target_ids) == 0 or len(query) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    bounds = target.bounds[target_ids]
+    extent = np.median(np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1]))
+    cell_size = extent if extent > 0 else 1.0
+    point_ids, candidate_ids = get_grid_candidates(centroids, bounds, cell_size)
+    candidate_ids = target_ids[candidate_ids]
+
+    chunk = max(1, MAX_CHUNK_ELEMENTS // target.vertices.shape[1])
+    keep = np.zeros(len(point_ids), dtype=bool)
+    for start in range(0, len(point_ids), chunk):
+        stop = start + chunk
+        keep[start:stop] = points_in_polygons(centroids[point_ids[start:stop]], target.vertices[candidate_ids[start:stop]])
+    return point_ids[keep], candidate_ids[keep]
+
+def match_footprints(query, target, method="centroid", iou_threshold=0.5, use_shapely=None):
+    # Returns an array with, for every query footprint, the index of its matching target footprint or -1.
+    # method="centroid" matches a target that contains the query's centroid, method="iou" the target with the
+    # largest intersection over union, if at least iou_threshold. Uses a shapely STRtree when shapely is installed,
+    # otherwise a numpy grid index (centroid matching only).
+    shapely = import_shapely()
+    if use_shapely is None:
+        use_shapely = shapely is not None
+    if use_shapely and shapely is None:
+        raise ImportError("Matching footprints with shapely requires shapely to be installed")
+    if method not in MATCH_METHODS:
+        raise ValueError("Unknown geometry match method '" + str(method) + "', expected one of " + str(MATCH_METHODS))
+
+    scores = None
+    if use_shapely:
+        target_polygons = target.to_shapely()
+        tree = shapely.STRtree(target_polygons)
+        if method == "centroid":
+            query_ids, target_ids = tree.query(shapely.points(query.get_centroids()), predicate="within")
+        else:
+            query_polygons = query.to_shapely()
+            query_ids, target_ids = tree.query(query_polygons, predicate="intersects")
+            intersection = shapely.area(shapely.intersection(query_polygons[query_ids], target_polygons[target_ids]))
+            union = shapely.area(query_polygons[query_ids]) + shapely.area(target_polygons[target_ids]) - intersection
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(union > 0, intersection / union, 0.0)
+            keep = scores >= iou_threshold
+            query_ids, target_ids, scores = query_ids[keep], target_ids[keep], scores[keep]
+    elif method == "centroid":
+        query_ids, target_ids = match_centroids_grid(query, target)
+    else:
+        raise ImportError("IoU matching requires shapely, install it or use the centroid method")
+
+    # One target per query footprint: the best scoring one, or the first in target order for centroid matches.
+    if scores is None:
+        scores = -target_ids.astype(float)
+    order = np.lexsort((-scores, query_ids))
+    query_ids, target_ids = query_ids[order], target_ids[order]
+    first = np.ones(len(query_ids), dtype=bool)
+    first[1:] = query_ids[1:] != query_ids[:-1]
+    matches = np.full(len(query), -1, dtype=np.int64)
+    matches[query_ids[first]] = target_ids[first]
+    return matches
+
+def remap_building_ids(suas_data, satellite_data, method="centroid", iou_threshold=0.5, field=GEOMETRY_FIELD, use_shapely=None):
+    # Gives every satellite building the id of the sUAS building its footprint matches, in place, so that the id
+    # based pipeline pairs them. Unmatched satellite buildings get their id prefixed with UNMATCHED_ID_PREFIX, their
+    # original id may be the id of an unrelated sUAS building. The footprints are dropped from both sources
+    # afterwards. Returns the number of matched satellite buildings.
+    suas_buildings = [building for data in suas_data.values() for building in data]
+    satellite_buildings = [building for data in satellite_data.values() for building in data]
+    matches = match_footprints(Footprints.from_buildings(satellite_buildings, field), Footprints.from_buildings(suas_buildings, field), method, iou_threshold, use_shapely)
+    for building, match in zip(satellite_buildings, matches.tolist()):
+        if match >= 0:
+            building["id"] = suas_buildings[match]["id"]
+        else:
+            building["id"] = UNMATCHED_ID_PREFIX + str(building["id"])
+    for building in suas_buildings + satellite_buildings:
+        building.pop(field, None)
+    return int(np.count_nonzero(matches >= 0))
@@ -0,0 +1,260 @@
+import os
+import time
+import pickle
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from constants import OBSCURED, UNCLASSIFIED, DATE, EVENT, SOURCE
+from utils import encode_label, MultiviewIndex
+from loader import load_annotation_file
+from strategies import PAPER_STRATEGIES, get_strategies
+from agreement import AgreementCounts
+from results import Results
+from report import report_counts, report_strategy_tests, report_paired_views
+from make_metadata_files import scan_annotation_files, index_statistics, make_file_record, is_excluded_file, match_satellite_to_suas, days_between
+
+def get_paired_view_counts(views, ignore_unclassified=True):
+    # (n agreeing, n disagreeing) pairs of one building's non obscured (temporal group, label) views, in load
+    # order: like replicate.compute_paired_difference_views, every view is paired with the building's last view
+    # in each later group.
+    last_labels = {group: label for group, label in views}
+    n_agree, n_disagree = 0, 0
+    for group, label in views:
+        if ignore_unclassified and label == UNCLASSIFIED:
+            continue
+        for other_group, other_label in last_labels.items():
+            if other_group > group and not (ignore_unclassified and other_label == UNCLASSIFIED):
+                if label == other_label:
+                    n_agree += 1
+                else:
+                    n_disagree += 1
+    return n_agree, n_disagree
+
+class IncrementalAggregator:
+    # Keeps every aggregate main.py reports (the coincident building counts, the AgreementCounts of sUAS and the
+    # view selection strategies, and the paired view agree/disagree tallies) up to date as annotation files are
+    # ingested one at a time. Only the (ortho, label, days) views of every building are kept. Ingesting a file
+    # retracts the contribution of the buildings it contains and adds their recomputed contribution back, so it
+    # costs time proportional to the file, and the aggregates equal a batch run of main.py with path maps in the
+    # order the files were ingested. A file ingested again replaces its previous views, which then count as the
+    # newest views of their buildings, while the temporal groups keep the order they first appeared in.
+    def __init__(self, multiview_index=None, strategy_names=PAPER_STRATEGIES):
+        self.multiview_index = MultiviewIndex.from_records({}) if multiview_index is None else multiview_index
+        self.strategy_names = list(strategy_names)
+        self.strategies = get_strategies(self.strategy_names)
+        self.buildings = {}
+        self.ortho_buildings = {}
+        self.coincident_per_ortho = {"suas": {}, "satellite": {}}
+        self.n_coincident_views = 0
+        self.agreement = AgreementCounts(["sUAS"] + self.strategy_names)
+        # Temporal groups are numbered in order of first appearance, like group_buildings_temporally's dict keys.
+        self.groups = {}
+        self.n_agree, self.n_disagree = 0, 0
+
+    def __getstate__(self):
+        # The strategies are rebuilt from their names, some of them hold lambdas that cannot be pickled.
+        state = dict(self.__dict__)
+        del state["strategies"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.strategies = get_strategies(self.strategy_names)
+
+    def ingest(self, kind, ortho, buildings):
+        # kind is "suas" or "satellite", satellite orthos need their days after the sUAS ortho in the multiview index.
+        days = self.multiview_index.days_after_suas(ortho) if kind == "satellite" else None
+        touched = set(self.ortho_buildings.get((kind, ortho), ()))
+        for bld_id in touched:
+            state = self.buildings[bld_id]
+            state[kind] = [view for view in state[kind] if view[0] != ortho]
+
+        self.coincident_per_ortho[kind].setdefault(ortho, 0)
+        for building in buildings:
+            bld_id = building["id"]
+            state = self.buildings.setdefault(bld_id, {"suas": [], "satellite": [], "contribution": None})
+            if kind == "satellite" and building["label"] != OBSCURED:
+                self.groups.setdefault(days, len(self.groups))
+            state[kind].append((ortho, building["label"], days))
+            touched.add(bld_id)
+        self.ortho_buildings[(kind, ortho)] = set(building["id"] for building in buildings)
+
+        previous = [self.buildings[bld_id]["contribution"] for bld_id in touched]
+        current = []
+        for bld_id in touched:
+            state = self.buildings[bld_id]
+            state["contribution"] = self.get_contribution(state)
+            current.append(state["contribution"])
+        self.apply(previous, -1)
+        self.apply(current, 1)
+        return len(touched)
+
+    def get_contribution(self, state):
+        views = [(label, days) for _, label, days in state["satellite"] if label != OBSCURED]
+        contribution = {"pairs": get_paired_view_counts([(self.groups[days], label) for label, days in views]), "codes": None}
+        if not state["suas"] or not views:
+            return contribution
+
+        # A coincident building: the last sUAS view gives its label and every strategy runs over its non obscured views.
+        suas_label = state["suas"][-1][1]
+        codes = [encode_label(suas_label)]
+        for strategy in self.strategies.values():
+            strategy_state = None
+            for label, days in views:
+                strategy_state = strategy.update(strategy_state, label, suas_label, days)
+            codes.append(encode_label(strategy.finalize(strategy_state)))
+        contribution.update({"codes": codes, "n_views": len(views),
+                             "suas_orthos": [ortho for ortho, _, _ in state["suas"]], "satellite_orthos": [ortho for ortho, _, _ in state["satellite"]]})
+        return contribution
+
+    def apply(self, contributions, sign):
+        codes = []
+        for contribution in contributions:
+            if contribution is None:
+                continue
+            self.n_agree += sign * contribution["pairs"][0]
+            self.n_disagree += sign * contribution["pairs"][1]
+            if contribution["codes"] is None:
+                continue
+            codes.append(contribution["codes"])
+            self.n_coincident_views += sign * contribution["n_views"]
+            for kind in ["suas", "satellite"]:
+                for ortho in contribution[kind + "_orthos"]:
+                    self.coincident_per_ortho[kind][ortho] += sign
+        if codes:
+            self.agreement.update(np.array(codes).T, sign)
+
+    def report(self, results):
+        # Prints and records the same counts, tests and paired view disagreement as main.py's counts, tests and
+        # temporal stages.
+        report_counts(results, self.coincident_per_ortho["suas"], self.coincident_per_ortho["satellite"], self.n_coincident_views, self.multiview_index)
+        report_strategy_tests(results, self.agreement)
+        report_paired_views(results, self.n_agree, self.n_disagree)
+
+class FolderWatcher:
+    # Polls a CRASAR-U-DROIDs style folder (statistics.csv and sUAS/SATELLITE .tif.json annotation files) and feeds
+    # every new or changed post disaster annotation file to an IncrementalAggregator, with the metadata
+    # make_metadata_files.py would give it. Satellite files whose sUAS ortho has not arrived yet wait for it, and
+    # files that fail to load (e.g. while they are still being written) are retried on the next poll.
+    def __init__(self, crasar_u_droids_dir, aggregator=None, workers=8):
+        self.crasar_u_droids_dir = crasar_u_droids_dir
+        self.aggregator = IncrementalAggregator() if aggregator is None else aggregator
+        self.workers = workers
+        self.signatures = {}
+        self.statistics_signature = None
+        self.stats_index = None
+        self.suas_records = {}
+        self.pending = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["stats_index"] = None
+        state["statistics_signature"] = None
+        return state
+
+    def get_new_records(self):
+        statistics_path = os.path.join(self.crasar_u_droids_dir, "statistics.csv")
+        statistics_stat = os.stat(statistics_path)
+        statistics_signature = [statistics_stat.st_mtime_ns, statistics_stat.st_size]
+        if statistics_signature != self.statistics_signature:
+            self.stats_index = index_statistics(pd.read_csv(statistics_path))
+            self.statistics_signature = statistics_signature
+
+        records = []
+        for annotation_file in scan_annotation_files(self.crasar_u_droids_dir, self.workers):
+            path = os.path.join(annotation_file["root"], annotation_file["filename"])
+            signature = [annotation_file["mtime_ns"], annotation_file["size"]]
+            if self.signatures.get(path) == signature:
+                continue
+            if annotation_file["filename"].replace(".json", "") not in self.stats_index:
+                # Not in statistics.csv yet, picked up once it is.
+                continue
+            record = make_file_record(annotation_file, self.stats_index)
+            self.signatures[path] = signature
+            if record["is_post_disaster"] and not is_excluded_file(record["tif_name"]) and record["kind"] is not None:
+                record["signature"] = signature
+                records.append(record)
+        return records
+
+    def poll(self):
+        # Ingests everything that is new since the last poll, the sUAS files first so that the satellite files of
+        # the same poll find their sUAS ortho. Returns the number of ingested files.
+        records = self.get_new_records()
+        for record in records:
+            if record["kind"] == "satellite":
+                self.pending[record["tif_name"]] = record
+        n_ingested = 0
+        for record in [record for record in records if record["kind"] == "suas"]:
+            self.aggregator.multiview_index.add(record["tif_name"], 0, record[EVENT], record[SOURCE])
+            if self.ingest(record):
+                self.suas_records[record["tif_name"]] = record
+                n_ingested += 1
+
+        matches = match_satellite_to_suas(list(self.pending.keys()), list(self.suas_records.keys()))
+        for tif_name in list(self.pending.keys()):
+            if tif_name not in matches:
+                continue
+            record = self.pending.pop(tif_name)
+            suas_record = self.suas_records[matches[tif_name]]
+            self.aggregator.multiview_index.add(tif_name, days_between(suas_record[DATE], record[DATE]), record[EVENT], record[SOURCE])
+            if self.ingest(record):
+                n_ingested += 1
+        return n_ingested
+
+    def ingest(self, record):
+        buildings, seconds, error = load_annotation_file(record["path"])
+        if error is not None:
+            print("Could not load", record["path"], "(" + str(error) + "), retrying on the next poll")
+            del self.signatures[record["path"]]
+            return False
+        n_buildings = self.aggregator.ingest(record["kind"], record["tif_name"], buildings)
+        print("Ingested", record["path"], "updating", n_buildings, "buildings in", "%.3f" % seconds, "seconds of loading")
+        return True
+
+def save_state(path, watcher):
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(watcher, f)
+    os.replace(path + ".tmp", path)
+
+def load_state(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="incremental", description="This program watches a CRASAR-U-DROIDs folder and updates the counts, strategy tests and paired view disagreement of main.py as annotation files arrive.")
+    parser.add_argument("--crasar_u_droids_dir", type=str, help="The dataset folder to watch, as given to make_metadata_files.py.")
+    parser.add_argument("--output_folder_path", type=str, help="The folder the results are saved to after every update.")
+    parser.add_argument("--state_path", type=str, default=None, help="Where the aggregated state is persisted between runs, defaults to incremental_state.pkl in the output folder.")
+    parser.add_argument("--poll_seconds", type=float, default=30, help="The time between two scans of the folder.")
+    parser.add_argument("--once", action="store_true", help="Ingest the files that are new since the last run, report and exit instead of watching.")
+    parser.add_argument("--workers", type=int, default=8, help="The number of threads used to scan the dataset directory.")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_folder_path, exist_ok=True)
+    if args.state_path is None:
+        args.state_path = os.path.join(args.output_folder_path, "incremental_state.pkl")
+    if os.path.exists(args.state_path):
+        watcher = load_state(args.state_path)
+        watcher.crasar_u_droids_dir, watcher.workers = args.crasar_u_droids_dir, args.workers
+        print("Resuming from", args.state_path, "with", len(watcher.signatures), "known annotation files")
+    else:
+        watcher = FolderWatcher(args.crasar_u_droids_dir, workers=args.workers)
+
+    while True:
+        n_ingested = watcher.poll()
+        if n_ingested > 0:
+            save_state(args.state_path, watcher)
+            if watcher.pending:
+                print(len(watcher.pending), "satellite files are waiting for their sUAS orthomosaic")
+        if n_ingested > 0 and watcher.aggregator.agreement.n_buildings == 0:
+            print("No coincident buildings yet")
+        elif n_ingested > 0:
+            results = Results({"crasar_u_droids_dir": args.crasar_u_droids_dir, "n_annotation_files": len(watcher.signatures)})
+            watcher.aggregator.report(results)
+            print("\n\nSaving the results at", ", ".join(results.save(args.output_folder_path)))
+        if args.once:
+            break
+        time.sleep(args.poll_seconds)
@@ -0,0 +1,187 @@
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The coarse entry points that are timed, {module: [function, ...]}. Helpers called per building or per label (e.g.
+# utils.encode_label) are left out, the overhead of timing them would dominate what is measured.
+INSTRUMENTED_FUNCTIONS = {
+    "replicate": ["get_probability_of_disagreement", "get_probability_of_disagreement_from_confusion", "compute_paired_difference_views",
+                  "compute_paired_difference_views_multi", "group_buildings_temporally"],
+    "analysis": ["chi_squared_test", "chi_squared_test_from_counts", "z_test_per_label", "z_test_per_label_from_counts", "get_underestimation_rate",
+                 "get_underestimation_rate_from_counts", "get_coincident_buildings_per_ortho", "get_building_count_per_disaster", "get_ortho_count_per_disaster"],
+    "utils": ["get_intersecting_ids", "remove_obscured_labels", "get_view_mask", "get_class_counts_from_ids", "get_building_orthos"],
+    "plot": ["plot_transistion_matrix", "plot_mulistrategy_class_balances", "plot_views_per_building_histogram"],
+}
+
+def count_items(value):
+    # Annotations are either a list of buildings or a list (or dict) of per orthomosaic lists of buildings, the
+    # nested form is counted in views.
+    if isinstance(value, dict):
+        values = list(value.values())
+    elif isinstance(value, (list, tuple)):
+        values = value
+    else:
+        return len(value) if hasattr(value, "__len__") else None
+    if len(values) > 0 and all(isinstance(item, list) for item in values):
+        return sum(len(item) for item in values)
+    return len(values)
+
+def count_pairs(result):
+    agree_dist, disagree_dist = result
+    return len(agree_dist) + len(disagree_dist)
+
+# (unit, function(args, result)) of the functions whose interesting count is not the size of their first argument.
+ITEM_COUNTS = {
+    "compute_paired_difference_views": ("pairs", lambda args, result: count_pairs(result)),
+    "compute_paired_difference_views_multi": ("pairs", lambda args, result: max([count_pairs(pairs) for pairs in result.values()], default=0)),
+    "group_buildings_temporally": ("views", lambda args, result: count_items(result)),
+    "get_intersecting_ids": ("buildings", lambda args, result: len(result)),
+    "remove_obscured_labels": ("views", lambda args, result: int(result.mask.sum())),
+}
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS, the resource module does not exist on Windows.
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class Instrumentation:
+    # Aggregates every timed call (stage or function) by name: number of calls, total and slowest wall time, the
+    # summed item count, the peak resident memory of the process so far and, while tracemalloc runs, the peak
+    # traced Python memory during a call.
+    def __init__(self):
+        self.timings = {}
+        self.depth = 0
+
+    @contextmanager
+    def measure(self, name, kind="function", unit=None):
+        record = {"items": None}
+        # The traced peak can only be reset for the outermost measurement without breaking the enclosing ones.
+        if self.depth == 0 and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            self.depth -= 1
+            self.add(name, kind, unit, seconds, record["items"])
+
+    def add(self, name, kind, unit, seconds, items):
+        if name not in self.timings:
+            self.timings[name] = {"name": name, "kind": kind, "unit": unit, "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                  "items": None, "peak_rss_mb": None, "traced_peak_mb": None}
+        timing = self.timings[name]
+        timing["calls"] += 1
+        timing["total_seconds"] += seconds
+        timing["max_seconds"] = max(timing["max_seconds"], seconds)
+        if items is not None:
+            timing["items"] = (timing["items"] or 0) + items
+        timing["peak_rss_mb"] = get_peak_rss_mb()
+        if tracemalloc.is_tracing():
+            timing["traced_peak_mb"] = max(timing["traced_peak_mb"] or 0.0, tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+
+    def wrap(self, function, name):
+        unit, counter = ITEM_COUNTS.get(function.__name__, ("items", lambda args, result: count_items(args[0]) if len(args) else None))
+
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            with self.measure(name, "function", unit) as record:
+                result = function(*args, **kwargs)
+                try:
+                    record["items"] = counter(args, result)
+                except (TypeError, ValueError, AttributeError):
+                    pass
+                return result
+        instrumented.__instrumented__ = True
+        return instrumented
+
+    def instrument_modules(self, functions=INSTRUMENTED_FUNCTIONS):
+        # Wraps the given {module: [function, ...]} and rebinds them wherever they were imported by name, so calls
+        # from main.py and between modules are timed too. Calls made in worker processes are not recorded.
+        replacements = {}
+        for module_name, names in functions.items():
+            module = sys.modules.get(module_name) or __import__(module_name)
+            for name in names:
+                function = getattr(module, name)
+                if getattr(function, "__instrumented__", False):
+                    continue
+                replacements[function] = self.wrap(function, module_name + "." + name)
+
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if namespace is None or module.__name__ == __name__:
+                continue
+            for name, value in list(namespace.items()):
+                if inspect.isfunction(value) and value in replacements:
+                    namespace[name] = replacements[value]
+        return len(replacements)
+
+    def get_summary(self):
+        # Stages in the order they ran, then functions from the slowest to the fastest in total.
+        columns = ["name", "kind", "calls", "total_seconds", "max_seconds", "unit", "items", "items_per_second", "peak_rss_mb", "traced_peak_mb"]
+        timings = list(self.timings.values())
+        stages = [timing for timing in timings if timing["kind"] == "stage"]
+        functions = sorted([timing for timing in timings if timing["kind"] != "stage"], key=lambda timing: -timing["total_seconds"])
+        summary = pd.DataFrame(stages + functions, columns=[column for column in columns if column != "items_per_second"])
+        summary["items"] = pd.to_numeric(summary["items"], errors="coerce")
+        summary.insert(columns.index("items_per_second"), "items_per_second", summary["items"] / summary["total_seconds"].where(summary["total_seconds"] > 0))
+        return summary
+
+    def print_summary(self):
+        if len(self.timings) == 0:
+            print("\n\nNothing was timed, every stage was up to date.")
+            return
+        print("\n\nTimings (stages in the order they ran, then functions by total time):")
+        print(self.get_summary().to_string(index=False, float_format=lambda value: "%.4f" % value))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.get_summary().to_dict("records"), f, indent=1, default=str)
+        return path
+
+class Profiler:
+    # cProfile and tracemalloc for a whole run, dumped as <prefix>.pstats, <prefix>.txt and <prefix>_memory.txt.
+    def __init__(self, n_lines=40):
+        self.n_lines = n_lines
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self, output_folder, prefix="profile"):
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        pstats_path = os.path.join(output_folder, prefix + ".pstats")
+        self.profile.dump_stats(pstats_path)
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(self.n_lines)
+        text_path = os.path.join(output_folder, prefix + ".txt")
+        with open(text_path, "w") as f:
+            f.write(stream.getvalue())
+
+        memory_path = os.path.join(output_folder, prefix + "_memory.txt")
+        with open(memory_path, "w") as f:
+            for statistic in snapshot.statistics("lineno")[:self.n_lines]:
+                f.write(str(statistic) + "\n")
+        return [pstats_path, text_path, memory_path]
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from constants import FILENAME, CANONICAL_LABELS
+
+# The only building fields the analysis reads, everything else (polygons, etc.) is dropped at load time.
+ANNOTATION_FIELDS = ("id", "label", FILENAME, "view_properties")
+
+def parse_json(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def normalize_label(label):
+    # Some files spell labels in a different case (e.g. "obscured"), unknown labels are left untouched.
+    if isinstance(label, str):
+        return CANONICAL_LABELS.get(label.lower(), label)
+    return label
+
+def parse_annotations(raw, fields=ANNOTATION_FIELDS):
+    buildings = [{field: building[field] for field in fields if field in building} for building in parse_json(raw)]
+    for building in buildings:
+        if "label" in building:
+            building["label"] = normalize_label(building["label"])
+    return buildings
+
+def load_annotation_file(annotation_path, fields=ANNOTATION_FIELDS):
+    start = time.perf_counter()
+    try:
+        with open(annotation_path, "rb") as f:
+            buildings = parse_annotations(f.read(), fields)
+        return buildings, time.perf_counter() - start, None
+    except (OSError, TypeError, ValueError) as e:
+        return None, time.perf_counter() - start, e
+
+class SharedAnnotationLoader:
+    # Loads the annotation files of several path maps (e.g. revisions of the dataset) and parses every distinct
+    # file once. Parsed files are keyed by the hash of their content, so an unchanged file is shared by all path
+    # maps that list it, even from another checkout, and a path whose mtime and size did not change is not read
+    # again. The shared building lists must not be modified. load_file is called from the loader threads, the lock
+    # guards the shared state, files are read and parsed outside of it.
+    def __init__(self):
+        self.digests = {}
+        self.parsed = {}
+        self.n_files = 0
+        self.n_parsed = 0
+        self.lock = threading.Lock()
+
+    def load_file(self, annotation_path, fields=ANNOTATION_FIELDS):
+        # The same (buildings, seconds, error) as load_annotation_file.
+        start = time.perf_counter()
+        try:
+            stat = os.stat(annotation_path)
+            signature = (annotation_path, stat.st_mtime_ns, stat.st_size)
+            with self.lock:
+                self.n_files += 1
+                digest = self.digests.get(signature)
+                buildings = None if digest is None else self.parsed.get((digest, fields))
+            if buildings is None:
+                with open(annotation_path, "rb") as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+                with self.lock:
+                    buildings = self.parsed.get((digest, fields))
+                if buildings is None:
+                    buildings = parse_annotations(raw, fields)
+                with self.lock:
+                    # Another thread may have parsed the same content meanwhile, the first parse is kept.
+                    if (digest, fields) not in self.parsed:
+                        self.parsed[(digest, fields)] = buildings
+                        self.n_parsed += 1
+                    buildings = self.parsed[(digest, fields)]
+                    self.digests[signature] = digest
+            return buildings, time.perf_counter() - start, None
+        except (OSError, TypeError, ValueError) as e:
+            return None, time.perf_counter() - start, e
+
+class LoadReport:
+    def __init__(self, name):
+        self.name = name
+        self.files = []
+
+    def add(self, ortho, annotation_path, seconds, n_buildings, error):
+        self.files.append({"ortho": ortho, "path": annotation_path, "seconds": seconds, "n_buildings": n_buildings, "error": error})
+
+    @property
+    def failures(self):
+        return [record for record in self.files if record["error"] is not None]
+
+    def print_summary(self, n_slowest=5):
+        loaded = [record for record in self.files if record["error"] is None]
+        print("Loaded", len(loaded), "of", len(self.files), self.name, "annotation files,",
+              sum(record["n_buildings"] for record in loaded), "buildings,",
+              "%.2fs" % sum(record["seconds"] for record in self.files), "total parse time")
+        for record in sorted(loaded, key=lambda record: record["seconds"], reverse=True)[:n_slowest]:
+            print("\t%.2fs" % record["seconds"], record["n_buildings"], "buildings", record["path"])
+        for record in self.failures:
+            print("\tSkipping", record["ortho"], "->", record["path"], "because of", type(record["error"]))
+
+def load_annotations(path_map, name="", workers=8, use_processes=False, on_error="raise", fields=ANNOTATION_FIELDS, shared_loader=None):
+    # Loads every annotation file of an {ortho: annotation path} map concurrently. Returns the
+    # {ortho: [building, ...]} dict in path map order, plus a LoadReport with per-file timing and failures.
+    # on_error="raise" re-raises the first failure, on_error="skip" leaves the failed orthos out. Given a
+    # SharedAnnotationLoader, the files it already parsed are reused (always in a thread pool).
+    executor_type = ProcessPoolExecutor if use_processes and shared_loader is None else ThreadPoolExecutor
+    load_file = load_annotation_file if shared_loader is None else shared_loader.load_file
+    orthos = list(path_map.keys())
+    with executor_type(max_workers=workers) as executor:
+        loaded = list(executor.map(load_file, [path_map[ortho] for ortho in orthos], [fields] * len(orthos)))
+
+    data = {}
+    report = LoadReport(name)
+    for ortho, (buildings, seconds, error) in zip(orthos, loaded):
+        if error is not None and on_error == "raise":
+            raise error
+        report.add(ortho, path_map[ortho], seconds, 0 if buildings is None else len(buildings), error)
+        if error is None:
+            data[ortho] = buildings
+    return data, report
@@ -4,153 +4,344 @@ import json
 import pandas as pd
 import argparse
 
-from utils import remove_obscured_labels, get_class_counts_from_ids, get_intersecting_ids
-from plot import plot_transistion_matrix, plot_mulistrategy_class_balances, plot_sat_views_per_building_histogram
-from analysis import chi_squared_test, z_test_per_label, get_coincident_buildings_per_ortho, get_satellite_building_counts, \
-                     get_building_count_per_disaster, get_ortho_count_per_disaster, get_underestimation_rate
-from replicate import get_probability_of_disagreement, get_best_antioracle_label_for_building, get_best_oracle_label_for_building, \
-                      get_best_temporal_label_for_building, compute_paired_difference_views, group_buildings_temporally
+from loader import load_annotations, ANNOTATION_FIELDS
+from building_table import BuildingTable
+from cache import get_dataset_fingerprint, load_cached_dataset, save_cached_dataset
+from utils import get_class_counts_from_ids, get_intersecting_ids, get_building_orthos, get_view_mask, AnnotationView, MultiviewIndex
+from render import PLOT_FORMATS, make_plot_spec, render_plot_specs
+from analysis import get_coincident_buildings_per_ortho
+from replicate import get_probability_of_disagreement, compute_paired_difference_views
+from report import report_counts, report_strategy_tests, report_paired_views
+from outofcore import AnnotationStore
+from agreement import AgreementCounts
+from strategies import STRATEGIES, get_strategies
+from view_table import ViewTable
+from strategy_cache import StrategyCache
+from bootstrap import bootstrap_strategies
+from stratify import STRATIFY_BY, run_stratified_analysis
+from sensitivity import BINNINGS, run_sensitivity_sweep
+from results import Results, load_current_results
+from pipeline import Stage, Pipeline, STATE_FOLDER
+from instrument import Instrumentation, Profiler
+from constants import GEOMETRY_FIELD, MATCH_METHODS
+from geometry import remap_building_ids
 
-if __name__ == "__main__":
+def stage_load(args, results):
+    cached_dataset = None
+    if args.cache_dir is not None:
+        cached_dataset = load_cached_dataset(args.cache_dir, args.dataset_fingerprint)
 
-    parser = argparse.ArgumentParser(prog="compute_satellite_BDA_dataset_stats", description="This program replicates the results of the 2025 FAccT Paper INSERT NAME TODO.")
+    if cached_dataset is not None:
+        print("Loading the cached annotations from:", os.path.join(args.cache_dir, args.dataset_fingerprint))
+        tables, cached_metadata = cached_dataset
+        suas_data = tables["suas"].to_annotations()
+        satellite_data = tables["satellite"].to_annotations()
+        multiview_index = MultiviewIndex.from_records(cached_metadata["multiview"])
+    else:
+        # Read multiview csv for metadata information
+        multiview_df = pd.read_csv(args.multiview_stats_file_path)
+        multiview_index = MultiviewIndex(multiview_df)
+
+        # Load the annotations
+        drone_annotations_path_map = json.load(open(args.drone_annotations_path_map))
+        sat_annotations_path_map = json.load(open(args.satellite_annotations_path_map))
+        fields = ANNOTATION_FIELDS if args.match_by_geometry is None else ANNOTATION_FIELDS + (args.geometry_field,)
+        suas_data, suas_load_report = load_annotations(drone_annotations_path_map, "sUAS", args.loader_workers, args.loader_processes, on_error="raise", fields=fields)
+        suas_load_report.print_summary()
+        satellite_data, satellite_load_report = load_annotations(sat_annotations_path_map, "Satellite", args.loader_workers, args.loader_processes, on_error="skip", fields=fields)
+        satellite_load_report.print_summary()
+
+        if args.match_by_geometry is not None:
+            n_matched = remap_building_ids(suas_data, satellite_data, args.match_by_geometry, args.iou_threshold, args.geometry_field)
+            print("Matched", n_matched, "of", sum(len(data) for data in satellite_data.values()), "satellite buildings to sUAS buildings by", args.match_by_geometry)
+
+        if args.cache_dir is not None:
+            tables = {"suas": BuildingTable.from_annotations(suas_data), "satellite": BuildingTable.from_annotations(satellite_data)}
+            save_cached_dataset(args.cache_dir, args.dataset_fingerprint, tables, {"multiview": multiview_index.to_records()})
+
+    return {"suas_data": suas_data, "satellite_data": satellite_data, "multiview_index": multiview_index}
+
+def stage_intersect(args, results, load):
+    # Only the mask of the non obscured satellite views is kept, the views themselves stay in the loaded data.
+    satellite_view_mask = get_view_mask(list(load["satellite_data"].values()), ignore_lone_unclassified=args.ignore_lone_unclassified_views)
+    valid_ids = get_intersecting_ids(list(load["suas_data"].values()), get_non_obscured_sat_data(load, {"satellite_view_mask": satellite_view_mask}))
+    return {"satellite_view_mask": satellite_view_mask, "valid_ids": valid_ids}
+
+def get_non_obscured_sat_data(load, intersect):
+    return AnnotationView(list(load["satellite_data"].values()), intersect["satellite_view_mask"])
+
+def stage_views(args, results, load, intersect):
+    # The non obscured satellite views as a view_table.ViewTable, which the strategies, the views per building and
+    # the paired views are computed from.
+    return ViewTable.from_annotations(get_non_obscured_sat_data(load, intersect), load["multiview_index"])
+
+def stage_counts(args, results, load, intersect, views):
+    suas_data, satellite_data, multiview_index = load["suas_data"], load["satellite_data"], load["multiview_index"]
+    valid_ids = intersect["valid_ids"]
+
+    suas_coincident_buildings_per_ortho = get_coincident_buildings_per_ortho(valid_ids, suas_data)
+    sat_coincident_buildings_per_ortho = get_coincident_buildings_per_ortho(valid_ids, satellite_data)
+    report_counts(results, suas_coincident_buildings_per_ortho, sat_coincident_buildings_per_ortho, int(views.get_views_per_building(valid_ids).sum()), multiview_index)
+
+def stage_strategies(args, results, load, intersect, views):
+    return views.select_views(list(load["suas_data"].values()), intersect["valid_ids"], get_strategies())
+
+def stage_tests(args, results, intersect, strategies):
+    suas_labels = strategies["oracle"][0]
+    agreement = AgreementCounts.from_labels({"sUAS": suas_labels, **{name: sat_labels for name, (_, sat_labels) in strategies.items()}})
+    report_strategy_tests(results, agreement)
+
+def stage_sweep(args, results, load, intersect):
+    if not args.strategy_sweep:
+        return
+
+    # Every strategy with and without ignore_lone_unclassified, selected from candidate views gathered once.
+    print("\n\nHow does ignoring lone un-classified views change the Probability of Disagreement of every strategy?")
+    cache = StrategyCache()
+    for ignore_lone_unclassified in [True, False]:
+        selections = cache.select_views(args.dataset_fingerprint, list(load["suas_data"].values()), get_non_obscured_sat_data(load, intersect), intersect["valid_ids"],
+                                        get_strategies(list(STRATEGIES.keys()), ignore_lone_unclassified), load["multiview_index"])
+        for name, (suas_labels, sat_labels) in selections.items():
+            disagreement_probability = get_probability_of_disagreement(suas_labels, sat_labels, True)
+            print("\t", name, "ignore_lone_unclassified=" + str(ignore_lone_unclassified), results.add("sweep_disagreement_probability", disagreement_probability, name, "sUAS", n=len(sat_labels), ignore_lone_unclassified=ignore_lone_unclassified))
+    print("\tStrategy cache:", cache.get_stats())
+
+def stage_bootstrap(args, results, load, intersect, strategies):
+    if args.bootstrap_resamples <= 0:
+        return
+
+    print("\n\nWhat are the 95% bootstrap confidence intervals of the disagreement and under-estimation rates? (" + str(args.bootstrap_resamples) + " resamples of each " + args.bootstrap_clusters + ")")
+    building_orthos = get_building_orthos(load["suas_data"], intersect["valid_ids"])
+    building_events = {bld_id: load["multiview_index"].event(ortho) for bld_id, ortho in building_orthos.items()}
+    bootstrap_results = bootstrap_strategies(
+        strategies,
+        args.bootstrap_resamples,
+        clusters=building_orthos if args.bootstrap_clusters == "ortho" else None,
+        groups=building_events,
+        seed=args.seed,
+        workers=args.bootstrap_workers,
+    )
+    for (strategy, event), result in bootstrap_results.items():
+        print("\t", strategy, "all events" if event is None else event, "N=", result["n_buildings"])
+        print("\t\tdisagreement", result["disagreement"])
+        results.add("disagreement_probability_ci", result["disagreement"]["estimate"], strategy, "sUAS", n=result["n_buildings"], low=result["disagreement"]["low"], high=result["disagreement"]["high"], event=event)
+        for label, interval in result["underestimation"].items():
+            print("\t\tunderestimation", label, interval)
+            results.add("underestimation_rate_ci", interval["estimate"], strategy, "sUAS", label, result["n_buildings"], low=interval["low"], high=interval["high"], event=event)
+
+def stage_stratified(args, results, load):
+    if args.stratify_by is None:
+        return
+
+    stratified_results = run_stratified_analysis(load["suas_data"], load["satellite_data"], load["multiview_index"], args.stratify_by, workers=args.stratify_workers,
+                                                 ignore_lone_unclassified=args.ignore_lone_unclassified_views)
+    stratified_results_path = os.path.join(args.output_folder_path, "stratified_results_by_" + args.stratify_by + ".csv")
+    print("\n\nWhat is the Probability of Disagreement per " + args.stratify_by + "? (All metrics saved at " + stratified_results_path + ")")
+    print(stratified_results[stratified_results["metric"] == "disagreement_probability"].pivot(index="stratum", columns="strategy", values="value").to_string())
+    stratified_results.to_csv(stratified_results_path, index=False)
+    results.add_frame(stratified_results, comparison="sUAS")
+    return [stratified_results_path]
+
+def stage_plots(args, results, intersect, strategies, views):
+    if args.no_plots:
+        return
+
+    closest_suas_labels_abs, closest_sat_labels_abs = strategies["closest_to_drone"]
+    closest_suas_labels_real, closest_sat_labels_real = strategies["closest_to_disaster"]
+    oracle_suas_labels, oracle_sat_labels = strategies["oracle"]
+    antioracle_suas_labels, antioracle_sat_labels = strategies["anti_oracle"]
+
+    plot_specs = []
+    plot_specs.append(make_plot_spec(
+        "plot_mulistrategy_class_balances",
+        get_class_counts_from_ids(closest_suas_labels_real, True),
+        {
+            "Satellite Anti-Oracle": get_class_counts_from_ids(antioracle_sat_labels, True),
+            "Satellite Oracle": get_class_counts_from_ids(oracle_sat_labels, True),
+            "Satellite Closest to Disaster": get_class_counts_from_ids(closest_sat_labels_real, True),
+            "Satellite Closest to Drone": get_class_counts_from_ids(closest_sat_labels_abs, True),
+        },
+        args.output_folder_path,
+    ))
+
+    # Compute Transisition Matrix for the change in labels between labels (y-axis -> sUAs label, x-axis -> satellite label)
+    print("\n\nGenerating Oracle Transition Matrix...")
+    plot_specs.append(make_plot_spec("plot_transistion_matrix", oracle_suas_labels, oracle_sat_labels, args.output_folder_path, "Satellite Oracle", True))
+    plot_specs.append(make_plot_spec("plot_transistion_matrix", antioracle_suas_labels, antioracle_sat_labels, args.output_folder_path, "Satellite Anti-Oracle", True))
+    plot_specs.append(make_plot_spec("plot_transistion_matrix", closest_suas_labels_abs, closest_sat_labels_abs, args.output_folder_path, "Satellite Closest to Drone", True))
+    plot_specs.append(make_plot_spec("plot_transistion_matrix", closest_suas_labels_real, closest_sat_labels_real, args.output_folder_path, "Satellite Closest to Disaster ", True))
+
+    plot_specs.append(make_plot_spec("plot_views_per_building_histogram", views.get_views_per_building(intersect["valid_ids"]).tolist(), args.output_folder_path))
+
+    return render_plot_specs(plot_specs, args.plot_format, args.plot_workers)
+
+def stage_temporal(args, results, views):
+    # With only the sat orthos, compute the change with (time, view)
+    agree_dist, disagree_dist = compute_paired_difference_views(views, "days")
+    report_paired_views(results, len(agree_dist), len(disagree_dist))
+
+def stage_sensitivity(args, results, views):
+    if args.sensitivity_bins <= 0:
+        return
+
+    histogram, fits = run_sensitivity_sweep(views, n_bins=args.sensitivity_bins, binning=args.sensitivity_binning)
+    histogram_path = os.path.join(args.output_folder_path, "sensitivity_histogram.csv")
+    fits_path = os.path.join(args.output_folder_path, "sensitivity_logistic.csv")
+    print("\n\nHow does the disagreement between time/view satellite change with the difference of the views? (Histograms saved at " + histogram_path + ")")
+    print(fits.to_string(index=False))
+    histogram.to_csv(histogram_path, index=False)
+    fits.to_csv(fits_path, index=False)
+    for row in histogram.itertuples():
+        results.add("paired_view_disagreement_probability_by_bin", row.disagreement_probability, comparison="Satellite", label=row.field, n=row.n, bin_start=row.bin_start, bin_end=row.bin_end, n_disagree=row.n_disagree)
+    for row in fits.itertuples():
+        results.add("paired_view_disagreement_logistic_slope", row.slope, comparison="Satellite", label=row.field, n=row.n, intercept=row.intercept, p=row.slope_p, odds_ratio=row.odds_ratio)
+    return [histogram_path, fits_path]
+
+# The out-of-core stages keep the annotations in an outofcore.AnnotationStore on disk and only hold aggregates
+# (counts, per strategy confusion matrices) in memory. They report the same counts, tests and paired view
+# disagreement as the stages above, plots, bootstrap and the stratified analysis need the in-memory labels.
+def stage_store(args, results):
+    multiview_index = MultiviewIndex(pd.read_csv(args.multiview_stats_file_path))
+    drone_annotations_path_map = json.load(open(args.drone_annotations_path_map))
+    sat_annotations_path_map = json.load(open(args.satellite_annotations_path_map))
+    store, suas_load_report, satellite_load_report = AnnotationStore.create(args.out_of_core_path, drone_annotations_path_map, sat_annotations_path_map, multiview_index, args.loader_workers)
+    suas_load_report.print_summary()
+    satellite_load_report.print_summary()
+    store.close()
+    # The fingerprint makes the output (and so the keys of the dependent stages) change with the data in the store.
+    return {"path": args.out_of_core_path, "dataset_fingerprint": args.dataset_fingerprint, "multiview_index": multiview_index}
+
+def stage_store_counts(args, results, store):
+    annotation_store = AnnotationStore(store["path"])
+    annotation_store.multiview_index = store["multiview_index"]
+    report_counts(results, annotation_store.get_coincident_buildings_per_ortho("suas"), annotation_store.get_coincident_buildings_per_ortho("satellite"), annotation_store.get_coincident_view_count(), store["multiview_index"])
+    annotation_store.close()
+
+def stage_store_strategies(args, results, store):
+    annotation_store = AnnotationStore(store["path"])
+    annotation_store.multiview_index = store["multiview_index"]
+    agreement = annotation_store.get_strategy_agreement(get_strategies())
+    annotation_store.close()
+    return agreement
+
+def stage_store_tests(args, results, store_strategies):
+    report_strategy_tests(results, store_strategies)
+
+def stage_store_temporal(args, results, store):
+    annotation_store = AnnotationStore(store["path"])
+    annotation_store.multiview_index = store["multiview_index"]
+    report_paired_views(results, *annotation_store.get_paired_view_counts())
+    annotation_store.close()
+
+def get_saved_paths(output):
+    # The files a stage saved are its output, None when it was disabled.
+    return output or []
+
+STAGES = [
+    Stage("load", stage_load, params=["dataset_fingerprint"]),
+    Stage("intersect", stage_intersect, inputs=["load"], params=["ignore_lone_unclassified_views"]),
+    Stage("views", stage_views, inputs=["load", "intersect"]),
+    Stage("counts", stage_counts, inputs=["load", "intersect", "views"]),
+    Stage("strategies", stage_strategies, inputs=["load", "intersect", "views"]),
+    Stage("tests", stage_tests, inputs=["intersect", "strategies"]),
+    Stage("sweep", stage_sweep, inputs=["load", "intersect"], params=["strategy_sweep", "dataset_fingerprint"]),
+    Stage("bootstrap", stage_bootstrap, inputs=["load", "intersect", "strategies"], params=["bootstrap_resamples", "bootstrap_clusters", "seed"]),
+    Stage("stratified", stage_stratified, inputs=["load"], params=["stratify_by", "output_folder_path", "ignore_lone_unclassified_views"], files=get_saved_paths),
+    Stage("plots", stage_plots, inputs=["intersect", "strategies", "views"], params=["no_plots", "plot_format", "output_folder_path"], files=get_saved_paths),
+    Stage("temporal", stage_temporal, inputs=["views"]),
+    Stage("sensitivity", stage_sensitivity, inputs=["views"], params=["sensitivity_bins", "sensitivity_binning", "output_folder_path"], files=get_saved_paths),
+]
+
+OUT_OF_CORE_STAGES = [
+    Stage("store", stage_store, params=["dataset_fingerprint", "out_of_core_path"], files=lambda store: [store["path"]]),
+    Stage("store_counts", stage_store_counts, inputs=["store"]),
+    Stage("store_strategies", stage_store_strategies, inputs=["store"]),
+    Stage("store_tests", stage_store_tests, inputs=["store_strategies"]),
+    Stage("store_temporal", stage_store_temporal, inputs=["store"]),
+]
+
+def add_arguments(parser):
     parser.add_argument("--satellite_annotations_path_map", type=str, help="The path to the satellite annotations file path map.")
     parser.add_argument("--drone_annotations_path_map", type=str, help="The path to the suas annotations file path map.")
     parser.add_argument("--output_folder_path", type=str, help="The path to the output folder file.")
     parser.add_argument("--multiview_stats_file_path", type=str, help="The path to the multiview information.")
-    args = parser.parse_args()
+    parser.add_argument("--loader_workers", type=int, default=8, help="The number of workers used to load the annotation files.")
+    parser.add_argument("--loader_processes", action="store_true", help="Load the annotation files in a process pool instead of a thread pool.")
+    parser.add_argument("--no_plots", "--no-plots", action="store_true", help="Only compute the statistics, do not render any figures.")
+    parser.add_argument("--plot_format", type=str, default="png", choices=PLOT_FORMATS, help="The file format of the rendered figures.")
+    parser.add_argument("--plot_workers", type=int, default=4, help="The number of processes used to render the figures.")
+    parser.add_argument("--strategy_sweep", action="store_true", help="Also report the Probability of Disagreement of every registered strategy with and without ignoring lone un-classified views.")
+    parser.add_argument("--bootstrap_resamples", type=int, default=0, help="The number of bootstrap resamples used for confidence intervals, 0 disables them.")
+    parser.add_argument("--bootstrap_clusters", type=str, default="building", choices=["building", "ortho"], help="Resample individual buildings or whole sUAS orthomosaics.")
+    parser.add_argument("--bootstrap_workers", type=int, default=1, help="The number of processes used for the bootstrap resampling.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the bootstrap resampling.")
+    parser.add_argument("--stratify_by", type=str, default=None, choices=STRATIFY_BY, help="Also run every strategy and metric separately per disaster event or per sUAS orthomosaic.")
+    parser.add_argument("--stratify_workers", type=int, default=4, help="The number of processes used for the stratified analysis.")
+    parser.add_argument("--sensitivity_bins", type=int, default=0, help="Bin the disagreement of paired satellite views by their difference in days and in every numeric view property into this many bins and fit a logistic regression per property, 0 disables the sweep.")
+    parser.add_argument("--sensitivity_binning", type=str, default="uniform", choices=BINNINGS, help="Bins of equal width or holding about as many paired views each.")
+    parser.add_argument("--ignore_lone_unclassified_views", action="store_true", help="Also leave out the un-classified satellite views of buildings that have a classified view, from the counts, strategies, paired views and stratified analysis.")
+    parser.add_argument("--skip_unchanged", action="store_true", help="Do nothing if the results in the output folder were computed from the same inputs and arguments.")
+    parser.add_argument("--cache_dir", "--cache-dir", type=str, default=None, help="Cache the parsed annotations in this folder and reuse them while the inputs are unchanged.")
+    parser.add_argument("--stages", type=str, default=None, help="A comma separated subset of the stages to run (with the stages they depend on): " + ", ".join(stage.name for stage in STAGES) + ", or with --out_of_core: " + ", ".join(stage.name for stage in OUT_OF_CORE_STAGES) + ".")
+    parser.add_argument("--force", action="store_true", help="Recompute every selected stage even if its persisted output is up to date.")
+    parser.add_argument("--out_of_core", action="store_true", help="Stream the annotations into an on disk SQLite store and compute the counts, tests and paired view disagreement from it with bounded memory. Plots, bootstrap and the stratified analysis are not available in this mode.")
+    parser.add_argument("--out_of_core_path", type=str, default=None, help="The path of the SQLite store used by --out_of_core, defaults to annotations.sqlite in the output folder.")
+    parser.add_argument("--match_by_geometry", type=str, default=None, choices=MATCH_METHODS, help="Pair satellite and sUAS buildings by footprint (centroid containment or IoU) instead of by id. IoU needs shapely.")
+    parser.add_argument("--iou_threshold", type=float, default=0.5, help="The minimum intersection over union of a --match_by_geometry iou match.")
+    parser.add_argument("--geometry_field", type=str, default=GEOMETRY_FIELD, help="The building field holding the footprint polygon.")
+    parser.add_argument("--timings", action="store_true", help="Time every stage and the main functions of replicate.py, analysis.py, utils.py and plot.py, print a summary and save it to timings.json.")
+    parser.add_argument("--profile", action="store_true", help="Like --timings, and also save cProfile and tracemalloc output of the run to the output folder.")
+
+def run(args, parser):
+    if args.out_of_core and args.match_by_geometry is not None:
+        parser.error("--match_by_geometry is not available with --out_of_core")
+    if args.out_of_core and args.ignore_lone_unclassified_views:
+        parser.error("--ignore_lone_unclassified_views is not available with --out_of_core")
 
     try:
         os.makedirs(args.output_folder_path)
     except FileExistsError as e:
         pass
 
-    sat_annotations_path_map = json.load(open(args.satellite_annotations_path_map))
-    
     if args.drone_annotations_path_map is not None:
-        drone_annotations_path_map = json.load(open(args.drone_annotations_path_map))
+        match_settings = [] if args.match_by_geometry is None else [args.match_by_geometry, args.iou_threshold, args.geometry_field]
+        args.dataset_fingerprint = get_dataset_fingerprint([args.drone_annotations_path_map, args.satellite_annotations_path_map], [args.multiview_stats_file_path], match_settings)
+        results = Results({"dataset_fingerprint": args.dataset_fingerprint, "arguments": {key: value for key, value in vars(args).items() if key not in ["skip_unchanged", "force", "timings", "profile", "dataset_fingerprint"]}})
+        if args.skip_unchanged and load_current_results(args.output_folder_path, results.metadata) is not None:
+            print("The results in", args.output_folder_path, "are up to date with the inputs, skipping.")
+            return
 
-        # Read multiview csv for metadata information
-        multiview_df = pd.read_csv(args.multiview_stats_file_path)
+        instrumentation = None
+        if args.timings or args.profile:
+            instrumentation = Instrumentation()
+            instrumentation.instrument_modules()
+        profiler = None
+        if args.profile:
+            profiler = Profiler()
+            profiler.start()
 
-        suas_data = {}
-        satellite_data = {}
-        raw_satellite_data = []
-
-        for geotif_path, drone_annotation_path in drone_annotations_path_map.items():
-            # Load the annotations
-            print("Loading the sUAS BDA annotations from:", drone_annotation_path)
-            f = open(drone_annotation_path, "r")
-            drone_annotations_data = json.loads(f.read())
-            f.close()
-
-            suas_data[geotif_path] = drone_annotations_data
-
-        for geotif_path, sat_annotation_path in sat_annotations_path_map.items():
-            print("Loading the Satellite BDA annotations from:", sat_annotation_path)
-            try:
-                f = open(sat_annotation_path, "r")
-                closest_annotation_path_annotations_data = json.loads(f.read())
-                f.close()
-
-                raw_satellite_data.append(closest_annotation_path_annotations_data)
-                satellite_data[geotif_path] = closest_annotation_path_annotations_data
-            except TypeError as e:
-                print("Skipping", geotif_path, "->", sat_annotation_path, "because of", type(e))
-
-        non_obscured_sat_data = remove_obscured_labels(raw_satellite_data)
-
-        valid_ids = get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
-        suas_coincident_buildings_per_ortho = get_coincident_buildings_per_ortho(valid_ids, suas_data)
-        sat_coincident_buildings_per_ortho = get_coincident_buildings_per_ortho(valid_ids, satellite_data)
-
-        print("\n\nComputing sUAS vs Satellite Statistics....")
-        print("Count of coincident buildings:", sum(suas_coincident_buildings_per_ortho.values()))
-        print("Count of coincident views:", get_satellite_building_counts(non_obscured_sat_data, valid_ids))
-        print("Count of coincident buildings per disaster:", get_building_count_per_disaster(suas_coincident_buildings_per_ortho, multiview_df))
-        print("Count of sUAS orthomosaics per disaster:", get_ortho_count_per_disaster(suas_coincident_buildings_per_ortho, multiview_df, "sUAS"))
-        print("Count of satellite orthomosaics per disaster:", get_ortho_count_per_disaster(sat_coincident_buildings_per_ortho, multiview_df, "Satellite"))
-        
-
-
-        closest_suas_labels_abs, closest_sat_labels_abs = get_best_temporal_label_for_building(list(suas_data.values()), non_obscured_sat_data, valid_ids, multiview_df, "abs")
-        closest_suas_labels_real, closest_sat_labels_real = get_best_temporal_label_for_building(list(suas_data.values()), non_obscured_sat_data, valid_ids, multiview_df, "real")
-        oracle_suas_labels, oracle_sat_labels = get_best_oracle_label_for_building(list(suas_data.values()), non_obscured_sat_data, valid_ids)
-        antioracle_suas_labels, antioracle_sat_labels = get_best_antioracle_label_for_building(list(suas_data.values()), non_obscured_sat_data, valid_ids)
-
-        suas_class_counts_ignore_obscured = get_class_counts_from_ids(closest_suas_labels_real, True)
-        closest_to_suas_class_counts_ignore_obscured = get_class_counts_from_ids(closest_sat_labels_abs, True)
-        closest_to_disaster_class_counts_ignore_obscured = get_class_counts_from_ids(closest_sat_labels_real, True)
-        oracle_class_counts_ignore_obscured = get_class_counts_from_ids(oracle_sat_labels, True)
-        anti_oracle_class_counts_ignore_obscured = get_class_counts_from_ids(antioracle_sat_labels, True)
-
-        plot_mulistrategy_class_balances(
-            suas_class_counts_ignore_obscured,
-            {
-                "Satellite Anti-Oracle": anti_oracle_class_counts_ignore_obscured,
-                "Satellite Oracle": oracle_class_counts_ignore_obscured,
-                "Satellite Closest to Disaster": closest_to_disaster_class_counts_ignore_obscured,
-                "Satellite Closest to Drone": closest_to_suas_class_counts_ignore_obscured,
-            },
-            args.output_folder_path,
-            valid_ids,
-        )
-
-        print("\n\nAre the sUAS and Satellite distributions different? (Is p < 0.001?)")
-        print("sUAS and Closest to Disaster (Ignore Obscured):",chi_squared_test(closest_suas_labels_abs, closest_sat_labels_abs, True))
-        print("\tP-Value By Label:", z_test_per_label(closest_suas_labels_abs, closest_sat_labels_abs, True))
-        print("sUAS and Closest to sUAS (Ignore Obscured):",chi_squared_test(closest_suas_labels_real, closest_sat_labels_real, True))
-        print("\tP-Value By Label:", z_test_per_label(closest_suas_labels_real, closest_sat_labels_real, True))
-        print("sUAS and Oracle (Ignore Obscured):",chi_squared_test(oracle_suas_labels, oracle_sat_labels, True))
-        print("\tP-Value By Label:", z_test_per_label(oracle_suas_labels, oracle_sat_labels, True))
-        print("sUAS and Anti-Oracle (Ignore Obscured):",chi_squared_test(antioracle_suas_labels, antioracle_sat_labels, True))
-        print("\tP-Value By Label:", z_test_per_label(antioracle_suas_labels, antioracle_sat_labels, True))
-
-        print("\n\nAre the Oracle and Anti-Oracle Distributions Different? (Is p < 0.001?)")
-        print("Oracle and Anti-Oracle (Ignore Obscured):",chi_squared_test(oracle_sat_labels, antioracle_sat_labels, True))
-        print("\tP-Value By Label:", z_test_per_label(oracle_sat_labels, antioracle_sat_labels, True))
-
-        print("\n\nAre any view selection strategies different signficantly from one another (Is p < 0.001?)")
-        strats = {"oracle": oracle_sat_labels, "anti_oracle": antioracle_sat_labels, "closest to disaster": closest_sat_labels_real, "closest to drone": closest_sat_labels_abs}
-        for key_1, source_1 in strats.items():
-            for key_2, source_2 in strats.items():
-                if key_1 != key_2:
-                    print("\t", key_1, key_2, chi_squared_test(source_1, source_2, True))
-
-        print("\n\nWhat is the Probability of Disagreement for the different view selection strategies?")
-        oracle_disagreement_prob_ignore_obscured = get_probability_of_disagreement(oracle_suas_labels, oracle_sat_labels, True)
-        antioracle_disagreement_prob_ignore_obscured = get_probability_of_disagreement(antioracle_suas_labels, antioracle_sat_labels, True)
-        closest_to_suas_disagreement_prob_ignore_obscured = get_probability_of_disagreement(closest_suas_labels_abs, closest_sat_labels_abs, True)
-        closest_to_disaster_disagreement_prob_ignore_obscured = get_probability_of_disagreement(closest_suas_labels_real, closest_sat_labels_real, True)
-
-        print("\tclosest_to_disaster_disagreement_prob_ignore_obscured", closest_to_disaster_disagreement_prob_ignore_obscured)
-        print("\tclosest_to_suas_disagreement_prob_ignore_obscured", closest_to_suas_disagreement_prob_ignore_obscured)
-        print("\toracle_disagreement_prob_ignore_obscured", oracle_disagreement_prob_ignore_obscured)
-        print("\tantioracle_disagreement_prob_ignore_obscured", antioracle_disagreement_prob_ignore_obscured)
-
-        print("\n\nWhat are the under-estimation rates of the different strategies per label?")
-        oracle_overestimation_rate_ignore_obscured = get_underestimation_rate(oracle_suas_labels, oracle_sat_labels, True)
-        antioracle_overestimation_rate_ignore_obscured = get_underestimation_rate(antioracle_suas_labels, antioracle_sat_labels, True)
-        closest_to_suas_overestimation_rate_ignore_obscured = get_underestimation_rate(closest_suas_labels_abs, closest_sat_labels_abs, True)
-        closest_to_disaster_overestimation_rate_ignore_obscured = get_underestimation_rate(closest_suas_labels_real, closest_sat_labels_real, True)
-
-        print("\tclosest_to_disaster_overestimation_rate_ignore_obscured", closest_to_disaster_overestimation_rate_ignore_obscured)
-        print("\tclosest_to_suas_overestimation_rate_ignore_obscured", closest_to_suas_overestimation_rate_ignore_obscured)
-        print("\toracle_overestimation_rate_ignore_obscured", oracle_overestimation_rate_ignore_obscured)
-        print("\tantioracle_overestimation_rate_ignore_obscured", antioracle_overestimation_rate_ignore_obscured)
-
-        # Compute Transisition Matrix for the change in labels between labels (y-axis -> sUAs label, x-axis -> satellite label)
-        print("\n\nGenerating Oracle Transition Matrix...")
-        plot_transistion_matrix(oracle_suas_labels, oracle_sat_labels, args.output_folder_path, "Satellite Oracle", True)
-        plot_transistion_matrix(antioracle_suas_labels, antioracle_sat_labels, args.output_folder_path, "Satellite Anti-Oracle", True)
-        plot_transistion_matrix(closest_suas_labels_abs, closest_sat_labels_abs, args.output_folder_path, "Satellite Closest to Drone", True)
-        plot_transistion_matrix(closest_suas_labels_real, closest_sat_labels_real, args.output_folder_path, "Satellite Closest to Disaster ", True)
-
-        plot_sat_views_per_building_histogram(non_obscured_sat_data, valid_ids, args.output_folder_path)
-
-        # With only the sat orthos, compute the change with (time, view)
-        suas_days_sat_data = group_buildings_temporally(non_obscured_sat_data, multiview_df)
-        agree_dist, disagree_dist = compute_paired_difference_views(suas_days_sat_data, "days")
-        disagree_rate = len(disagree_dist) / (len(disagree_dist) + len(agree_dist))
-        view_count = len(disagree_dist) + len(agree_dist)
-        print("\n\nProbability of Disagreement between time/view satellite", disagree_rate, "N=", view_count, "N_disagree=", len(disagree_dist), "N_agree=", len(agree_dist))
\ No newline at end of file
+        stages = STAGES
+        if args.out_of_core:
+            stages = OUT_OF_CORE_STAGES
+            if args.out_of_core_path is None:
+                args.out_of_core_path = os.path.join(args.output_folder_path, "annotations.sqlite")
+        pipeline = Pipeline(stages, os.path.join(args.output_folder_path, STATE_FOLDER), instrumentation)
+        stage_names = None if args.stages is None else [name.strip() for name in args.stages.split(",")]
+        pipeline.run(args, stage_names, args.force)
+        # All the stages that are up to date, not only the ones just run, so that running the steps one at a time
+        # (e.g. cli.py counts, strategies, tests) into one output folder adds up to the results of a full run.
+        results.records = pipeline.get_current_records(args)
+
+        if profiler is not None:
+            print("\n\nSaving the profile at", ", ".join(profiler.stop(args.output_folder_path)))
+        if instrumentation is not None:
+            instrumentation.print_summary()
+            print("Saving the timings at", instrumentation.save(os.path.join(args.output_folder_path, "timings.json")))
+
+        print("\n\nSaving the results at", ", ".join(results.save(args.output_folder_path)))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="compute_satellite_BDA_dataset_stats", description="This program replicates the results of the 2025 FAccT Paper INSERT NAME TODO.")
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
\ No newline at end of file
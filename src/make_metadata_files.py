@@ -2,6 +2,8 @@ import json
 import os
 import argparse
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import pandas as pd
@@ -20,53 +22,147 @@ def is_excluded_file(filename):
             return True
     return False
 
-if __name__ == "__main__":
+def list_directory(directory):
+    subdirectories = []
+    annotation_files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif ".tif.json" in entry.name and not ".cache" in directory:
+                stat = entry.stat()
+                annotation_files.append({"root": directory, "filename": entry.name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+    return subdirectories, annotation_files
+
+def scan_annotation_files(crasar_u_droids_dir, workers=8):
+    # Breadth first walk of the dataset that lists every directory of a level in parallel.
+    annotation_files = []
+    pending = [crasar_u_droids_dir]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending:
+            listings = list(executor.map(list_directory, pending))
+            pending = []
+            for subdirectories, files in listings:
+                pending.extend(subdirectories)
+                annotation_files.extend(files)
+    return sorted(annotation_files, key=lambda file: os.path.join(file["root"], file["filename"]))
+
+def index_statistics(stats_df):
+    # Keep the first row per orthomosaic, as the previous .iloc[0] lookups did.
+    stats_df = stats_df.drop_duplicates("Orthomosaic").set_index("Orthomosaic")
+    return stats_df[[PRE_OR_POST_EVENT, DATE, EVENT, SOURCE]].to_dict("index")
+
+def make_file_record(annotation_file, stats_index):
+    tif_name = annotation_file["filename"].replace(".json", "")
+    try:
+        stats = stats_index[tif_name]
+    except KeyError:
+        raise KeyError("Orthomosaic '" + tif_name + "' is missing from statistics.csv") from None
+
+    kind = None
+    if "suas" in annotation_file["root"].lower():
+        kind = "suas"
+    elif "satellite" in annotation_file["root"].lower():
+        kind = "satellite"
+    return {"tif_name": tif_name, "path": os.path.join(annotation_file["root"], annotation_file["filename"]), "kind": kind,
+            "is_post_disaster": stats[PRE_OR_POST_EVENT] == "POST", DATE: stats[DATE], EVENT: stats[EVENT], SOURCE: stats[SOURCE]}
+
+def match_satellite_to_suas(satellite_files, suas_files):
+    # Equivalent to testing `suas_file in sat_file` for every pair, but done with dict lookups of the satellite
+    # name's substrings that have the length of some sUAS name. Where several sUAS names match, the last one in
+    # suas_files wins, as it did in the nested loop.
+    suas_by_length = defaultdict(dict)
+    for order, suas_file in enumerate(suas_files):
+        suas_by_length[len(suas_file)][suas_file] = order
+
+    matches = {}
+    for sat_file in satellite_files:
+        best = None
+        for length, suas_names in suas_by_length.items():
+            for start in range(len(sat_file) - length + 1):
+                order = suas_names.get(sat_file[start:start + length])
+                if order is not None and (best is None or order > best[0]):
+                    best = (order, suas_files[order])
+        if best is not None:
+            matches[sat_file] = best[1]
+    return matches
+
+def load_manifest(manifest_path):
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return {"statistics": None, "files": {}}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def get_file_records(crasar_u_droids_dir, manifest, workers=8):
+    # Only files that are new or whose mtime/size changed since the manifest was written get a new record,
+    # and statistics.csv is only read when at least one record has to be (re)built.
+    statistics_path = os.path.join(crasar_u_droids_dir, "statistics.csv")
+    statistics_stat = os.stat(statistics_path)
+    statistics_signature = [statistics_stat.st_mtime_ns, statistics_stat.st_size]
+    previous_files = manifest["files"] if manifest["statistics"] == statistics_signature else {}
+
+    stats_index = None
+    files = {}
+    n_processed = 0
+    for annotation_file in scan_annotation_files(crasar_u_droids_dir, workers):
+        path = os.path.join(annotation_file["root"], annotation_file["filename"])
+        previous = previous_files.get(path)
+        if previous is not None and previous["mtime_ns"] == annotation_file["mtime_ns"] and previous["size"] == annotation_file["size"]:
+            files[path] = previous
+            continue
+        if stats_index is None:
+            stats_index = index_statistics(pd.read_csv(statistics_path))
+        files[path] = {"mtime_ns": annotation_file["mtime_ns"], "size": annotation_file["size"], "record": make_file_record(annotation_file, stats_index)}
+        n_processed += 1
+
+    print("Processed", n_processed, "new or changed annotation files, reused", len(files) - n_processed)
+    return {"statistics": statistics_signature, "files": files}
+
+def build_metadata(file_records):
+    suas_path_map = {}
+    satellite_path_map = {}
+    records = {}
 
-    parser = argparse.ArgumentParser(prog="make_metadata_files", description="This program produces the metatdata files necessary to run the replciation of the FAccT25 paper TODO")
+    for record in file_records:
+        records[record["tif_name"]] = record
+        if record["is_post_disaster"] and not is_excluded_file(record["tif_name"]):
+            if record["kind"] == "suas":
+                suas_path_map[record["tif_name"]] = record["path"]
+            elif record["kind"] == "satellite":
+                satellite_path_map[record["tif_name"]] = record["path"]
+
+    days_after_suas_ortho = {}
+
+    satellite_to_suas = match_satellite_to_suas(list(satellite_path_map.keys()), list(suas_path_map.keys()))
+    for sat_file, suas_file in satellite_to_suas.items():
+        days_after_suas_ortho[sat_file] = {EVENT: records[sat_file][EVENT],
+                                           SOURCE: records[sat_file][SOURCE],
+                                           FILENAME: sat_file,
+                                           DAYS_AFTER_SUAS_ORTHO: days_between(records[suas_file][DATE], records[sat_file][DATE])}
+
+    for suas_file in suas_path_map.keys():
+        days_after_suas_ortho[suas_file] = {EVENT: records[suas_file][EVENT],
+                                            SOURCE: records[suas_file][SOURCE],
+                                            FILENAME: suas_file,
+                                            DAYS_AFTER_SUAS_ORTHO: 0}
+
+    return suas_path_map, satellite_path_map, days_after_suas_ortho
+
+def add_arguments(parser):
     parser.add_argument("--crasar_u_droids_dir", type=str, help="The path to the satellite annotations file path map.")
     parser.add_argument("--output_stats_file", type=str, help="The path to the suas annotations file path map.")
     parser.add_argument("--output_suas_path_map", type=str, help="The path to the output folder file.")
     parser.add_argument("--output_satellite_path_map", type=str, help="The path to the multiview information.")
-    args = parser.parse_args()
+    parser.add_argument("--manifest_path", type=str, default=None, help="The path to a manifest of the scanned annotation files. When given, only new or changed files are processed on the next run.")
+    parser.add_argument("--workers", type=int, default=8, help="The number of threads used to scan the dataset directory.")
 
+def run(args):
     os.makedirs(os.path.split(args.output_stats_file)[0], exist_ok=True)
     os.makedirs(os.path.split(args.output_suas_path_map)[0], exist_ok=True)
     os.makedirs(os.path.split(args.output_satellite_path_map)[0], exist_ok=True)
 
-    stats_df = pd.read_csv(os.path.join(args.crasar_u_droids_dir, "statistics.csv"))
-
-    suas_path_map = {}
-    satellite_path_map = {}
-
-    ortho_date = {}
-
-    for root, dirs, files in os.walk(args.crasar_u_droids_dir):
-        for filename in files:
-            if ".tif.json" in filename and not ".cache" in root:
-                tif_name = filename.replace(".json", "")
-                is_post_disaster = stats_df[stats_df["Orthomosaic"] == tif_name][PRE_OR_POST_EVENT].iloc[0] == "POST"
-                ortho_date[tif_name] = stats_df[stats_df["Orthomosaic"] == tif_name][DATE].iloc[0]
-                if is_post_disaster and not is_excluded_file(tif_name):
-                    if "suas" in root.lower():
-                        suas_path_map[tif_name] = os.path.join(root, filename)
-                    elif "satellite" in root.lower():
-                        satellite_path_map[tif_name] = os.path.join(root, filename)
-
-    days_after_suas_ortho = {}
-
-    for sat_file in satellite_path_map.keys():
-        for suas_file in suas_path_map.keys(): 
-            if suas_file in sat_file:
-                days_after_suas_ortho[sat_file] = {EVENT:stats_df[stats_df["Orthomosaic"] == sat_file][EVENT].iloc[0],
-                                                   SOURCE:stats_df[stats_df["Orthomosaic"] == sat_file][SOURCE].iloc[0],
-                                                   FILENAME: sat_file,
-                                                   DAYS_AFTER_SUAS_ORTHO: days_between(ortho_date[suas_file], ortho_date[sat_file])}
-    
-    for suas_file in suas_path_map.keys():
-        days_after_suas_ortho[suas_file] = {EVENT:stats_df[stats_df["Orthomosaic"] == suas_file][EVENT].iloc[0],
-                                            SOURCE:stats_df[stats_df["Orthomosaic"] == suas_file][SOURCE].iloc[0],
-                                            FILENAME: suas_file,
-                                            DAYS_AFTER_SUAS_ORTHO: 0}
+    manifest = get_file_records(args.crasar_u_droids_dir, load_manifest(args.manifest_path), args.workers)
+    suas_path_map, satellite_path_map, days_after_suas_ortho = build_metadata([file["record"] for file in manifest["files"].values()])
 
     pd.DataFrame(days_after_suas_ortho).transpose().to_csv(args.output_stats_file, index=False)
 
@@ -78,4 +174,13 @@ if __name__ == "__main__":
     f.write(json.dumps(satellite_path_map))
     f.close()
 
+    if args.manifest_path is not None:
+        f = open(args.manifest_path, "w")
+        f.write(json.dumps(manifest))
+        f.close()
 
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="make_metadata_files", description="This program produces the metatdata files necessary to run the replciation of the FAccT25 paper TODO")
+    add_arguments(parser)
+    run(parser.parse_args())
\ No newline at end of file
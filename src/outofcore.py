@@ -0,0 +1,170 @@
+import os
+import sqlite3
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constants import BDA_DAMAGE_CLASSES, BDA_DAMAGE_CLASS_CODES, UNCLASSIFIED, OBSCURED, FILENAME
+from utils import encode_label, get_source_filename
+from loader import load_annotation_file, LoadReport
+from agreement import AgreementCounts
+
+OBSCURED_CODE = BDA_DAMAGE_CLASS_CODES[OBSCURED]
+UNCLASSIFIED_CODE = BDA_DAMAGE_CLASS_CODES[UNCLASSIFIED]
+
+SCHEMA = """
+CREATE TABLE orthos (code INTEGER PRIMARY KEY, name TEXT, kind TEXT);
+CREATE TABLE sources (code INTEGER PRIMARY KEY, name TEXT UNIQUE, days REAL);
+CREATE TABLE suas_views (id TEXT, label INTEGER, ortho INTEGER);
+CREATE TABLE satellite_views (id TEXT, label INTEGER, ortho INTEGER, source INTEGER);
+"""
+
+# Every view is one row of (building id, label code, ortho code[, source code]), i.e. a few dozen bytes instead of
+# a dict per building. Views are stored in load order, so that rowid order within a building id is the order
+# the in-memory pipeline sees the views in, and all the analysis runs as SQL aggregations or as one pass over
+# the views sorted by (id, rowid) that only keeps the current building in memory.
+class AnnotationStore:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+    @classmethod
+    def create(cls, path, suas_path_map, satellite_path_map, multiview_index, workers=8):
+        # Streams the annotation files into a new store at path, at most workers files in memory at a time. Like
+        # main.py, a sUAS file that fails to load raises and a satellite file that fails to load is skipped.
+        if os.path.exists(path):
+            os.remove(path)
+        store = cls(path)
+        store.connection.executescript(SCHEMA)
+        store.sources = {}
+        store.multiview_index = multiview_index
+        suas_report = store.insert_files("suas", suas_path_map, workers, on_error="raise")
+        satellite_report = store.insert_files("satellite", satellite_path_map, workers, on_error="skip")
+        store.connection.executescript("""
+            CREATE INDEX suas_views_id ON suas_views (id);
+            CREATE INDEX satellite_views_id ON satellite_views (id);
+            CREATE TABLE valid_ids (id TEXT PRIMARY KEY);
+            INSERT INTO valid_ids SELECT DISTINCT id FROM suas_views
+                WHERE id IN (SELECT id FROM satellite_views WHERE label != %d);
+            CREATE TABLE suas_labels (id TEXT PRIMARY KEY, label INTEGER);
+            INSERT INTO suas_labels SELECT id, label FROM suas_views
+                WHERE rowid IN (SELECT MAX(rowid) FROM suas_views WHERE id IN valid_ids GROUP BY id);
+        """ % OBSCURED_CODE)
+        store.connection.commit()
+        return store, suas_report, satellite_report
+
+    def insert_files(self, kind, path_map, workers, on_error):
+        report = LoadReport("sUAS" if kind == "suas" else "Satellite")
+        orthos = list(path_map.keys())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(orthos), workers):
+                batch = orthos[start:start + workers]
+                for ortho, (buildings, seconds, error) in zip(batch, executor.map(load_annotation_file, [path_map[ortho] for ortho in batch], [("id", "label", FILENAME)] * len(batch))):
+                    report.add(ortho, path_map[ortho], seconds, 0 if buildings is None else len(buildings), error)
+                    if error is not None:
+                        if on_error == "raise":
+                            raise error
+                        continue
+                    self.insert_buildings(kind, ortho, buildings)
+        return report
+
+    def insert_buildings(self, kind, ortho, buildings):
+        ortho_code = self.connection.execute("INSERT INTO orthos (name, kind) VALUES (?, ?)", (ortho, kind)).lastrowid
+        if kind == "suas":
+            rows = [(building["id"], encode_label(building["label"]), ortho_code) for building in buildings]
+            self.connection.executemany("INSERT INTO suas_views VALUES (?, ?, ?)", rows)
+            return
+        rows = [(building["id"], encode_label(building["label"]), ortho_code, self.get_source_code(get_source_filename(building))) for building in buildings]
+        self.connection.executemany("INSERT INTO satellite_views VALUES (?, ?, ?, ?)", rows)
+
+    def get_source_code(self, name):
+        # Days after the sUAS ortho are resolved once per source file. Files missing from the multiview stats get
+        # NULL days, which only raises if an analysis that needs the days reaches them.
+        if name not in self.sources:
+            days = self.multiview_index.days_after_suas(name) if name in self.multiview_index else None
+            self.sources[name] = self.connection.execute("INSERT INTO sources (name, days) VALUES (?, ?)", (name, None if days is None else float(days))).lastrowid
+        return self.sources[name]
+
+    def check_days(self):
+        missing = self.connection.execute("SELECT name FROM sources WHERE days IS NULL AND code IN (SELECT source FROM satellite_views WHERE label != ?) LIMIT 1", (OBSCURED_CODE,)).fetchone()
+        if missing is not None:
+            self.multiview_index.lookup(missing[0])
+
+    def get_valid_id_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM valid_ids").fetchone()[0]
+
+    def get_coincident_buildings_per_ortho(self, kind):
+        # {ortho: number of its views of a coincident building}, with every ortho of that kind (also those with 0).
+        counts = {name: 0 for (name,) in self.connection.execute("SELECT name FROM orthos WHERE kind = ? ORDER BY code", (kind,))}
+        table = "suas_views" if kind == "suas" else "satellite_views"
+        query = "SELECT o.name, COUNT(*) FROM " + table + " v JOIN orthos o ON v.ortho = o.code WHERE v.id IN valid_ids GROUP BY o.code"
+        counts.update(dict(self.connection.execute(query)))
+        return counts
+
+    def get_coincident_view_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM satellite_views WHERE label != ? AND id IN valid_ids", (OBSCURED_CODE,)).fetchone()[0]
+
+    def iterate_views(self, query, parameters=()):
+        # Yields (building id, [row, ...]) one building at a time from a query ordered by building id.
+        cursor = self.connection.execute(query, parameters)
+        for bld_id, rows in groupby(cursor, key=lambda row: row[0]):
+            yield bld_id, list(rows)
+
+    def get_strategy_agreement(self, strategies, chunk_size=65536):
+        # Runs the view selection strategies over the non obscured views of every coincident building and only
+        # keeps an agreement.AgreementCounts of the sUAS labels and the labels every strategy selected, updated
+        # every chunk_size buildings.
+        if any(strategy.uses_days for strategy in strategies.values()):
+            self.check_days()
+        agreement = AgreementCounts(["sUAS"] + list(strategies.keys()))
+        chunk = []
+        query = """SELECT v.id, v.label, s.days, l.label FROM satellite_views v
+                   JOIN suas_labels l ON v.id = l.id JOIN sources s ON v.source = s.code
+                   WHERE v.label != ? ORDER BY v.id, v.rowid"""
+        for bld_id, rows in self.iterate_views(query, (OBSCURED_CODE,)):
+            suas_code = rows[0][3]
+            suas_label = BDA_DAMAGE_CLASSES[suas_code]
+            codes = [suas_code]
+            for strategy in strategies.values():
+                state = None
+                for _, label_code, days, _ in rows:
+                    state = strategy.update(state, BDA_DAMAGE_CLASSES[label_code], suas_label, days)
+                codes.append(BDA_DAMAGE_CLASS_CODES[strategy.finalize(state)])
+            chunk.append(codes)
+            if len(chunk) == chunk_size:
+                agreement.update(np.array(chunk).T)
+                chunk = []
+        if chunk:
+            agreement.update(np.array(chunk).T)
+        return agreement
+
+    def get_paired_view_counts(self, ignore_unclassified=True):
+        # (n agreeing, n disagreeing) pairs of replicate.compute_paired_difference_views over the non obscured
+        # views grouped by days after the sUAS ortho: temporal groups are numbered in order of first appearance,
+        # and every view is paired with the last view of the same building in each later group.
+        self.check_days()
+        group_order = self.connection.execute("""SELECT s.days FROM satellite_views v JOIN sources s ON v.source = s.code
+                                                 WHERE v.label != ? GROUP BY s.days ORDER BY MIN(v.rowid)""", (OBSCURED_CODE,))
+        groups = {days: group for group, (days,) in enumerate(group_order)}
+        excluded = {OBSCURED_CODE, UNCLASSIFIED_CODE} if ignore_unclassified else {OBSCURED_CODE}
+
+        n_agree, n_disagree = 0, 0
+        query = """SELECT v.id, v.label, s.days FROM satellite_views v JOIN sources s ON v.source = s.code
+                   WHERE v.label != ? ORDER BY v.id, v.rowid"""
+        for bld_id, rows in self.iterate_views(query, (OBSCURED_CODE,)):
+            last_labels = {groups[days]: label for _, label, days in rows}
+            for _, label, days in rows:
+                if label in excluded:
+                    continue
+                group = groups[days]
+                for other_group, other_label in last_labels.items():
+                    if other_group > group and other_label not in excluded:
+                        if label == other_label:
+                            n_agree += 1
+                        else:
+                            n_disagree += 1
+        return n_agree, n_disagree
+
+    def close(self):
+        self.connection.close()
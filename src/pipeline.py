@@ -0,0 +1,151 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from contextlib import nullcontext
+
+from results import Results, to_python
+
+STATE_FOLDER = ".stages"
+
+def get_code_version(folder=os.path.dirname(os.path.abspath(__file__))):
+    # Hash of the source of every module next to this one, so that editing any code a stage calls (not only the
+    # stage function itself) changes every stage key.
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith(".py"):
+            with open(os.path.join(folder, filename), "rb") as f:
+                digest.update(filename.encode("utf-8") + f.read())
+    return digest.hexdigest()
+
+class Stage:
+    # A named step of the pipeline. function(args, results, **inputs) receives the outputs of the stages named in
+    # inputs as keyword arguments, may add records to results, and returns the stage's output. Only the args
+    # named in params (and the code) are part of the stage's key. A stage that writes files gives files, a
+    # function of its output returning their paths, and is recomputed when one of them no longer exists.
+    def __init__(self, name, function, inputs=(), params=(), files=None):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.params = list(params)
+        self.files = files
+
+class Pipeline:
+    # Runs stages in dependency order and persists every stage's output next to a manifest holding the stage's
+    # key and the content hash of its output. A stage's key hashes the code (see get_code_version), its params
+    # and the content hashes of its inputs, so a rerun only recomputes the stages downstream of whatever changed, and stops early when
+    # a recomputed stage produces the same output as before. Given an instrument.Instrumentation, every stage
+    # that is recomputed is timed.
+    def __init__(self, stages, state_folder, instrumentation=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_folder = state_folder
+        self.instrumentation = instrumentation
+        self.outputs = {}
+        self.code_version = get_code_version()
+
+    def get_order(self, stage_names=None):
+        if stage_names is None:
+            stage_names = list(self.stages.keys())
+        for name in stage_names:
+            if name not in self.stages:
+                raise ValueError("Unknown stage '" + name + "', expected one of " + ", ".join(self.stages.keys()))
+        order = []
+        def visit(name):
+            if name in order:
+                return
+            for input_name in self.stages[name].inputs:
+                visit(input_name)
+            order.append(name)
+        for name in self.stages:
+            if name in stage_names:
+                visit(name)
+        return order
+
+    def get_key(self, stage, args, content_hashes):
+        params = {param: to_python(getattr(args, param)) for param in stage.params}
+        inputs = [content_hashes[input_name] for input_name in stage.inputs]
+        description = json.dumps([stage.name, self.code_version, inspect.getsource(stage.function), params, inputs], default=str)
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def get_paths(self, name):
+        return os.path.join(self.state_folder, name + ".json"), os.path.join(self.state_folder, name + ".pkl")
+
+    def read_manifest(self, name):
+        manifest_path, output_path = self.get_paths(name)
+        if not os.path.exists(manifest_path) or not os.path.exists(output_path):
+            return None
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    def has_files(self, stage):
+        if stage.files is None:
+            return True
+        return all(os.path.exists(path) for path in stage.files(self.get_output(stage.name)))
+
+    def get_current_manifest(self, stage, key):
+        # The persisted manifest of stage if it is up to date with key, else None.
+        manifest = self.read_manifest(stage.name)
+        if manifest is None or manifest["key"] != key:
+            return None
+        if not self.has_files(stage):
+            print("Stage", stage.name, "is missing files it wrote, recomputing it")
+            return None
+        return manifest
+
+    def get_output(self, name):
+        if name not in self.outputs:
+            with open(self.get_paths(name)[1], "rb") as f:
+                self.outputs[name] = pickle.load(f)
+        return self.outputs[name]
+
+    def run_stage(self, stage, args, key):
+        results = Results()
+        inputs = {input_name: self.get_output(input_name) for input_name in stage.inputs}
+        with nullcontext() if self.instrumentation is None else self.instrumentation.measure(stage.name, "stage"):
+            output = stage.function(args, results, **inputs)
+
+        serialized = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest = {"key": key, "content_hash": hashlib.sha256(serialized).hexdigest(), "records": results.records}
+        manifest_path, output_path = self.get_paths(stage.name)
+        os.makedirs(self.state_folder, exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(serialized)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, default=to_python)
+        self.outputs[stage.name] = output
+        return manifest
+
+    def run(self, args, stage_names=None, force=False):
+        # Returns the records of every stage that was run or found up to date, in pipeline order. force only
+        # recomputes the requested stages, the stages they depend on are still reused when up to date.
+        content_hashes = {}
+        records = []
+        for name in self.get_order(stage_names):
+            stage = self.stages[name]
+            key = self.get_key(stage, args, content_hashes)
+            forced = force and (stage_names is None or name in stage_names)
+            manifest = None if forced else self.get_current_manifest(stage, key)
+            if manifest is None:
+                manifest = self.run_stage(stage, args, key)
+            else:
+                print("Stage", name, "is up to date, reusing", self.get_paths(name)[1])
+            content_hashes[name] = manifest["content_hash"]
+            records.extend(manifest["records"])
+        return records
+
+    def get_current_records(self, args):
+        # The records of every stage whose persisted output is up to date with args and the code, in pipeline
+        # order, without running anything. After running a subset of the stages, these are the results of all
+        # the steps run so far in the same state folder.
+        content_hashes = {}
+        records = []
+        for name in self.get_order():
+            stage = self.stages[name]
+            if any(input_name not in content_hashes for input_name in stage.inputs):
+                continue
+            manifest = self.get_current_manifest(stage, self.get_key(stage, args, content_hashes))
+            if manifest is not None:
+                content_hashes[name] = manifest["content_hash"]
+                records.extend(manifest["records"])
+        return records
@@ -3,12 +3,16 @@ import os
 from collections import defaultdict
 
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
 
 from constants import BDA_DAMAGE_CLASSES, OBSCURED
+from utils import as_building_index
 
-def plot_transistion_matrix(suas_id2labels, sat_id2labels, plot_folder, prefix="", ignore_obscured=True):
+# matplotlib and sklearn are imported by the plotting functions, so that importing this module (e.g. for
+# get_views_per_building) does not pay for them when no figure is drawn.
+
+def plot_transistion_matrix(suas_id2labels, sat_id2labels, plot_folder, prefix="", ignore_obscured=True, fig_format="png"):
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import confusion_matrix
 
     suas_labels = [suas_id2labels[bld_id] for bld_id in sat_id2labels]
     sat_labels = [sat_id2labels[bld_id] for bld_id in sat_id2labels]
@@ -33,10 +37,15 @@ def plot_transistion_matrix(suas_id2labels, sat_id2labels, plot_folder, prefix="
             plt.ylabel("Drone", fontsize=15)
     plt.title(prefix + " vs. Drone Confusion Matrix | N=" + str(len(sat_labels)), fontsize=18)
 
-    print("Saving Confusion Matrix at ", str(os.path.join(plot_folder, prefix + "suas_vs_satellite_transition_matrix.png")))
-    plt.savefig(os.path.join(plot_folder, prefix + "suas_vs_satellite_transition_matrix.png"), dpi=300, bbox_inches="tight")
+    plot_path = os.path.join(plot_folder, prefix + "suas_vs_satellite_transition_matrix." + fig_format)
+    print("Saving Confusion Matrix at ", str(plot_path))
+    plt.savefig(plot_path, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return plot_path
+
+def plot_mulistrategy_class_balances(suas_damage_counts, sat_multistrategy_damage_counts, plot_folder, valid_ids=None, fig_format="png"):
+    import matplotlib.pyplot as plt
 
-def plot_mulistrategy_class_balances(suas_damage_counts, sat_multistrategy_damage_counts, plot_folder, valid_ids):
     all_bars = {"Drone": suas_damage_counts}
     for strategy_name in sat_multistrategy_damage_counts.keys():
         all_bars[strategy_name] = sat_multistrategy_damage_counts[strategy_name]
@@ -84,17 +93,28 @@ def plot_mulistrategy_class_balances(suas_damage_counts, sat_multistrategy_damag
 
     ax.set_ylim(0, max_bar * 1.2)
 
-    print("Saving Class Balance Figure at ", str(os.path.join(plot_folder, "suas_vs_satellite_strat_bda_class_balances.png")))
-    plt.savefig(os.path.join(plot_folder, "suas_vs_satellite_multistrat_bda_class_balances.png"), dpi=300, bbox_inches="tight")
+    plot_path = os.path.join(plot_folder, "suas_vs_satellite_multistrat_bda_class_balances." + fig_format)
+    print("Saving Class Balance Figure at ", str(plot_path))
+    plt.savefig(plot_path, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return plot_path
 
-def plot_sat_views_per_building_histogram(satellite_data, valid_ids, plot_folder, file_prefix=""):
+def get_views_per_building(satellite_data, valid_ids):
+    valid_ids = as_building_index(valid_ids)
     views_per_building = defaultdict(lambda: 0)
     for data in satellite_data:
         for building in data:
             if building["id"] in valid_ids:
                 views_per_building[building["id"]] += 1
-    
-    x = list(views_per_building.values())
+    return list(views_per_building.values())
+
+def plot_sat_views_per_building_histogram(satellite_data, valid_ids, plot_folder, file_prefix="", fig_format="png"):
+    return plot_views_per_building_histogram(get_views_per_building(satellite_data, valid_ids), plot_folder, file_prefix, fig_format)
+
+def plot_views_per_building_histogram(views_per_building, plot_folder, file_prefix="", fig_format="png"):
+    import matplotlib.pyplot as plt
+
+    x = list(views_per_building)
 
     tick_positions = [1.5, 2.5, 3.5, 4.5]
 
@@ -110,5 +130,8 @@ def plot_sat_views_per_building_histogram(satellite_data, valid_ids, plot_folder
     for x, val in zip(tick_positions, n):
         ax.annotate(f"{int(val)}", xy=(x, val), xytext=(0, 3), textcoords="offset points", ha="center", va="bottom", fontsize=14,)
 
-    print("Saving view histogram figure at ", str(os.path.join(plot_folder, file_prefix + "view_histogram.png")))
-    plt.savefig(os.path.join(plot_folder, file_prefix + "satellite_view_counts_per_building.png"), dpi=300, bbox_inches="tight")
+    plot_path = os.path.join(plot_folder, file_prefix + "satellite_view_counts_per_building." + fig_format)
+    print("Saving view histogram figure at ", str(plot_path))
+    plt.savefig(plot_path, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return plot_path
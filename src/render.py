@@ -0,0 +1,27 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import plot
+
+PLOT_FORMATS = ["png", "svg", "pdf"]
+
+# A plot spec is the name of a plotting function in plot.py with the (already computed) data to call it with,
+# so that figures can be drawn away from the process that did the analysis.
+def make_plot_spec(function_name, *args, **kwargs):
+    return (function_name, args, kwargs)
+
+def use_headless_backend():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def render_plot_spec(spec, fig_format="png"):
+    function_name, args, kwargs = spec
+    return getattr(plot, function_name)(*args, fig_format=fig_format, **kwargs)
+
+def render_plot_specs(plot_specs, fig_format="png", workers=1):
+    # Returns the paths of the saved figures.
+    if workers <= 1:
+        use_headless_backend()
+        return [render_plot_spec(spec, fig_format) for spec in plot_specs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as executor:
+        return list(executor.map(render_plot_spec, plot_specs, [fig_format] * len(plot_specs)))
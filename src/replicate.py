@@ -2,160 +2,112 @@ import os
 import json
 import argparse
 
-from collections import defaultdict
-from itertools import combinations
-
 import pandas as pd
 import numpy as np
 
-from constants import DAYS_AFTER_SUAS_ORTHO, FILENAME, UNCLASSIFIED, OBSCURED
+from constants import UNCLASSIFIED, OBSCURED, BDA_DAMAGE_CLASS_CODES
+from utils import as_multiview_index, get_source_filename, get_aligned_label_codes, get_obscured_mask
+from strategies import get_swapped_unclassified_label, select_views, CheatStrategy, OracleStrategy, AntiOracleStrategy, ClosestInTimeStrategy
+from strategy_cache import STRATEGY_CACHE
+from view_table import ViewTable
 
 def get_probability_of_disagreement(suas_id2labels, sat_id2labels, ignore_sat_obscured=False):
-    count_agree = 0
-    count_disagree = 0
-    for bld_id in suas_id2labels.keys():
-        if (ignore_sat_obscured and sat_id2labels[bld_id] != OBSCURED) or not ignore_sat_obscured:
-            if suas_id2labels[bld_id] == sat_id2labels[bld_id]:
-                count_agree += 1
-            else:
-                count_disagree += 1
-    return count_disagree / (count_agree + count_disagree)
-
-def get_swapped_unclassified_label(base_label, new_label, ignore_lone_unclassified):
-    if base_label is None:
-        return new_label
-    if (
-        new_label == UNCLASSIFIED
-        and base_label != UNCLASSIFIED
-        and ignore_lone_unclassified
-    ):
-        return base_label
-    return new_label
-
-def get_best_cheat_label_for_building(suas_data, satellite_data, valid_ids, comparison, ignore_lone_unclassified=True):
-    sUAS_labels = {}
-
-    for data in suas_data:
-        for building in data:
-            if building["id"] in valid_ids:
-                sUAS_labels[building["id"]] = building["label"]
-
-    satellite_labels = defaultdict(lambda: None)
-    for data in satellite_data:
-        for building in data:
-            if building["id"] in valid_ids:
-                new_label = get_swapped_unclassified_label(
-                    satellite_labels[building["id"]],
-                    building["label"],
-                    ignore_lone_unclassified,
-                )
-                if satellite_labels[building["id"]] is None:
-                    satellite_labels[building["id"]] = new_label
-                elif comparison(new_label, sUAS_labels[building["id"]]):
-                    satellite_labels[building["id"]] = new_label
-
-    return sUAS_labels, satellite_labels
-
-def get_best_antioracle_label_for_building(suas_data, satellite_data, valid_ids, ignore_lone_unclassified=True):
-    neq = lambda a,b:a!=b
-    return get_best_cheat_label_for_building(suas_data, satellite_data, valid_ids, comparison=neq, ignore_lone_unclassified=True)
-
-def get_best_oracle_label_for_building(suas_data, satellite_data, valid_ids, ignore_lone_unclassified=True):
-    eq = lambda a,b:a==b
-    return get_best_cheat_label_for_building(suas_data, satellite_data, valid_ids, comparison=eq, ignore_lone_unclassified=True)
-
-def get_best_temporal_label_for_building(suas_data, satellite_data, valid_ids, multiview_info, sort_strategy="abs", ignore_lone_unclassified=True):
-    sUAS_labels = {}
-
-    for data in suas_data:
-        for building in data:
-            if building["id"] in valid_ids:
-                sUAS_labels[building["id"]] = building["label"]
-
-    satellite_labels = defaultdict(lambda: None)
-    for data in satellite_data:
-        for building in data:
-            if building["id"] in valid_ids:
-                new_label = building["label"]
-                if satellite_labels[building["id"]]:
-                    new_label = get_swapped_unclassified_label(satellite_labels[building["id"]][0], building["label"], ignore_lone_unclassified,)
-                source_filename_label = building[FILENAME].split("\\")[-1].replace(".json", "")
-                days_after_suas_ortho = multiview_info[multiview_info[FILENAME] == source_filename_label][DAYS_AFTER_SUAS_ORTHO].iloc[0]
-                if sort_strategy == "abs":
-                    days_after_suas_ortho = np.abs(days_after_suas_ortho)
-                elif sort_strategy == "real":
-                    pass
-                if satellite_labels[building["id"]] is None:
-                    satellite_labels[building["id"]] = [new_label, days_after_suas_ortho]
-                elif satellite_labels[building["id"]][1] > days_after_suas_ortho:
-                    satellite_labels[building["id"]] = [new_label, days_after_suas_ortho]
-
-    resulting_sat_labels = {}
-    for bld_id, value in satellite_labels.items():
-        if not value is None:
-            label, _ = value
-            resulting_sat_labels[bld_id] = label
-
-    return sUAS_labels, resulting_sat_labels
+    _, (suas_codes, sat_codes) = get_aligned_label_codes(suas_id2labels, sat_id2labels)
+    mask = get_obscured_mask(sat_codes, ignore_sat_obscured)
+    count_disagree = int(np.count_nonzero(suas_codes[mask] != sat_codes[mask]))
+    return count_disagree / int(np.count_nonzero(mask))
+
+def get_probability_of_disagreement_from_confusion(confusion, ignore_sat_obscured=False):
+    # The same probability from an analysis.get_confusion_matrix of the two label sets.
+    confusion = np.array(confusion)
+    if ignore_sat_obscured:
+        confusion[:, BDA_DAMAGE_CLASS_CODES[OBSCURED]] = 0
+    n_buildings = int(confusion.sum())
+    return (n_buildings - int(np.trace(confusion))) / n_buildings
+
+# Given the dataset fingerprint, the get_best_*_label_for_building functions reuse the candidate views and the
+# selections memoized in strategy_cache.STRATEGY_CACHE (or the given cache) across parameter variations.
+def select_strategy_views(suas_data, satellite_data, valid_ids, strategy, multiview_index=None, fingerprint=None, cache=None):
+    if fingerprint is None:
+        return select_views(suas_data, satellite_data, valid_ids, {"selected": strategy}, multiview_index)["selected"]
+    cache = STRATEGY_CACHE if cache is None else cache
+    return cache.select_views(fingerprint, suas_data, satellite_data, valid_ids, {"selected": strategy}, multiview_index)["selected"]
+
+def get_best_cheat_label_for_building(suas_data, satellite_data, valid_ids, comparison, ignore_lone_unclassified=True, fingerprint=None, cache=None):
+    strategy = CheatStrategy(comparison, ignore_lone_unclassified)
+    return select_strategy_views(suas_data, satellite_data, valid_ids, strategy, fingerprint=fingerprint, cache=cache)
+
+def get_best_antioracle_label_for_building(suas_data, satellite_data, valid_ids, ignore_lone_unclassified=True, fingerprint=None, cache=None):
+    return select_strategy_views(suas_data, satellite_data, valid_ids, AntiOracleStrategy(ignore_lone_unclassified), fingerprint=fingerprint, cache=cache)
+
+def get_best_oracle_label_for_building(suas_data, satellite_data, valid_ids, ignore_lone_unclassified=True, fingerprint=None, cache=None):
+    return select_strategy_views(suas_data, satellite_data, valid_ids, OracleStrategy(ignore_lone_unclassified), fingerprint=fingerprint, cache=cache)
+
+def get_best_temporal_label_for_building(suas_data, satellite_data, valid_ids, multiview_index, sort_strategy="abs", ignore_lone_unclassified=True, fingerprint=None, cache=None):
+    strategy = ClosestInTimeStrategy(sort_strategy, ignore_lone_unclassified)
+    return select_strategy_views(suas_data, satellite_data, valid_ids, strategy, multiview_index, fingerprint, cache)
+
+def get_temporal_view_frame(temporal_views, fields):
+    # One row per (temporal group, building view), with NaN where a view has no value for a view property field.
+    property_fields = [field for field in fields if field != "days"]
+    groups, days, ids, labels = [], [], [], []
+    properties = {field: [] for field in property_fields}
+    for group, (day, view) in enumerate(temporal_views.items()):
+        for building in view:
+            groups.append(group)
+            days.append(day)
+            ids.append(building["id"])
+            labels.append(building["label"])
+            view_properties = building.get("view_properties") or {}
+            for field in property_fields:
+                properties[field].append(view_properties.get(field, np.nan))
+
+    frame = pd.DataFrame({"group": groups, "days": days, "id": ids, "label": labels})
+    for field in property_fields:
+        frame[field] = pd.to_numeric(pd.Series(properties[field], dtype=object), errors="coerce").astype(float)
+    frame["label_code"] = pd.factorize(frame["label"])[0]
+    frame["row"] = np.arange(len(frame))
+    return frame
+
+def compute_paired_difference_views_multi(temporal_views, fields, ignore_unclassified=True, ignore_obscured=True):
+    # Pairs every view of a building with its views in each later temporal group through a single self-join on
+    # building id, and returns {field: (agree_dist, disagree_dist)} for every requested field at once. Given a
+    # view_table.ViewTable instead of the temporal groups, its segment reduction computes the same pairs.
+    if isinstance(temporal_views, ViewTable):
+        return temporal_views.compute_paired_difference_views_multi(fields, ignore_unclassified, ignore_obscured)
+    frame = get_temporal_view_frame(temporal_views, fields)
+
+    # Like the dict lookup per pair of groups, the second view of a pair is the last view of the building in its group.
+    second_views = frame.drop_duplicates(["group", "id"], keep="last")
+    pairs = frame.merge(second_views, on="id", suffixes=("_1", "_2"))
+    pairs = pairs[pairs["group_1"] < pairs["group_2"]].sort_values(["group_1", "group_2", "row_1"])
+
+    keep = np.ones(len(pairs), dtype=bool)
+    if ignore_unclassified:
+        keep &= ~((pairs["label_1"] == UNCLASSIFIED) | (pairs["label_2"] == UNCLASSIFIED)).to_numpy()
+    if ignore_obscured:
+        keep &= ~((pairs["label_1"] == OBSCURED) | (pairs["label_2"] == OBSCURED)).to_numpy()
+    agree = (pairs["label_code_1"] == pairs["label_code_2"]).to_numpy()
+
+    result = {}
+    for field in fields:
+        values = np.abs(pairs[field + "_1"].to_numpy() - pairs[field + "_2"].to_numpy())
+        valid = keep
+        if field != "days":
+            valid = keep & ~np.isnan(values)
+        result[field] = (values[valid & agree], values[valid & ~agree])
+    return result
 
 def compute_paired_difference_views(temporal_views, field, ignore_unclassified=True, ignore_obscured=True):
-    sat_view_1 = []
-    sat_view_2 = []
-
-    for (day1, view1), (day2, view2) in combinations(temporal_views.items(), 2):
-        buildings_day2 = {building["id"]: building for building in view2}
-        delta_days = np.abs(day1 - day2)
-        for building1 in view1:
-            building_id = building1["id"]
-            if building_id in buildings_day2:
-                value = None
-                valid = False
-
-                if field == "days":
-                    value = delta_days
-                    valid = True
-                else:
-                    try:
-                        field1 = building1["view_properties"][field]
-                        field2 = buildings_day2[building_id]["view_properties"][field]
-                        value = np.abs(field1 - field2)
-                        valid = True
-                    except KeyError:
-                        pass
-                if valid:
-                    label1 = building1["label"]
-                    label2 = buildings_day2[building_id]["label"]
-                    if not (
-                        (
-                            (label1 == UNCLASSIFIED or label2 == UNCLASSIFIED)
-                            and ignore_unclassified
-                        )
-                        or (
-                            (label1 == OBSCURED or label2 == OBSCURED)
-                            and ignore_obscured
-                        )
-                    ):
-                        sat_view_1.append([label1, value])
-                        sat_view_2.append([label2, value])
-
-    agree_dist = []
-    disagree_dist = []
-    for i, (label1, field) in enumerate(sat_view_1):
-        if label1 == sat_view_2[i][0]:
-            agree_dist.append(field)
-        else:
-            disagree_dist.append(field)
-    return agree_dist, disagree_dist
-
-def group_buildings_temporally(satellite_data, multiview_info):
+    return compute_paired_difference_views_multi(temporal_views, [field], ignore_unclassified, ignore_obscured)[field]
+
+def group_buildings_temporally(satellite_data, multiview_index):
+    multiview_index = as_multiview_index(multiview_index)
     group_temporal = {}
 
     for data in satellite_data:
         for building in data:
-            source_filename_label = building[FILENAME].split("\\")[-1].replace(".json", "")
-            if len(multiview_info[multiview_info[FILENAME] == source_filename_label]) == 0:
-                print(source_filename_label)
-            days_after_suas_ortho = multiview_info[multiview_info[FILENAME] == source_filename_label][DAYS_AFTER_SUAS_ORTHO].iloc[0]
+            days_after_suas_ortho = multiview_index.days_after_suas(get_source_filename(building))
             if days_after_suas_ortho not in group_temporal.keys():
                 group_temporal[days_after_suas_ortho] = []
             group_temporal[days_after_suas_ortho].append(building)
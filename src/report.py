@@ -0,0 +1,66 @@
+from analysis import get_building_count_per_disaster, get_ortho_count_per_disaster, chi_squared_test_from_counts, \
+                     z_test_per_label_from_counts, get_underestimation_rate_from_counts
+from replicate import get_probability_of_disagreement_from_confusion
+
+def report_counts(results, suas_coincident_buildings_per_ortho, sat_coincident_buildings_per_ortho, coincident_view_count, multiview_index):
+    print("\n\nComputing sUAS vs Satellite Statistics....")
+    print("Count of coincident buildings:", results.add("coincident_buildings", sum(suas_coincident_buildings_per_ortho.values())))
+    print("Count of coincident views:", results.add("coincident_views", coincident_view_count))
+    print("Count of coincident buildings per disaster:", results.add_label_values("coincident_buildings_per_disaster", get_building_count_per_disaster(suas_coincident_buildings_per_ortho, multiview_index)))
+    print("Count of sUAS orthomosaics per disaster:", results.add_label_values("orthomosaics_per_disaster", get_ortho_count_per_disaster(suas_coincident_buildings_per_ortho, multiview_index, "sUAS"), comparison="sUAS"))
+    print("Count of satellite orthomosaics per disaster:", results.add_label_values("orthomosaics_per_disaster", get_ortho_count_per_disaster(sat_coincident_buildings_per_ortho, multiview_index, "Satellite"), comparison="Satellite"))
+
+def report_strategy_tests(results, agreement):
+    # agreement is an agreement.AgreementCounts of sUAS (first) and the selected satellite labels of every strategy
+    # over the coincident buildings.
+    n_buildings = agreement.n_buildings
+    label_counts = {name: agreement.get_label_counts("sUAS", name) for name in agreement.names[1:]}
+    n_observations = [n_buildings, n_buildings]
+
+    print("\n\nAre the sUAS and Satellite distributions different? (Is p < 0.001?)")
+    print("sUAS and Closest to Disaster (Ignore Obscured):", results.add("chi_squared_p", chi_squared_test_from_counts(*label_counts["closest_to_drone"]), "closest_to_drone", "sUAS", n=n_buildings))
+    print("\tP-Value By Label:", results.add_label_values("z_test_p", z_test_per_label_from_counts(*label_counts["closest_to_drone"], n_observations), "closest_to_drone", "sUAS", n=n_buildings))
+    print("sUAS and Closest to sUAS (Ignore Obscured):", results.add("chi_squared_p", chi_squared_test_from_counts(*label_counts["closest_to_disaster"]), "closest_to_disaster", "sUAS", n=n_buildings))
+    print("\tP-Value By Label:", results.add_label_values("z_test_p", z_test_per_label_from_counts(*label_counts["closest_to_disaster"], n_observations), "closest_to_disaster", "sUAS", n=n_buildings))
+    print("sUAS and Oracle (Ignore Obscured):", results.add("chi_squared_p", chi_squared_test_from_counts(*label_counts["oracle"]), "oracle", "sUAS", n=n_buildings))
+    print("\tP-Value By Label:", results.add_label_values("z_test_p", z_test_per_label_from_counts(*label_counts["oracle"], n_observations), "oracle", "sUAS", n=n_buildings))
+    print("sUAS and Anti-Oracle (Ignore Obscured):", results.add("chi_squared_p", chi_squared_test_from_counts(*label_counts["anti_oracle"]), "anti_oracle", "sUAS", n=n_buildings))
+    print("\tP-Value By Label:", results.add_label_values("z_test_p", z_test_per_label_from_counts(*label_counts["anti_oracle"], n_observations), "anti_oracle", "sUAS", n=n_buildings))
+
+    print("\n\nAre the Oracle and Anti-Oracle Distributions Different? (Is p < 0.001?)")
+    oracle_antioracle_label_counts = agreement.get_label_counts("oracle", "anti_oracle")
+    print("Oracle and Anti-Oracle (Ignore Obscured):", results.add("chi_squared_p", chi_squared_test_from_counts(*oracle_antioracle_label_counts), "oracle", "anti_oracle", n=n_buildings))
+    print("\tP-Value By Label:", results.add_label_values("z_test_p", z_test_per_label_from_counts(*oracle_antioracle_label_counts, n_observations), "oracle", "anti_oracle", n=n_buildings))
+
+    print("\n\nAre any view selection strategies different signficantly from one another (Is p < 0.001?, Holm corrected over the strategy pairs)")
+    pair_table = agreement.get_pair_table(names=agreement.names[1:])
+    for row in pair_table.itertuples():
+        print("\t", row.source_1, row.source_2, results.add("chi_squared_p", row.chi_squared_p, row.source_1, row.source_2, n=n_buildings, p_corrected=row.chi_squared_p_corrected), "corrected", row.chi_squared_p_corrected)
+
+    print("\n\nWhat is the Probability of Disagreement for the different view selection strategies?")
+    oracle_disagreement_prob_ignore_obscured = get_probability_of_disagreement_from_confusion(agreement.get_confusion("sUAS", "oracle"))
+    antioracle_disagreement_prob_ignore_obscured = get_probability_of_disagreement_from_confusion(agreement.get_confusion("sUAS", "anti_oracle"))
+    closest_to_suas_disagreement_prob_ignore_obscured = get_probability_of_disagreement_from_confusion(agreement.get_confusion("sUAS", "closest_to_drone"))
+    closest_to_disaster_disagreement_prob_ignore_obscured = get_probability_of_disagreement_from_confusion(agreement.get_confusion("sUAS", "closest_to_disaster"))
+
+    print("\tclosest_to_disaster_disagreement_prob_ignore_obscured", results.add("disagreement_probability", closest_to_disaster_disagreement_prob_ignore_obscured, "closest_to_disaster", "sUAS", n=n_buildings))
+    print("\tclosest_to_suas_disagreement_prob_ignore_obscured", results.add("disagreement_probability", closest_to_suas_disagreement_prob_ignore_obscured, "closest_to_drone", "sUAS", n=n_buildings))
+    print("\toracle_disagreement_prob_ignore_obscured", results.add("disagreement_probability", oracle_disagreement_prob_ignore_obscured, "oracle", "sUAS", n=n_buildings))
+    print("\tantioracle_disagreement_prob_ignore_obscured", results.add("disagreement_probability", antioracle_disagreement_prob_ignore_obscured, "anti_oracle", "sUAS", n=n_buildings))
+
+    print("\n\nWhat are the under-estimation rates of the different strategies per label?")
+    oracle_overestimation_rate_ignore_obscured = get_underestimation_rate_from_counts(*label_counts["oracle"])
+    antioracle_overestimation_rate_ignore_obscured = get_underestimation_rate_from_counts(*label_counts["anti_oracle"])
+    closest_to_suas_overestimation_rate_ignore_obscured = get_underestimation_rate_from_counts(*label_counts["closest_to_drone"])
+    closest_to_disaster_overestimation_rate_ignore_obscured = get_underestimation_rate_from_counts(*label_counts["closest_to_disaster"])
+
+    print("\tclosest_to_disaster_overestimation_rate_ignore_obscured", results.add_label_values("underestimation_rate", closest_to_disaster_overestimation_rate_ignore_obscured, "closest_to_disaster", "sUAS", n=n_buildings))
+    print("\tclosest_to_suas_overestimation_rate_ignore_obscured", results.add_label_values("underestimation_rate", closest_to_suas_overestimation_rate_ignore_obscured, "closest_to_drone", "sUAS", n=n_buildings))
+    print("\toracle_overestimation_rate_ignore_obscured", results.add_label_values("underestimation_rate", oracle_overestimation_rate_ignore_obscured, "oracle", "sUAS", n=n_buildings))
+    print("\tantioracle_overestimation_rate_ignore_obscured", results.add_label_values("underestimation_rate", antioracle_overestimation_rate_ignore_obscured, "anti_oracle", "sUAS", n=n_buildings))
+
+def report_paired_views(results, n_agree, n_disagree):
+    disagree_rate = n_disagree / (n_disagree + n_agree)
+    view_count = n_disagree + n_agree
+    print("\n\nProbability of Disagreement between time/view satellite", disagree_rate, "N=", view_count, "N_disagree=", n_disagree, "N_agree=", n_agree)
+    results.add("paired_view_disagreement_probability", disagree_rate, comparison="Satellite", n=view_count, n_disagree=n_disagree, n_agree=n_agree)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ["metric", "value", "strategy", "comparison", "label", "n"]
+
+def to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class Results:
+    # Every number main.py reports, one record per (metric, strategy, comparison, label), plus metadata such
+    # as the dataset fingerprint and arguments that produced them.
+    def __init__(self, metadata=None):
+        self.metadata = dict(metadata or {})
+        self.records = []
+
+    def add(self, metric, value, strategy=None, comparison=None, label=None, n=None, **extra):
+        record = {"metric": metric, "value": to_python(value), "strategy": strategy, "comparison": comparison, "label": label, "n": to_python(n)}
+        record.update({key: to_python(extra_value) for key, extra_value in extra.items()})
+        self.records.append(record)
+        return value
+
+    def add_label_values(self, metric, values_per_label, strategy=None, comparison=None, n=None, **extra):
+        for label, value in values_per_label.items():
+            self.add(metric, value, strategy, comparison, label, n, **extra)
+        return values_per_label
+
+    def add_frame(self, frame, **extra):
+        for record in frame.to_dict("records"):
+            record.update(extra)
+            metric = record.pop("metric")
+            value = record.pop("value")
+            self.add(metric, value, **record)
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.records)
+        extra_columns = [column for column in frame.columns if column not in RESULT_COLUMNS]
+        return frame.reindex(columns=RESULT_COLUMNS + extra_columns)
+
+    def to_dict(self):
+        return {"metadata": self.metadata, "results": self.records}
+
+    def save(self, output_folder, name="results"):
+        # Always writes <name>.json, and <name>.parquet when a parquet engine (pyarrow or fastparquet) is installed.
+        json_path = os.path.join(output_folder, name + ".json")
+        with open(json_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1, default=to_python)
+        saved_paths = [json_path]
+        try:
+            parquet_path = os.path.join(output_folder, name + ".parquet")
+            self.to_frame().to_parquet(parquet_path, index=False)
+            saved_paths.append(parquet_path)
+        except ImportError:
+            pass
+        return saved_paths
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            content = json.load(f)
+        results = cls(content["metadata"])
+        results.records = content["results"]
+        return results
+
+def load_current_results(output_folder, metadata, name="results"):
+    # The previously saved results, if they were produced from exactly the same inputs and arguments.
+    path = os.path.join(output_folder, name + ".json")
+    if not os.path.exists(path):
+        return None
+    results = Results.load(path)
+    if results.metadata != json.loads(json.dumps(metadata, default=to_python)):
+        return None
+    return results
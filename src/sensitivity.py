@@ -0,0 +1,89 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from replicate import compute_paired_difference_views_multi
+from view_table import ViewTable
+
+BINNINGS = ["uniform", "quantile"]
+
+def get_numeric_view_properties(temporal_views):
+    # The view_properties fields with a numeric value in at least one view, in order of first appearance.
+    if isinstance(temporal_views, ViewTable):
+        return list(temporal_views.properties.keys())
+    fields = {}
+    for view in temporal_views.values():
+        for building in view:
+            for field, value in (building.get("view_properties") or {}).items():
+                if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                    fields[field] = None
+    return list(fields.keys())
+
+def get_bin_edges(values, n_bins, binning="uniform"):
+    # uniform: n_bins bins of equal width, quantile: bins holding about as many pairs each (fewer when values repeat).
+    if len(values) == 0:
+        return np.array([0.0, 1.0])
+    if binning == "quantile":
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)))
+    else:
+        edges = np.linspace(values.min(), values.max(), n_bins + 1)
+    if len(edges) < 2:
+        edges = np.array([edges[0], edges[0] + 1.0])
+    return edges
+
+def get_disagreement_histogram(agree_values, disagree_values, n_bins=10, binning="uniform"):
+    # Disagreement probability of the paired views per bin of the property difference, the last bin includes its
+    # upper edge.
+    values = np.concatenate([agree_values, disagree_values]).astype(float)
+    disagree = np.concatenate([np.zeros(len(agree_values)), np.ones(len(disagree_values))])
+    edges = get_bin_edges(values, n_bins, binning)
+    n_bins = len(edges) - 1
+    bins = np.clip(np.digitize(values, edges[1:-1], right=False), 0, n_bins - 1)
+    n = np.bincount(bins, minlength=n_bins)
+    n_disagree = np.bincount(bins, weights=disagree, minlength=n_bins).astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probability = np.where(n > 0, n_disagree / n, np.nan)
+    return pd.DataFrame({"bin": np.arange(n_bins), "bin_start": edges[:-1], "bin_end": edges[1:], "n": n, "n_disagree": n_disagree, "disagreement_probability": probability})
+
+def fit_disagreement_logistic(agree_values, disagree_values):
+    # Logistic regression of disagreement on the property difference. Pairs are grouped by their difference
+    # first, the binomial GLM over the groups has the same maximum likelihood fit as a Logit over every pair.
+    import statsmodels.api as sm
+
+    n = len(agree_values) + len(disagree_values)
+    fit = {"n": n, "intercept": np.nan, "slope": np.nan, "slope_p": np.nan, "odds_ratio": np.nan}
+    values = np.concatenate([agree_values, disagree_values]).astype(float)
+    if len(agree_values) == 0 or len(disagree_values) == 0:
+        return fit
+    unique_values, groups = np.unique(values, return_inverse=True)
+    if len(unique_values) < 2:
+        return fit
+    n_disagree = np.bincount(groups[len(agree_values):], minlength=len(unique_values))
+    n_agree = np.bincount(groups[:len(agree_values)], minlength=len(unique_values))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = sm.GLM(np.column_stack([n_disagree, n_agree]), sm.add_constant(unique_values), family=sm.families.Binomial()).fit()
+    except (np.linalg.LinAlgError, ValueError):
+        return fit
+    fit.update({"intercept": model.params[0], "slope": model.params[1], "slope_p": model.pvalues[1], "odds_ratio": np.exp(model.params[1])})
+    return fit
+
+def run_sensitivity_sweep(temporal_views, fields=None, n_bins=10, binning="uniform", ignore_unclassified=True, ignore_obscured=True):
+    # Disagreement of paired views (see replicate.compute_paired_difference_views) against the absolute difference
+    # of days and of every numeric view property, all fields from one pairing of the views. Returns a histogram
+    # table with a row per (field, bin) and a logistic fit table with a row per field.
+    if fields is None:
+        fields = ["days"] + get_numeric_view_properties(temporal_views)
+    paired_differences = compute_paired_difference_views_multi(temporal_views, fields, ignore_unclassified, ignore_obscured)
+
+    histograms = []
+    fits = []
+    for field in fields:
+        agree_values, disagree_values = paired_differences[field]
+        histogram = get_disagreement_histogram(agree_values, disagree_values, n_bins, binning)
+        histogram.insert(0, "field", field)
+        histograms.append(histogram)
+        fits.append(dict(field=field, **fit_disagreement_logistic(agree_values, disagree_values)))
+    return pd.concat(histograms, ignore_index=True), pd.DataFrame(fits, columns=["field", "n", "intercept", "slope", "slope_p", "odds_ratio"])
@@ -0,0 +1,182 @@
+from collections import Counter
+
+import numpy as np
+
+from constants import UNCLASSIFIED, FILENAME
+from utils import as_building_index, as_multiview_index, get_source_filename
+
+def get_swapped_unclassified_label(base_label, new_label, ignore_lone_unclassified):
+    if base_label is None:
+        return new_label
+    if (
+        new_label == UNCLASSIFIED
+        and base_label != UNCLASSIFIED
+        and ignore_lone_unclassified
+    ):
+        return base_label
+    return new_label
+
+# A view selection strategy keeps one running state per building. The engine calls update() once for every
+# satellite view of the building (in the order the views were loaded) and finalize() once at the end to turn
+# the state into the chosen satellite label. Strategies that set uses_days receive the view's days after the
+# sUAS ortho, everything else receives None.
+class ViewSelectionStrategy:
+    uses_days = False
+
+    def __init__(self, ignore_lone_unclassified=True):
+        self.ignore_lone_unclassified = ignore_lone_unclassified
+
+    def update(self, state, label, suas_label, days):
+        raise NotImplementedError
+
+    def finalize(self, state):
+        return state
+
+    def get_key(self):
+        # The strategy and all of its parameters, which strategy_cache memoizes selections by. None (the default)
+        # if it is not memoized, strategies opt in through get_parameter_key.
+        return None
+
+def get_parameter_key(strategy, strategy_class, *parameters):
+    # Only instances of exactly strategy_class are memoized, a subclass may have parameters the key misses.
+    if type(strategy) is not strategy_class:
+        return None
+    return (strategy_class.__name__, strategy.ignore_lone_unclassified) + parameters
+
+class CheatStrategy(ViewSelectionStrategy):
+    def __init__(self, comparison, ignore_lone_unclassified=True):
+        super().__init__(ignore_lone_unclassified)
+        self.comparison = comparison
+
+    def update(self, state, label, suas_label, days):
+        new_label = get_swapped_unclassified_label(state, label, self.ignore_lone_unclassified)
+        if state is None or self.comparison(new_label, suas_label):
+            return new_label
+        return state
+
+class OracleStrategy(CheatStrategy):
+    def __init__(self, ignore_lone_unclassified=True):
+        super().__init__(lambda a,b:a==b, ignore_lone_unclassified)
+
+    def get_key(self):
+        return get_parameter_key(self, OracleStrategy)
+
+class AntiOracleStrategy(CheatStrategy):
+    def __init__(self, ignore_lone_unclassified=True):
+        super().__init__(lambda a,b:a!=b, ignore_lone_unclassified)
+
+    def get_key(self):
+        return get_parameter_key(self, AntiOracleStrategy)
+
+class ClosestInTimeStrategy(ViewSelectionStrategy):
+    uses_days = True
+
+    def __init__(self, sort_strategy="abs", ignore_lone_unclassified=True):
+        super().__init__(ignore_lone_unclassified)
+        self.sort_strategy = sort_strategy
+
+    def get_sort_key(self, days):
+        if self.sort_strategy == "abs":
+            return np.abs(days)
+        return days
+
+    def get_key(self):
+        return get_parameter_key(self, ClosestInTimeStrategy, self.sort_strategy)
+
+    def update(self, state, label, suas_label, days):
+        key = self.get_sort_key(days)
+        if state is None:
+            return (label, key)
+        if state[1] > key:
+            return (get_swapped_unclassified_label(state[0], label, self.ignore_lone_unclassified), key)
+        return state
+
+    def finalize(self, state):
+        return state[0]
+
+class LatestStrategy(ClosestInTimeStrategy):
+    # The most recent acquisition, i.e. the largest days after the sUAS ortho.
+    def __init__(self, ignore_lone_unclassified=True):
+        super().__init__("real", ignore_lone_unclassified)
+
+    def get_sort_key(self, days):
+        return -days
+
+    def get_key(self):
+        return get_parameter_key(self, LatestStrategy)
+
+class MajorityVoteStrategy(ViewSelectionStrategy):
+    def get_key(self):
+        return get_parameter_key(self, MajorityVoteStrategy)
+
+    def update(self, state, label, suas_label, days):
+        if state is None:
+            state = Counter()
+        state[label] += 1
+        return state
+
+    def finalize(self, state):
+        counts = state
+        if self.ignore_lone_unclassified and any(label != UNCLASSIFIED for label in counts):
+            counts = Counter({label: count for label, count in counts.items() if label != UNCLASSIFIED})
+        # Counter keeps insertion order, so ties go to the label that was seen first.
+        return counts.most_common(1)[0][0]
+
+STRATEGIES = {
+    "closest_to_drone": lambda ignore_lone_unclassified=True: ClosestInTimeStrategy("abs", ignore_lone_unclassified),
+    "closest_to_disaster": lambda ignore_lone_unclassified=True: ClosestInTimeStrategy("real", ignore_lone_unclassified),
+    "oracle": OracleStrategy,
+    "anti_oracle": AntiOracleStrategy,
+    "latest": LatestStrategy,
+    "majority_vote": MajorityVoteStrategy,
+}
+
+PAPER_STRATEGIES = ["closest_to_drone", "closest_to_disaster", "oracle", "anti_oracle"]
+
+def register_strategy(name, factory):
+    STRATEGIES[name] = factory
+
+def get_strategies(names=PAPER_STRATEGIES, ignore_lone_unclassified=True):
+    return {name: STRATEGIES[name](ignore_lone_unclassified=ignore_lone_unclassified) for name in names}
+
+def get_suas_labels(suas_data, valid_ids):
+    sUAS_labels = {}
+    for data in suas_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                sUAS_labels[building["id"]] = building["label"]
+    return sUAS_labels
+
+def select_views(suas_data, satellite_data, valid_ids, strategies, multiview_index=None):
+    # Walks the satellite views once and advances every strategy at the same time.
+    # Returns {strategy name: (suas_labels, sat_labels)}.
+    valid_ids = as_building_index(valid_ids)
+    uses_days = any(strategy.uses_days for strategy in strategies.values())
+    if uses_days:
+        multiview_index = as_multiview_index(multiview_index)
+
+    sUAS_labels = get_suas_labels(suas_data, valid_ids)
+
+    states = {name: {} for name in strategies}
+    days_per_file = {}
+    for data in satellite_data:
+        for building in data:
+            bld_id = building["id"]
+            if bld_id not in valid_ids:
+                continue
+            days = None
+            if uses_days:
+                filename = building[FILENAME]
+                if filename not in days_per_file:
+                    days_per_file[filename] = multiview_index.days_after_suas(get_source_filename(building))
+                days = days_per_file[filename]
+            suas_label = sUAS_labels[bld_id]
+            for name, strategy in strategies.items():
+                strategy_states = states[name]
+                strategy_states[bld_id] = strategy.update(strategy_states.get(bld_id), building["label"], suas_label, days)
+
+    results = {}
+    for name, strategy in strategies.items():
+        sat_labels = {bld_id: strategy.finalize(state) for bld_id, state in states[name].items()}
+        results[name] = (dict(sUAS_labels), sat_labels)
+    return results
@@ -0,0 +1,109 @@
+import hashlib
+from collections import OrderedDict
+
+from constants import FILENAME
+from utils import AnnotationView, as_building_index, as_multiview_index, get_source_filename
+from strategies import get_suas_labels
+
+class CandidateViews:
+    # The inputs of every view selection strategy, gathered in one pass over the satellite views: the sUAS label
+    # of every coincident building and its candidate satellite views as (label, annotation file) in load order.
+    # The days after the sUAS ortho are only resolved, once per annotation file, when a strategy needs them.
+    def __init__(self, suas_data, satellite_data, valid_ids):
+        valid_ids = as_building_index(valid_ids)
+        self.suas_labels = get_suas_labels(suas_data, valid_ids)
+        self.views = {}
+        for data in satellite_data:
+            for building in data:
+                bld_id = building["id"]
+                if bld_id in valid_ids:
+                    self.views.setdefault(bld_id, []).append((building["label"], building[FILENAME]))
+        self.days = None
+
+    def get_days(self, multiview_index):
+        if self.days is None:
+            multiview_index = as_multiview_index(multiview_index)
+            filenames = set(filename for views in self.views.values() for _, filename in views)
+            self.days = {filename: multiview_index.days_after_suas(get_source_filename({FILENAME: filename})) for filename in filenames}
+        return self.days
+
+    def select(self, strategy, multiview_index=None):
+        # The same (suas_labels, sat_labels) as strategies.select_views with this one strategy.
+        days = self.get_days(multiview_index) if strategy.uses_days else {}
+        sat_labels = {}
+        for bld_id, views in self.views.items():
+            suas_label = self.suas_labels[bld_id]
+            state = None
+            for label, filename in views:
+                state = strategy.update(state, label, suas_label, days.get(filename))
+            sat_labels[bld_id] = strategy.finalize(state)
+        return self.suas_labels, sat_labels
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def get_stats(self):
+        n_lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / n_lookups if n_lookups else 0.0, "entries": len(self.entries), "maxsize": self.maxsize}
+
+def get_inputs_key(satellite_data, valid_ids):
+    # Identifies how the loaded data was filtered: the valid ids and, for an AnnotationView, its mask, otherwise
+    # the number of views left in every ortho.
+    digest = hashlib.sha256("\n".join(sorted(as_building_index(valid_ids).ids)).encode("utf-8"))
+    if isinstance(satellite_data, AnnotationView):
+        digest.update(satellite_data.offsets.tobytes() + satellite_data.mask.tobytes())
+    else:
+        digest.update(str([len(data) for data in satellite_data]).encode("utf-8"))
+    return digest.hexdigest()
+
+class StrategyCache:
+    # Memoizes view selection across parameter variations of the strategies. The fingerprint must describe the
+    # loaded data (e.g. cache.get_dataset_fingerprint of its inputs, with the multiview stats), the filtering of
+    # the satellite views and the valid ids are added to it by get_inputs_key. The candidate views are gathered
+    # once per such dataset key and the selections of a strategy once per (dataset key, strategy.get_key()), both
+    # with LRU eviction. Strategies without a key (e.g. a CheatStrategy with an arbitrary comparison) still reuse
+    # the candidate views, but are not memoized.
+    def __init__(self, max_datasets=2, max_selections=64):
+        self.candidates = LRUCache(max_datasets)
+        self.selections = LRUCache(max_selections)
+
+    def get_candidates(self, dataset_key, suas_data, satellite_data, valid_ids):
+        return self.candidates.get(dataset_key, lambda: CandidateViews(suas_data, satellite_data, valid_ids))
+
+    def select_views(self, fingerprint, suas_data, satellite_data, valid_ids, strategies, multiview_index=None):
+        # Same arguments (after the fingerprint) and result as strategies.select_views.
+        dataset_key = (fingerprint, get_inputs_key(satellite_data, valid_ids))
+        results = {}
+        for name, strategy in strategies.items():
+            compute = lambda strategy=strategy: self.get_candidates(dataset_key, suas_data, satellite_data, valid_ids).select(strategy, multiview_index)
+            key = strategy.get_key()
+            suas_labels, sat_labels = compute() if key is None else self.selections.get(dataset_key + key, compute)
+            # Copies, so that callers cannot change the memoized selections.
+            results[name] = (dict(suas_labels), dict(sat_labels))
+        return results
+
+    def get_stats(self):
+        return {"candidates": self.candidates.get_stats(), "selections": self.selections.get_stats()}
+
+    def clear(self):
+        self.candidates.entries.clear()
+        self.selections.entries.clear()
+
+# The cache the replicate.get_best_*_label_for_building functions use when they are given a fingerprint.
+STRATEGY_CACHE = StrategyCache()
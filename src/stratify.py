@@ -0,0 +1,88 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis import chi_squared_test, z_test_per_label, get_underestimation_rate
+from replicate import get_probability_of_disagreement
+from strategies import select_views, get_strategies
+from utils import remove_obscured_labels, get_intersecting_ids
+
+STRATIFY_BY = ["event", "ortho"]
+
+def partition_dataset(suas_data, satellite_data, multiview_index, by="event"):
+    # Splits the dataset into {stratum: (suas_data, satellite_data)}. sUAS orthos are assigned to a stratum
+    # directly (themselves, or their event) and every satellite view follows the stratum of its building.
+    suas_partitions = defaultdict(dict)
+    building_strata = {}
+    for ortho, data in suas_data.items():
+        stratum = ortho if by == "ortho" else multiview_index.event(ortho)
+        suas_partitions[stratum][ortho] = data
+        for building in data:
+            building_strata[building["id"]] = stratum
+
+    satellite_partitions = defaultdict(lambda: defaultdict(list))
+    for ortho, data in satellite_data.items():
+        for building in data:
+            stratum = building_strata.get(building["id"])
+            if stratum is not None:
+                satellite_partitions[stratum][ortho].append(building)
+
+    return {stratum: (suas_partitions[stratum], dict(satellite_partitions[stratum])) for stratum in suas_partitions}
+
+def get_metric_rows(strategy_results, ignore_sat_obscured=True):
+    rows = []
+    for strategy, (suas_labels, sat_labels) in strategy_results.items():
+        n = len(sat_labels)
+        rows.append({"strategy": strategy, "metric": "disagreement_probability", "label": None, "value": get_probability_of_disagreement(suas_labels, sat_labels, ignore_sat_obscured), "n": n})
+        try:
+            p_value = chi_squared_test(suas_labels, sat_labels, ignore_sat_obscured)
+        except ValueError:
+            p_value = np.nan
+        rows.append({"strategy": strategy, "metric": "chi_squared_p", "label": None, "value": p_value, "n": n})
+        for label, p_value in z_test_per_label(suas_labels, sat_labels, ignore_sat_obscured).items():
+            rows.append({"strategy": strategy, "metric": "z_test_p", "label": label, "value": p_value, "n": n})
+        try:
+            underestimation_rates = get_underestimation_rate(suas_labels, sat_labels, ignore_sat_obscured)
+        except ZeroDivisionError:
+            underestimation_rates = {}
+        for label, rate in underestimation_rates.items():
+            rows.append({"strategy": strategy, "metric": "underestimation_rate", "label": label, "value": rate, "n": n})
+    return rows
+
+def analyze_stratum(stratum, suas_data, satellite_data, multiview_index, strategy_names, ignore_lone_unclassified=False):
+    # Every view of a building falls in its stratum, so ignore_lone_unclassified leaves out the same views as on
+    # the whole dataset.
+    non_obscured_sat_data = remove_obscured_labels(list(satellite_data.values()), ignore_lone_unclassified)
+    valid_ids = get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
+    if len(valid_ids) == 0:
+        return []
+
+    strategy_results = select_views(list(suas_data.values()), non_obscured_sat_data, valid_ids, get_strategies(strategy_names), multiview_index)
+    rows = get_metric_rows(strategy_results)
+    for row in rows:
+        row["stratum"] = stratum
+    return rows
+
+def run_stratified_analysis(suas_data, satellite_data, multiview_index, by="event", strategy_names=None, workers=1, ignore_lone_unclassified=False):
+    # Runs the full strategy and metric suite on every stratum, in a process pool when workers > 1, and merges
+    # the results into one tidy DataFrame with a row per (stratum, strategy, metric, label). ignore_lone_unclassified
+    # is the view filter of utils.remove_obscured_labels.
+    if strategy_names is None:
+        strategy_names = list(get_strategies().keys())
+    partitions = partition_dataset(suas_data, satellite_data, multiview_index, by)
+    strata = list(partitions.keys())
+    arguments = [strata, [partitions[stratum][0] for stratum in strata], [partitions[stratum][1] for stratum in strata],
+                 [multiview_index] * len(strata), [strategy_names] * len(strata), [ignore_lone_unclassified] * len(strata)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            stratum_rows = list(executor.map(analyze_stratum, *arguments))
+    else:
+        stratum_rows = list(map(analyze_stratum, *arguments))
+
+    rows = [row for rows in stratum_rows for row in rows]
+    table = pd.DataFrame(rows, columns=["stratum", "strategy", "metric", "label", "value", "n"])
+    table.insert(0, "stratified_by", by)
+    return table
@@ -0,0 +1,107 @@
+import os
+
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from constants import BDA_DAMAGE_CLASSES, OBSCURED, FILENAME, EVENT, SOURCE, DAYS_AFTER_SUAS_ORTHO
+
+# Rough shape of the CRASAR-U-DROIDs labels, most buildings undamaged and few destroyed.
+SUAS_LABEL_PROBABILITIES = [0.55, 0.2, 0.1, 0.1, 0.05, 0.0]
+
+def get_satellite_labels(rng, suas_codes, agreement, obscured_rate):
+    # Each satellite view repeats the sUAS label with probability agreement, otherwise draws a random
+    # non obscured label, and is then obscured with probability obscured_rate.
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    codes = np.where(rng.random(len(suas_codes)) < agreement, suas_codes, rng.integers(0, n_labels - 1, len(suas_codes)))
+    codes[rng.random(len(suas_codes)) < obscured_rate] = BDA_DAMAGE_CLASSES.index(OBSCURED)
+    return codes
+
+def make_synthetic_dataset(n_buildings=1000, max_views=3, n_dates=4, n_events=2, suas_orthos_per_event=2, agreement=0.6, obscured_rate=0.05, seed=0):
+    # Generates ({sUAS ortho: [building, ...]}, {satellite ortho: [building, ...]}, multiview DataFrame) in the
+    # shape main.py loads them. Buildings are spread evenly over n_events * suas_orthos_per_event sUAS orthos.
+    # Every sUAS ortho has n_dates satellite orthos (whose names contain the sUAS ortho name, like the real data)
+    # acquired on dates shared by the event, and every building is seen in 1 to max_views of them.
+    rng = np.random.default_rng(seed)
+    max_views = max(1, min(max_views, n_dates))
+    n_suas_orthos = n_events * suas_orthos_per_event
+
+    event_days = [np.sort(rng.choice(np.arange(-30, 60), size=n_dates, replace=False)) for _ in range(n_events)]
+    building_orthos = np.arange(n_buildings) % n_suas_orthos
+    suas_codes = rng.choice(len(BDA_DAMAGE_CLASSES), size=n_buildings, p=SUAS_LABEL_PROBABILITIES)
+    n_views = rng.integers(1, max_views + 1, size=n_buildings)
+
+    suas_data = {}
+    satellite_data = {}
+    multiview_rows = []
+    for ortho in range(n_suas_orthos):
+        event = "event" + str(ortho // suas_orthos_per_event)
+        suas_name = event + "-suas" + str(ortho) + ".tif"
+        satellite_names = ["sat" + str(date) + "-" + suas_name for date in range(n_dates)]
+        suas_data[suas_name] = []
+        for name in satellite_names:
+            satellite_data[name] = []
+        multiview_rows.append({EVENT: event, SOURCE: "sUAS", FILENAME: suas_name, DAYS_AFTER_SUAS_ORTHO: 0})
+        for date, name in enumerate(satellite_names):
+            multiview_rows.append({EVENT: event, SOURCE: "Satellite", FILENAME: name, DAYS_AFTER_SUAS_ORTHO: int(event_days[ortho // suas_orthos_per_event][date])})
+
+        buildings = np.flatnonzero(building_orthos == ortho)
+        for bld in buildings:
+            suas_data[suas_name].append({"id": "bld-" + str(bld), "label": BDA_DAMAGE_CLASSES[suas_codes[bld]],
+                                         FILENAME: event + "\\sUAS\\building_damage_assessment\\" + suas_name + ".json"})
+
+        # Every building is seen on the first n_views dates of a random permutation of the dates.
+        date_ranks = np.argsort(np.argsort(rng.random((len(buildings), n_dates)), axis=1), axis=1)
+        for date in range(n_dates):
+            viewed = buildings[date_ranks[:, date] < n_views[buildings]]
+            codes = get_satellite_labels(rng, suas_codes[viewed], agreement, obscured_rate)
+            off_nadir = rng.uniform(0, 30, len(viewed))
+            sun_elevation = rng.uniform(10, 70, len(viewed))
+            for bld, code, angle, elevation in zip(viewed, codes, off_nadir, sun_elevation):
+                satellite_data[satellite_names[date]].append({"id": "bld-" + str(bld), "label": BDA_DAMAGE_CLASSES[code],
+                                                              FILENAME: event + "\\SATELLITE\\building_damage_assessment\\" + satellite_names[date] + ".json",
+                                                              "view_properties": {"off_nadir": float(angle), "sun_elevation": float(elevation)}})
+
+    return suas_data, satellite_data, pd.DataFrame(multiview_rows, columns=[EVENT, SOURCE, FILENAME, DAYS_AFTER_SUAS_ORTHO])
+
+def write_synthetic_dataset(output_folder, suas_data, satellite_data, multiview_df):
+    # Writes one annotation file per ortho, the two path maps and the multiview stats file, i.e. the inputs
+    # of main.py. Returns their paths.
+    annotations_folder = os.path.join(output_folder, "annotations")
+    os.makedirs(annotations_folder, exist_ok=True)
+
+    path_maps = []
+    for data_by_ortho in [suas_data, satellite_data]:
+        path_map = {}
+        for ortho, data in data_by_ortho.items():
+            path_map[ortho] = os.path.join(annotations_folder, ortho + ".json")
+            with open(path_map[ortho], "w") as f:
+                json.dump(data, f)
+        path_maps.append(path_map)
+
+    paths = {"drone_annotations_path_map": os.path.join(output_folder, "suas_path_map.json"),
+             "satellite_annotations_path_map": os.path.join(output_folder, "satellite_path_map.json"),
+             "multiview_stats_file_path": os.path.join(output_folder, "stats.csv")}
+    for path, path_map in zip([paths["drone_annotations_path_map"], paths["satellite_annotations_path_map"]], path_maps):
+        with open(path, "w") as f:
+            json.dump(path_map, f)
+    multiview_df.to_csv(paths["multiview_stats_file_path"], index=False)
+    return paths
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="synthetic_data", description="This program writes a synthetic dataset in the format main.py consumes.")
+    parser.add_argument("--output_folder_path", type=str, help="The folder the annotation files, path maps and stats file are written to.")
+    parser.add_argument("--n_buildings", type=int, default=1000, help="The number of buildings.")
+    parser.add_argument("--max_views", type=int, default=3, help="Every building is seen in 1 to max_views satellite orthos.")
+    parser.add_argument("--n_dates", type=int, default=4, help="The number of satellite acquisition dates per event.")
+    parser.add_argument("--n_events", type=int, default=2, help="The number of disaster events.")
+    parser.add_argument("--suas_orthos_per_event", type=int, default=2, help="The number of sUAS orthomosaics per event.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the generator.")
+    args = parser.parse_args()
+
+    dataset = make_synthetic_dataset(args.n_buildings, args.max_views, args.n_dates, args.n_events, args.suas_orthos_per_event, seed=args.seed)
+    for name, path in write_synthetic_dataset(args.output_folder_path, *dataset).items():
+        print("--" + name, path)
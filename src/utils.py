@@ -1,39 +1,211 @@
-from constants import BDA_DAMAGE_CLASSES, OBSCURED
+from itertools import compress
 
-def get_class_counts_from_ids(id2labels, ignore_obscured):
-    bda1_damage_labels = {l:0 for l in BDA_DAMAGE_CLASSES}
+import numpy as np
+import pandas as pd
+
+from constants import BDA_DAMAGE_CLASSES, BDA_DAMAGE_CLASS_CODES, MISSING_LABEL_CODE, OBSCURED, UNCLASSIFIED, DAYS_AFTER_SUAS_ORTHO, FILENAME, EVENT, SOURCE
+
+class BuildingIndex:
+    # Hash-indexed set of building ids with a stable (sorted) ordering, so membership
+    # tests and id -> position lookups are O(1) instead of scanning a list.
+    def __init__(self, building_ids):
+        self.ids = sorted(set(building_ids))
+        self.positions = {bld_id: i for i, bld_id in enumerate(self.ids)}
+
+    def __contains__(self, bld_id):
+        return bld_id in self.positions
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __getitem__(self, position):
+        return self.ids[position]
+
+    def position(self, bld_id):
+        return self.positions[bld_id]
+
+    def get(self, bld_id, default=None):
+        return self.positions.get(bld_id, default)
+
+def as_building_index(valid_ids):
+    if isinstance(valid_ids, BuildingIndex):
+        return valid_ids
+    return BuildingIndex(valid_ids)
+
+def get_building_orthos(data_by_ortho, valid_ids):
+    # building id -> the ortho it was annotated in. Later orthos win, matching how the sUAS labels are collected.
+    building_orthos = {}
+    for ortho, data in data_by_ortho.items():
+        for building in data:
+            if building["id"] in valid_ids:
+                building_orthos[building["id"]] = ortho
+    return building_orthos
+
+def get_source_filename(building):
+    return building[FILENAME].split("\\")[-1].replace(".json", "")
+
+class MultiviewIndex:
+    # Built once from the multiview csv, keyed by orthomosaic filename, so that per building
+    # lookups of days-after-sUAS, event and source do not filter the whole DataFrame.
+    def __init__(self, multiview_df):
+        self.records = {}
+        for filename, days, event, source in zip(multiview_df[FILENAME], multiview_df[DAYS_AFTER_SUAS_ORTHO], multiview_df[EVENT], multiview_df[SOURCE]):
+            # Keep the first row per filename, as the previous .iloc[0] lookups did.
+            if filename not in self.records:
+                self.records[filename] = {DAYS_AFTER_SUAS_ORTHO: days, EVENT: event, SOURCE: source}
+
+    @classmethod
+    def from_records(cls, records):
+        index = cls.__new__(cls)
+        index.records = records
+        return index
+
+    def to_records(self):
+        # Plain python values, so the records can be written to JSON.
+        return {filename: {key: value.item() if hasattr(value, "item") else value for key, value in record.items()}
+                for filename, record in self.records.items()}
+
+    def add(self, filename, days, event, source):
+        # Like the csv rows, the first record of a filename is kept.
+        if filename not in self.records:
+            self.records[filename] = {DAYS_AFTER_SUAS_ORTHO: days, EVENT: event, SOURCE: source}
+
+    def __contains__(self, filename):
+        return filename in self.records
+
+    def __len__(self):
+        return len(self.records)
 
-    ids_to_consider = []
-    for bld_id in id2labels.keys():
-        if (ignore_obscured and id2labels[bld_id] != OBSCURED) or not ignore_obscured:
-            ids_to_consider.append(bld_id)
+    def lookup(self, filename):
+        try:
+            return self.records[filename]
+        except KeyError:
+            raise KeyError("No multiview metadata for orthomosaic '" + str(filename) + "'. Is the multiview stats file out of date with the annotation path maps?") from None
 
-    for bld_id in ids_to_consider:
-        bda1_damage_labels[id2labels[bld_id]] += 1
+    def days_after_suas(self, filename):
+        return self.lookup(filename)[DAYS_AFTER_SUAS_ORTHO]
 
-    return bda1_damage_labels
+    def event(self, filename):
+        return self.lookup(filename)[EVENT]
+
+    def source(self, filename):
+        return self.lookup(filename)[SOURCE]
+
+def as_multiview_index(multiview_info):
+    if isinstance(multiview_info, MultiviewIndex):
+        return multiview_info
+    return MultiviewIndex(multiview_info)
+
+def encode_label(label):
+    try:
+        return BDA_DAMAGE_CLASS_CODES[label]
+    except KeyError:
+        raise ValueError("Unknown damage label '" + str(label) + "', expected one of " + str(BDA_DAMAGE_CLASSES)) from None
+
+def encode_labels(labels):
+    return np.fromiter((encode_label(label) for label in labels), dtype=np.int8)
+
+def encode_id2labels(id2labels, building_index):
+    # Codes aligned to building_index's ordering, MISSING_LABEL_CODE where a building has no label.
+    codes = np.full(len(building_index), MISSING_LABEL_CODE, dtype=np.int8)
+    for bld_id, label in id2labels.items():
+        position = building_index.get(bld_id)
+        if position is not None:
+            codes[position] = encode_label(label)
+    return codes
+
+def get_aligned_label_codes(*id2labels):
+    # Encodes several id -> label dicts over one shared ordering of the building ids they all have in common.
+    common_ids = set(id2labels[0].keys())
+    for labels in id2labels[1:]:
+        common_ids &= labels.keys()
+    building_index = BuildingIndex(common_ids)
+    return building_index, [encode_id2labels(labels, building_index) for labels in id2labels]
+
+def get_obscured_mask(codes, ignore_obscured):
+    if ignore_obscured:
+        return codes != BDA_DAMAGE_CLASS_CODES[OBSCURED]
+    return np.ones(len(codes), dtype=bool)
+
+def get_label_counts(codes, mask=None):
+    if mask is not None:
+        codes = codes[mask]
+    return np.bincount(codes[codes != MISSING_LABEL_CODE], minlength=len(BDA_DAMAGE_CLASSES))
+
+def get_class_counts_from_ids(id2labels, ignore_obscured):
+    codes = encode_labels(id2labels.values())
+    counts = get_label_counts(codes, get_obscured_mask(codes, ignore_obscured))
+    return {label: int(count) for label, count in zip(BDA_DAMAGE_CLASSES, counts)}
 
 def get_intersecting_ids(annotations_data1, annotations_data2):
-    bda_1_ids = []
-    bda_2_ids = []
+    bda_1_ids = set()
+    bda_2_ids = set()
     # Count Damage Labels for sUAS data format
     for data in annotations_data1:
         for building in data:
-            bda_1_ids.append(building["id"])
+            bda_1_ids.add(building["id"])
 
     # Count Damage Labels for Satellite data format
     for data in annotations_data2:
         for building in data:
-            bda_2_ids.append(building["id"])
+            bda_2_ids.add(building["id"])
 
-    valid_ids = list(set(bda_1_ids) & set(bda_2_ids))
+    valid_ids = BuildingIndex(bda_1_ids & bda_2_ids)
     return valid_ids
 
-def remove_obscured_labels(labeled_data):
-    result = []
-    for data in labeled_data:
-        result.append([])
-        for building in data:
-            if building["label"] != OBSCURED and building["label"] != OBSCURED.lower():
-                result[-1].append(building)
-    return result
\ No newline at end of file
+class AnnotationView:
+    # A filtered view of a list of per ortho building lists, given one boolean mask over all of their buildings in
+    # order. Iterates like the list it wraps, but each ortho yields only the buildings whose mask is True, lazily
+    # and without copying the buildings or the lists.
+    def __init__(self, labeled_data, mask):
+        self.labeled_data = labeled_data
+        self.mask = mask
+        self.offsets = np.zeros(len(labeled_data) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in labeled_data], out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.labeled_data)
+
+    def __iter__(self):
+        for i, data in enumerate(self.labeled_data):
+            yield compress(data, self.mask[self.offsets[i]:self.offsets[i + 1]].tolist())
+
+def get_label_codes(labeled_data):
+    # Label codes of all buildings of a list of per ortho building lists, flattened in order.
+    return encode_labels(building["label"] for data in labeled_data for building in data)
+
+def get_building_codes(labeled_data):
+    # Building id codes of all buildings of a list of per ortho building lists, flattened in order.
+    return pd.factorize(pd.Series([building["id"] for data in labeled_data for building in data], dtype=object))[0]
+
+def get_label_mask(label_codes, ignore_obscured=True, ignore_unclassified=False):
+    mask = np.ones(len(label_codes), dtype=bool)
+    if ignore_obscured:
+        mask &= label_codes != BDA_DAMAGE_CLASS_CODES[OBSCURED]
+    if ignore_unclassified:
+        mask &= label_codes != BDA_DAMAGE_CLASS_CODES[UNCLASSIFIED]
+    return mask
+
+def get_lone_unclassified_mask(label_codes, building_codes, mask=None):
+    # Drops the un-classified views of the buildings that also have a classified view (within mask), so that an
+    # un-classified view only counts when it is all there is of a building.
+    if mask is None:
+        mask = np.ones(len(label_codes), dtype=bool)
+    unclassified = label_codes == BDA_DAMAGE_CLASS_CODES[UNCLASSIFIED]
+    n_classified = np.bincount(building_codes[mask & ~unclassified], minlength=int(building_codes.max()) + 1 if len(building_codes) else 0)
+    return mask & ~(unclassified & (n_classified[building_codes] > 0))
+
+def get_view_mask(labeled_data, ignore_obscured=True, ignore_lone_unclassified=False):
+    # The mask of every filter variant over a list of per ortho building lists: without the obscured views,
+    # without the un-classified views of buildings that also have a classified one, or both.
+    label_codes = get_label_codes(labeled_data)
+    mask = get_label_mask(label_codes, ignore_obscured)
+    if ignore_lone_unclassified:
+        mask = get_lone_unclassified_mask(label_codes, get_building_codes(labeled_data), mask)
+    return mask
+
+def remove_obscured_labels(labeled_data, ignore_lone_unclassified=False):
+    return AnnotationView(labeled_data, get_view_mask(labeled_data, True, ignore_lone_unclassified))
\ No newline at end of file
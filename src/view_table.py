@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+
+from constants import BDA_DAMAGE_CLASSES, BDA_DAMAGE_CLASS_CODES, MISSING_LABEL_CODE, OBSCURED, UNCLASSIFIED, FILENAME
+from utils import BuildingIndex, as_building_index, as_multiview_index, encode_labels, encode_id2labels, get_source_filename
+from strategies import get_suas_labels, OracleStrategy, AntiOracleStrategy, ClosestInTimeStrategy, LatestStrategy, MajorityVoteStrategy
+
+OBSCURED_CODE = BDA_DAMAGE_CLASS_CODES[OBSCURED]
+UNCLASSIFIED_CODE = BDA_DAMAGE_CLASS_CODES[UNCLASSIFIED]
+
+def get_last_in_segments(selected, offsets):
+    # Per segment, the row of its last selected row, -1 where it has none. Segments must not be empty.
+    rows = np.where(selected, np.arange(len(selected)), -1)
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.maximum.reduceat(rows, offsets[:-1])
+
+def get_numeric_fields(view_properties):
+    # The view_properties fields with a numeric value in at least one view, in order of first appearance.
+    fields = {}
+    for properties in view_properties:
+        for field, value in properties.items():
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                fields[field] = None
+    return list(fields.keys())
+
+# One row per (building, satellite view) in contiguous columns: the label code, the position of the view's ortho
+# in the loaded data, its days after the sUAS ortho, its position in load order and its numeric view properties.
+# Rows are sorted by building id, keeping load order within a building, and offsets[i]:offsets[i + 1] are the rows
+# of the building index.ids[i] (CSR style), so every view selection strategy, the views per building and the
+# paired views are reductions over these segments instead of scans of the per ortho building lists.
+class ViewTable:
+    def __init__(self, ids, offsets, columns, properties):
+        self.index = BuildingIndex(ids)
+        self.offsets = offsets
+        self.columns = columns
+        self.properties = properties
+        self.segments = np.repeat(np.arange(len(self.index)), np.diff(offsets))
+
+    @classmethod
+    def from_annotations(cls, labeled_data, multiview_index=None, fields=None):
+        # labeled_data is a list of per ortho building lists (or an AnnotationView of one, e.g. the non obscured
+        # views). The days are resolved once per source file and are NaN without a multiview index, fields are the
+        # view_properties fields to keep, by default every numeric one.
+        ids, labels, orthos, filenames, view_properties = [], [], [], [], []
+        for ortho, data in enumerate(labeled_data):
+            for building in data:
+                ids.append(building["id"])
+                labels.append(building["label"])
+                orthos.append(ortho)
+                filenames.append(building[FILENAME])
+                view_properties.append(building.get("view_properties") or {})
+
+        index = BuildingIndex(ids)
+        codes = pd.Series(ids, dtype=object).map(index.positions).to_numpy(dtype=np.int64)
+        order = np.argsort(codes, kind="stable")
+        offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(index)), out=offsets[1:])
+
+        file_codes, unique_filenames = pd.factorize(pd.Series(filenames, dtype=object))
+        file_days = np.full(len(unique_filenames), np.nan)
+        if multiview_index is not None:
+            multiview_index = as_multiview_index(multiview_index)
+            file_days = np.array([multiview_index.days_after_suas(get_source_filename({FILENAME: filename})) for filename in unique_filenames], dtype=float)
+
+        columns = {
+            "label": encode_labels(labels)[order],
+            "ortho": np.array(orthos, dtype=np.int32)[order],
+            "days": file_days[file_codes][order] if len(file_codes) else np.zeros(0),
+            "load_order": order,
+        }
+        if fields is None:
+            fields = get_numeric_fields(view_properties)
+        properties = {}
+        for field in fields:
+            values = pd.Series([view.get(field, np.nan) for view in view_properties], dtype=object)
+            properties[field] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)[order]
+        return cls(index.ids, offsets, columns, properties)
+
+    def __len__(self):
+        return len(self.columns["label"])
+
+    def get_building_mask(self, valid_ids):
+        valid_ids = as_building_index(valid_ids)
+        return np.fromiter((bld_id in valid_ids for bld_id in self.index.ids), dtype=bool, count=len(self.index))
+
+    def get_views_per_building(self, valid_ids=None):
+        views_per_building = np.diff(self.offsets)
+        if valid_ids is not None:
+            views_per_building = views_per_building[self.get_building_mask(valid_ids)]
+        return views_per_building
+
+    def get_days(self):
+        days = self.columns["days"]
+        if np.isnan(days).any():
+            raise ValueError("The view table has views without days after the sUAS ortho, build it with a multiview index.")
+        return days
+
+    def select(self, strategy, suas_codes):
+        # The label code every building selects with strategy, given the sUAS label code of every building (aligned
+        # to index, MISSING_LABEL_CODE where it has none). Buildings without a sUAS label get MISSING_LABEL_CODE.
+        selector = SEGMENT_SELECTORS.get(type(strategy))
+        selected = select_by_updates(self, strategy, suas_codes) if selector is None else selector(self, strategy, suas_codes)
+        return np.where(suas_codes != MISSING_LABEL_CODE, selected, MISSING_LABEL_CODE).astype(np.int8)
+
+    def select_views(self, suas_data, valid_ids, strategies):
+        # The same {strategy name: (suas_labels, sat_labels)} as strategies.select_views over the views of this table.
+        valid_ids = as_building_index(valid_ids)
+        suas_labels = get_suas_labels(suas_data, valid_ids)
+        suas_codes = encode_id2labels(suas_labels, self.index)
+        # Buildings in the order their first view was loaded, like the dicts of select_views.
+        buildings = np.flatnonzero(suas_codes != MISSING_LABEL_CODE)
+        buildings = buildings[np.argsort(self.columns["load_order"][self.offsets[buildings]], kind="stable")]
+        ids = [self.index.ids[building] for building in buildings.tolist()]
+        label_names = np.array(BDA_DAMAGE_CLASSES, dtype=object)
+
+        results = {}
+        for name, strategy in strategies.items():
+            selected = self.select(strategy, suas_codes)[buildings]
+            results[name] = (dict(suas_labels), dict(zip(ids, label_names[selected].tolist())))
+        return results
+
+    def get_group_codes(self):
+        # Temporal groups of the views (as group_buildings_temporally), numbered in order of first appearance.
+        days = self.get_days()
+        days_in_load_order = np.empty(len(self))
+        days_in_load_order[self.columns["load_order"]] = days
+        groups_in_load_order = pd.factorize(days_in_load_order)[0]
+        return groups_in_load_order[self.columns["load_order"]]
+
+    def compute_paired_difference_views_multi(self, fields, ignore_unclassified=True, ignore_obscured=True):
+        # The same pairs as replicate.compute_paired_difference_views_multi over the temporal groups of this table:
+        # every view is paired with the building's last view in each later group, in (group, group, load) order.
+        groups = self.get_group_codes()
+        n_groups = int(groups.max()) + 1 if len(groups) else 1
+        keys = self.segments * n_groups + groups
+
+        # The last view of every (building, group), sorted by building and then group.
+        by_key = np.argsort(keys, kind="stable")
+        is_last = np.ones(len(by_key), dtype=bool)
+        is_last[:-1] = keys[by_key][1:] != keys[by_key][:-1]
+        last_rows = by_key[is_last]
+        last_keys = keys[last_rows]
+
+        # Every row pairs with the last views of its building in a later group, a contiguous run of last_keys.
+        starts = np.searchsorted(last_keys, keys, side="right")
+        ends = np.searchsorted(last_keys, (self.segments + 1) * n_groups, side="left")
+        n_pairs = ends - starts
+        rows_1 = np.repeat(np.arange(len(keys)), n_pairs)
+        run_offsets = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        rows_2 = last_rows[np.repeat(starts, n_pairs) + run_offsets]
+        order = np.lexsort((self.columns["load_order"][rows_1], groups[rows_2], groups[rows_1]))
+        rows_1, rows_2 = rows_1[order], rows_2[order]
+
+        labels_1, labels_2 = self.columns["label"][rows_1], self.columns["label"][rows_2]
+        keep = np.ones(len(rows_1), dtype=bool)
+        if ignore_unclassified:
+            keep &= (labels_1 != UNCLASSIFIED_CODE) & (labels_2 != UNCLASSIFIED_CODE)
+        if ignore_obscured:
+            keep &= (labels_1 != OBSCURED_CODE) & (labels_2 != OBSCURED_CODE)
+        agree = labels_1 == labels_2
+
+        result = {}
+        for field in fields:
+            column = self.get_days() if field == "days" else self.properties.get(field, np.full(len(self), np.nan))
+            values = np.abs(column[rows_1] - column[rows_2])
+            valid = keep
+            if field != "days":
+                valid = keep & ~np.isnan(values)
+            result[field] = (values[valid & agree], values[valid & ~agree])
+        return result
+
+def select_by_updates(table, strategy, suas_codes):
+    # Any other strategy runs its update/finalize over the rows of every building with a sUAS label.
+    selected = np.full(len(table.index), MISSING_LABEL_CODE, dtype=np.int8)
+    labels = table.columns["label"].tolist()
+    days = table.get_days().tolist() if strategy.uses_days else [None] * len(table)
+    for building in np.flatnonzero(suas_codes != MISSING_LABEL_CODE).tolist():
+        suas_label = BDA_DAMAGE_CLASSES[suas_codes[building]]
+        state = None
+        for row in range(table.offsets[building], table.offsets[building + 1]):
+            state = strategy.update(state, BDA_DAMAGE_CLASSES[labels[row]], suas_label, days[row])
+        selected[building] = BDA_DAMAGE_CLASS_CODES[strategy.finalize(state)]
+    return selected
+
+def select_closest_in_time(table, strategy, suas_codes):
+    # The selection only moves at the views whose sort key is strictly below every earlier key of the building,
+    # to that view's label, or, ignoring lone un-classified views, to the last classified one of them.
+    labels = table.columns["label"]
+    if len(labels) == 0:
+        return np.zeros(0, dtype=np.int8)
+    ranks = np.unique(strategy.get_sort_key(table.get_days()), return_inverse=True)[1].reshape(-1)
+    # Shifting every building below all earlier ones restarts the running minimum at each building.
+    shifted = ranks.astype(np.int64) - table.segments * (len(ranks) + 1)
+    running_minimum = np.minimum.accumulate(shifted)
+    is_record = np.ones(len(labels), dtype=bool)
+    is_record[1:] = shifted[1:] < running_minimum[:-1]
+    if not strategy.ignore_lone_unclassified:
+        return labels[get_last_in_segments(is_record, table.offsets)]
+    last = get_last_in_segments(is_record & (labels != UNCLASSIFIED_CODE), table.offsets)
+    return np.where(last >= 0, labels[np.maximum(last, 0)], UNCLASSIFIED_CODE)
+
+def select_oracle(table, strategy, suas_codes):
+    # The sUAS label if any view has it, otherwise the first view. Ignoring lone un-classified views, an
+    # un-classified sUAS label is only matched by an un-classified first view.
+    labels = table.columns["label"]
+    suas_rows = suas_codes[table.segments]
+    matches = labels == suas_rows
+    if strategy.ignore_lone_unclassified:
+        matches &= suas_rows != UNCLASSIFIED_CODE
+    has_match = np.bincount(table.segments, weights=matches, minlength=len(table.index)) > 0
+    return np.where(has_match, suas_codes, labels[table.offsets[:-1]])
+
+def select_anti_oracle(table, strategy, suas_codes):
+    # The last view after the first whose label differs from the sUAS label (and is classified, ignoring lone
+    # un-classified views), otherwise the first view.
+    labels = table.columns["label"]
+    candidates = labels != suas_codes[table.segments]
+    if strategy.ignore_lone_unclassified:
+        candidates &= labels != UNCLASSIFIED_CODE
+    candidates[table.offsets[:-1]] = False
+    last = get_last_in_segments(candidates, table.offsets)
+    first = labels[table.offsets[:-1]] if len(labels) else np.zeros(0, dtype=np.int8)
+    return np.where(last >= 0, labels[np.maximum(last, 0)], first)
+
+def select_majority_vote(table, strategy, suas_codes):
+    # The most common label of a building, ties going to the label that was seen first.
+    labels = table.columns["label"].astype(np.int64)
+    n_labels = len(BDA_DAMAGE_CLASSES)
+    keys = table.segments * n_labels + labels
+    counts = np.bincount(keys, minlength=len(table.index) * n_labels).reshape(-1, n_labels)
+    first_rows = np.full(len(table.index) * n_labels, len(labels), dtype=np.int64)
+    unique_keys, first = np.unique(keys, return_index=True)
+    first_rows[unique_keys] = first
+    first_rows = first_rows.reshape(-1, n_labels)
+    if strategy.ignore_lone_unclassified:
+        classified = np.delete(counts, UNCLASSIFIED_CODE, axis=1).sum(axis=1) > 0
+        counts[classified, UNCLASSIFIED_CODE] = 0
+    scores = np.where(counts > 0, counts * (len(labels) + 1) - first_rows, -1)
+    return scores.argmax(axis=1).astype(np.int8)
+
+# Strategy class -> the segment reduction that selects the same labels as its update/finalize. Only exact classes
+# are looked up, so a subclass that changes the behavior falls back to its own update/finalize.
+SEGMENT_SELECTORS = {
+    ClosestInTimeStrategy: select_closest_in_time,
+    LatestStrategy: select_closest_in_time,
+    OracleStrategy: select_oracle,
+    AntiOracleStrategy: select_anti_oracle,
+    MajorityVoteStrategy: select_majority_vote,
+}
+
+def register_segment_selector(strategy_class, selector):
+    SEGMENT_SELECTORS[strategy_class] = selector
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from synthetic_data import make_synthetic_dataset, write_synthetic_dataset
+
+@pytest.fixture
+def synthetic_dataset():
+    return make_synthetic_dataset(n_buildings=400, max_views=3, n_dates=3, seed=1)
+
+@pytest.fixture
+def synthetic_inputs(tmp_path, synthetic_dataset):
+    # The paths of the path maps and the multiview stats file of the synthetic dataset, as main.py takes them.
+    return write_synthetic_dataset(str(tmp_path / "dataset"), *synthetic_dataset)
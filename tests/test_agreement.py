@@ -0,0 +1,41 @@
+import numpy as np
+from scipy.stats import chi2_contingency
+
+from agreement import chi_squared_tests_from_counts
+
+def scipy_chi_squared_p(table):
+    # The per table scipy call chi_squared_tests_from_counts replaces, on the labels either source uses.
+    used = table[table.sum(axis=1) > 0]
+    return chi2_contingency(used)[1]
+
+def make_tables(rng, n_tables, n_labels, n_used):
+    tables = np.zeros((n_tables, n_labels, 2), dtype=np.int64)
+    for table in tables:
+        labels = rng.choice(n_labels, size=n_used, replace=False)
+        table[labels] = rng.integers(1, 40, size=(n_used, 2))
+    return tables
+
+def test_matches_scipy_with_unused_labels():
+    rng = np.random.default_rng(0)
+    tables = np.concatenate([make_tables(rng, 50, 6, n_used) for n_used in [3, 4, 5, 6]])
+    # Labels only one source uses still count.
+    tables[::7, 0] = [0, 5]
+    expected = [scipy_chi_squared_p(table) for table in tables]
+    assert np.allclose(chi_squared_tests_from_counts(tables), expected, rtol=1e-9, atol=0)
+
+def test_matches_scipy_on_yates_corrected_tables():
+    # 2x2 tables, as given and left by dropping the unused labels, with small counts where the correction is
+    # capped by the difference to the expected counts.
+    rng = np.random.default_rng(1)
+    small_tables = make_tables(rng, 100, 2, 2)
+    small_tables[:20] = rng.integers(0, 4, size=(20, 2, 2)) + [[1, 0], [0, 1]]
+    for tables in [small_tables, make_tables(rng, 100, 6, 2)]:
+        expected = [scipy_chi_squared_p(table) for table in tables]
+        assert np.allclose(chi_squared_tests_from_counts(tables), expected, rtol=1e-9, atol=0)
+
+def test_single_used_label_has_p_one():
+    rng = np.random.default_rng(2)
+    tables = make_tables(rng, 20, 6, 1)
+    expected = [scipy_chi_squared_p(table) for table in tables]
+    assert expected == [1.0] * len(tables)
+    assert list(chi_squared_tests_from_counts(tables)) == expected
@@ -0,0 +1,13 @@
+from benchmark import DEFAULT_SIZES, get_dataset_kwargs, get_eager_imports
+from synthetic_data import make_synthetic_dataset
+
+def test_dataset_grows_with_max_views():
+    sizes = DEFAULT_SIZES["views"]
+    n_views = []
+    for size in sizes:
+        _, satellite_data, _ = make_synthetic_dataset(seed=0, **get_dataset_kwargs("views", size, sizes, {"n_buildings": 500}))
+        n_views.append(sum(len(data) for data in satellite_data.values()))
+    assert all(smaller < larger for smaller, larger in zip(n_views[:-1], n_views[1:]))
+
+def test_main_does_not_import_lazy_modules():
+    assert get_eager_imports("main") == []
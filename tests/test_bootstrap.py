@@ -0,0 +1,26 @@
+import pytest
+
+import bootstrap
+from bootstrap import bootstrap_agreement
+from strategies import select_views, get_strategies
+from utils import remove_obscured_labels, get_intersecting_ids, MultiviewIndex
+
+@pytest.fixture
+def strategy_labels(synthetic_dataset):
+    suas_data, satellite_data, multiview_df = synthetic_dataset
+    non_obscured_sat_data = remove_obscured_labels(list(satellite_data.values()))
+    valid_ids = get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
+    return select_views(list(suas_data.values()), non_obscured_sat_data, valid_ids, get_strategies(["closest_to_drone"]), MultiviewIndex(multiview_df))["closest_to_drone"]
+
+def test_chunking_does_not_change_intervals(monkeypatch, strategy_labels):
+    whole = bootstrap_agreement(*strategy_labels, n_resamples=200, seed=3)
+    monkeypatch.setattr(bootstrap, "MAX_CHUNK_ELEMENTS", 7 * len(strategy_labels[0]))
+    assert bootstrap.get_chunk_sizes(200, len(strategy_labels[0])) == [7] * 28 + [4]
+    assert bootstrap_agreement(*strategy_labels, n_resamples=200, seed=3) == whole
+    assert bootstrap_agreement(*strategy_labels, n_resamples=200, seed=3, chunk_size=1) == whole
+    assert bootstrap_agreement(*strategy_labels, n_resamples=200, seed=4) != whole
+
+def test_estimate_lies_in_interval(strategy_labels):
+    result = bootstrap_agreement(*strategy_labels, n_resamples=500, seed=0)
+    for interval in [result["disagreement"]] + list(result["underestimation"].values()):
+        assert interval["low"] <= interval["estimate"] <= interval["high"]
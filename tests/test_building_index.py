@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from constants import FILENAME, DAYS_AFTER_SUAS_ORTHO
+from utils import BuildingIndex, get_intersecting_ids, remove_obscured_labels
+from analysis import get_coincident_buildings_per_ortho, get_satellite_building_counts
+from plot import get_views_per_building
+from replicate import get_swapped_unclassified_label, get_best_oracle_label_for_building, get_best_antioracle_label_for_building, get_best_temporal_label_for_building
+
+# The list based implementations the BuildingIndex replaced, as they were, as the reference.
+
+def list_get_intersecting_ids(annotations_data1, annotations_data2):
+    bda_1_ids = [building["id"] for data in annotations_data1 for building in data]
+    bda_2_ids = [building["id"] for data in annotations_data2 for building in data]
+    return list(set(bda_1_ids) & set(bda_2_ids))
+
+def list_get_best_cheat_label_for_building(suas_data, satellite_data, valid_ids, comparison, ignore_lone_unclassified=True):
+    sUAS_labels = {}
+    for data in suas_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                sUAS_labels[building["id"]] = building["label"]
+    satellite_labels = defaultdict(lambda: None)
+    for data in satellite_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                new_label = get_swapped_unclassified_label(satellite_labels[building["id"]], building["label"], ignore_lone_unclassified)
+                if satellite_labels[building["id"]] is None:
+                    satellite_labels[building["id"]] = new_label
+                elif comparison(new_label, sUAS_labels[building["id"]]):
+                    satellite_labels[building["id"]] = new_label
+    return sUAS_labels, satellite_labels
+
+def list_get_best_temporal_label_for_building(suas_data, satellite_data, valid_ids, multiview_info, sort_strategy="abs", ignore_lone_unclassified=True):
+    sUAS_labels = {}
+    for data in suas_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                sUAS_labels[building["id"]] = building["label"]
+    satellite_labels = defaultdict(lambda: None)
+    for data in satellite_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                new_label = building["label"]
+                if satellite_labels[building["id"]]:
+                    new_label = get_swapped_unclassified_label(satellite_labels[building["id"]][0], building["label"], ignore_lone_unclassified)
+                source_filename_label = building[FILENAME].split("\\")[-1].replace(".json", "")
+                days_after_suas_ortho = multiview_info[multiview_info[FILENAME] == source_filename_label][DAYS_AFTER_SUAS_ORTHO].iloc[0]
+                if sort_strategy == "abs":
+                    days_after_suas_ortho = np.abs(days_after_suas_ortho)
+                if satellite_labels[building["id"]] is None:
+                    satellite_labels[building["id"]] = [new_label, days_after_suas_ortho]
+                elif satellite_labels[building["id"]][1] > days_after_suas_ortho:
+                    satellite_labels[building["id"]] = [new_label, days_after_suas_ortho]
+    return sUAS_labels, {bld_id: value[0] for bld_id, value in satellite_labels.items() if value is not None}
+
+def list_get_coincident_buildings_per_ortho(valid_ids, suas_data):
+    return {filename: sum(1 for building in data if building["id"] in valid_ids) for filename, data in suas_data.items()}
+
+def list_get_satellite_building_counts(satellite_data, valid_ids):
+    return sum(1 for data in satellite_data for building in data if building["id"] in valid_ids)
+
+def list_get_views_per_building(satellite_data, valid_ids):
+    views_per_building = defaultdict(lambda: 0)
+    for data in satellite_data:
+        for building in data:
+            if building["id"] in valid_ids:
+                views_per_building[building["id"]] += 1
+    return list(views_per_building.values())
+
+@pytest.fixture
+def inputs(synthetic_dataset):
+    suas_data, satellite_data, multiview_df = synthetic_dataset
+    non_obscured_sat_data = remove_obscured_labels(list(satellite_data.values()))
+    valid_ids = list_get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
+    return suas_data, non_obscured_sat_data, multiview_df, valid_ids
+
+def test_building_index_membership_and_positions():
+    index = BuildingIndex(["b", "a", "c", "a"])
+    assert list(index) == ["a", "b", "c"]
+    assert "a" in index and "d" not in index
+    assert [index.position(bld_id) for bld_id in ["a", "b", "c"]] == [0, 1, 2]
+    assert index.get("d") is None
+
+def test_intersecting_ids_match_lists(inputs):
+    suas_data, non_obscured_sat_data, _, valid_ids = inputs
+    assert sorted(get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)) == sorted(valid_ids)
+
+def test_cheat_labels_match_lists(inputs):
+    suas_data, non_obscured_sat_data, _, valid_ids = inputs
+    suas_list = list(suas_data.values())
+    oracle = get_best_oracle_label_for_building(suas_list, non_obscured_sat_data, valid_ids)
+    antioracle = get_best_antioracle_label_for_building(suas_list, non_obscured_sat_data, valid_ids)
+    expected_oracle = list_get_best_cheat_label_for_building(suas_list, non_obscured_sat_data, valid_ids, lambda a, b: a == b)
+    expected_antioracle = list_get_best_cheat_label_for_building(suas_list, non_obscured_sat_data, valid_ids, lambda a, b: a != b)
+    assert (oracle[0], dict(oracle[1])) == (expected_oracle[0], dict(expected_oracle[1]))
+    assert (antioracle[0], dict(antioracle[1])) == (expected_antioracle[0], dict(expected_antioracle[1]))
+
+@pytest.mark.parametrize("sort_strategy", ["abs", "real"])
+def test_temporal_labels_match_lists(inputs, sort_strategy):
+    suas_data, non_obscured_sat_data, multiview_df, valid_ids = inputs
+    suas_list = list(suas_data.values())
+    result = get_best_temporal_label_for_building(suas_list, non_obscured_sat_data, valid_ids, multiview_df, sort_strategy)
+    assert result == list_get_best_temporal_label_for_building(suas_list, non_obscured_sat_data, valid_ids, multiview_df, sort_strategy)
+
+def test_counts_match_lists(inputs):
+    suas_data, non_obscured_sat_data, _, valid_ids = inputs
+    assert get_coincident_buildings_per_ortho(valid_ids, suas_data) == list_get_coincident_buildings_per_ortho(valid_ids, suas_data)
+    assert get_satellite_building_counts(non_obscured_sat_data, valid_ids) == list_get_satellite_building_counts(non_obscured_sat_data, valid_ids)
+    assert get_views_per_building(non_obscured_sat_data, valid_ids) == list_get_views_per_building(non_obscured_sat_data, valid_ids)
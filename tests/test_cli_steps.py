@@ -0,0 +1,38 @@
+import os
+import json
+import argparse
+
+import cli
+import main
+
+def get_arguments(inputs, output_folder):
+    arguments = ["--output_folder_path", output_folder]
+    for name, path in inputs.items():
+        arguments += ["--" + name, path]
+    return arguments
+
+def load_records(output_folder):
+    with open(os.path.join(output_folder, "results.json")) as f:
+        return json.load(f)["results"]
+
+def test_steps_add_up_to_one_run(tmp_path, synthetic_inputs):
+    steps_folder, run_folder = str(tmp_path / "steps"), str(tmp_path / "run")
+    for command in ["counts", "strategies", "tests"]:
+        cli.run_pipeline_command(command, get_arguments(synthetic_inputs, steps_folder))
+
+    parser = argparse.ArgumentParser()
+    main.add_arguments(parser)
+    main.run(parser.parse_args(get_arguments(synthetic_inputs, run_folder) + ["--stages", "counts,strategies,tests"]), parser)
+
+    records = load_records(steps_folder)
+    assert records == load_records(run_folder)
+    assert {"coincident_buildings", "coincident_views", "chi_squared_p", "disagreement_probability"} <= set(record["metric"] for record in records)
+
+def test_later_step_keeps_earlier_results(tmp_path, synthetic_inputs):
+    output_folder = str(tmp_path / "steps")
+    cli.run_pipeline_command("counts", get_arguments(synthetic_inputs, output_folder))
+    counts_records = load_records(output_folder)
+    cli.run_pipeline_command("tests", get_arguments(synthetic_inputs, output_folder))
+    records = load_records(output_folder)
+    assert counts_records == records[:len(counts_records)]
+    assert len(records) > len(counts_records)
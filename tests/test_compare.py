@@ -0,0 +1,29 @@
+import json
+
+from loader import load_annotations, SharedAnnotationLoader
+from compare import get_label_changes, analyze_revisions
+
+def test_coincidence_changes_are_not_label_changes():
+    labels_before = {"sUAS": {"a": "destroyed", "b": "no damage"}, "oracle": {"a": "destroyed", "b": "minor damage"}}
+    labels_after = {"sUAS": {"a": "major damage", "c": "no damage"}, "oracle": {"a": "destroyed", "c": "no damage"}}
+    changes = [(row["source"], row["id"], row["change"]) for row in get_label_changes(labels_before, labels_after)]
+    assert changes == [("sUAS", "a", "label"), ("sUAS", "b", "no_longer_coincident"), ("sUAS", "c", "became_coincident"),
+                       ("oracle", "b", "no_longer_coincident"), ("oracle", "c", "became_coincident")]
+
+def test_shared_loader_counts_under_threads(synthetic_inputs):
+    path_map = json.load(open(synthetic_inputs["satellite_annotations_path_map"]))
+    shared_loader = SharedAnnotationLoader()
+    for _ in range(3):
+        load_annotations(path_map, "Satellite", workers=16, shared_loader=shared_loader)
+    assert shared_loader.n_files == 3 * len(path_map)
+    assert shared_loader.n_parsed == len(set(open(path, "rb").read() for path in path_map.values()))
+
+def test_revisions_in_worker_processes_match(synthetic_inputs):
+    revision_paths = [synthetic_inputs[name] for name in ["drone_annotations_path_map", "satellite_annotations_path_map", "multiview_stats_file_path"]]
+    revisions = [[name] + revision_paths for name in ["r1", "r2", "r3"]]
+    metrics, labels, (n_files, n_parsed) = analyze_revisions(revisions, workers=1)
+    pooled_metrics, pooled_labels, (pooled_n_files, pooled_n_parsed) = analyze_revisions(revisions, workers=3)
+    assert metrics.equals(pooled_metrics)
+    assert labels == pooled_labels
+    # The revisions share every file, only this process' loader parses them once.
+    assert n_files == pooled_n_files == pooled_n_parsed == 3 * n_parsed
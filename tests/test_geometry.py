@@ -0,0 +1,13 @@
+from geometry import GEOMETRY_FIELD, UNMATCHED_ID_PREFIX, remap_building_ids
+
+def make_building(bld_id, x, y, size=1.0):
+    ring = [{"lon": x, "lat": y}, {"lon": x + size, "lat": y}, {"lon": x + size, "lat": y + size}, {"lon": x, "lat": y + size}]
+    return {"id": bld_id, "label": "no damage", GEOMETRY_FIELD: ring}
+
+def test_unmatched_satellite_ids_do_not_collide():
+    suas_data = {"suas": [make_building("1", 0, 0), make_building("2", 10, 0)]}
+    # "a" lies inside sUAS building "1", the second satellite building matches nothing but has sUAS building "2"'s id.
+    satellite_data = {"satellite": [make_building("a", 0.1, 0.1, 0.5), make_building("2", 50, 50)]}
+    assert remap_building_ids(suas_data, satellite_data, use_shapely=False) == 1
+    assert [building["id"] for building in satellite_data["satellite"]] == ["1", UNMATCHED_ID_PREFIX + "2"]
+    assert all(GEOMETRY_FIELD not in building for data in [suas_data["suas"], satellite_data["satellite"]] for building in data)
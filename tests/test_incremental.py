@@ -0,0 +1,48 @@
+import json
+import argparse
+
+import pandas as pd
+
+import main
+from constants import BDA_DAMAGE_CLASSES
+from incremental import IncrementalAggregator
+from loader import load_annotation_file
+from results import Results
+from utils import MultiviewIndex
+
+def get_sorted_records(records):
+    # The per disaster counts are recorded in the order the orthos appeared, which differs between the two.
+    return sorted(records, key=lambda record: json.dumps(record, sort_keys=True))
+
+def test_ingested_files_match_batch_run(tmp_path, synthetic_inputs):
+    path_maps = {kind: json.load(open(synthetic_inputs[name])) for kind, name in [("suas", "drone_annotations_path_map"), ("satellite", "satellite_annotations_path_map")]}
+    aggregator = IncrementalAggregator(MultiviewIndex(pd.read_csv(synthetic_inputs["multiview_stats_file_path"])))
+    for kind in ["satellite", "suas"]:
+        for ortho, path in path_maps[kind].items():
+            aggregator.ingest(kind, ortho, load_annotation_file(path)[0])
+
+    # Rewrite the last satellite file, relabel some of its buildings and drop one, and ingest it again. It stays
+    # last in the path map, so the batch run sees the files in the order they were ingested.
+    ortho, path = list(path_maps["satellite"].items())[-1]
+    buildings = json.load(open(path))
+    for i, building in enumerate(buildings[1:]):
+        if i % 3 == 0:
+            building["label"] = BDA_DAMAGE_CLASSES[(BDA_DAMAGE_CLASSES.index(building["label"]) + 1) % len(BDA_DAMAGE_CLASSES)]
+    with open(path, "w") as f:
+        json.dump(buildings[1:], f)
+    aggregator.ingest("satellite", ortho, load_annotation_file(path)[0])
+
+    results = Results()
+    aggregator.report(results)
+
+    output_folder = str(tmp_path / "batch")
+    arguments = ["--output_folder_path", output_folder, "--stages", "counts,tests,temporal"]
+    for name, path in synthetic_inputs.items():
+        arguments += ["--" + name, path]
+    parser = argparse.ArgumentParser()
+    main.add_arguments(parser)
+    main.run(parser.parse_args(arguments), parser)
+    with open(output_folder + "/results.json") as f:
+        batch_records = json.load(f)["results"]
+
+    assert get_sorted_records(json.loads(json.dumps(results.records))) == get_sorted_records(batch_records)
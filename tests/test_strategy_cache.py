@@ -0,0 +1,54 @@
+from utils import MultiviewIndex, get_intersecting_ids, remove_obscured_labels
+from strategies import ViewSelectionStrategy, select_views, get_strategies, STRATEGIES
+from strategy_cache import StrategyCache
+
+class NthViewStrategy(ViewSelectionStrategy):
+    # A strategy with a constructor parameter of its own, which the default key does not know about.
+    def __init__(self, n, ignore_lone_unclassified=True):
+        super().__init__(ignore_lone_unclassified)
+        self.n = n
+
+    def update(self, state, label, suas_label, days):
+        return (state or []) + [label]
+
+    def finalize(self, state):
+        return state[min(self.n, len(state) - 1)]
+
+def get_inputs(synthetic_dataset):
+    suas_data, satellite_data, multiview_df = synthetic_dataset
+    suas_data, satellite_data = list(suas_data.values()), list(satellite_data.values())
+    return suas_data, satellite_data, MultiviewIndex(multiview_df)
+
+def test_cached_selections_match_select_views(synthetic_dataset):
+    suas_data, satellite_data, multiview_index = get_inputs(synthetic_dataset)
+    non_obscured_sat_data = remove_obscured_labels(satellite_data)
+    valid_ids = get_intersecting_ids(suas_data, non_obscured_sat_data)
+    cache = StrategyCache()
+    for ignore_lone_unclassified in [True, False]:
+        strategies = get_strategies(list(STRATEGIES.keys()), ignore_lone_unclassified)
+        expected = select_views(suas_data, non_obscured_sat_data, valid_ids, strategies, multiview_index)
+        for _ in range(2):
+            assert cache.select_views("dataset", suas_data, non_obscured_sat_data, valid_ids, strategies, multiview_index) == expected
+
+def test_unknown_parameters_are_not_memoized(synthetic_dataset):
+    suas_data, satellite_data, multiview_index = get_inputs(synthetic_dataset)
+    non_obscured_sat_data = remove_obscured_labels(satellite_data)
+    valid_ids = get_intersecting_ids(suas_data, non_obscured_sat_data)
+    cache = StrategyCache()
+    for n in [0, 1, 2]:
+        strategies = {"nth": NthViewStrategy(n)}
+        expected = select_views(suas_data, non_obscured_sat_data, valid_ids, strategies)
+        assert cache.select_views("dataset", suas_data, non_obscured_sat_data, valid_ids, strategies) == expected
+
+def test_differently_filtered_inputs_are_not_shared(synthetic_dataset):
+    suas_data, satellite_data, multiview_index = get_inputs(synthetic_dataset)
+    cache = StrategyCache()
+    strategies = get_strategies(["majority_vote"], ignore_lone_unclassified=False)
+    selections = []
+    for ignore_lone_unclassified in [False, True]:
+        filtered = remove_obscured_labels(satellite_data, ignore_lone_unclassified)
+        valid_ids = get_intersecting_ids(suas_data, filtered)
+        expected = select_views(suas_data, filtered, valid_ids, strategies)
+        selections.append(cache.select_views("dataset", suas_data, filtered, valid_ids, strategies))
+        assert selections[-1] == expected
+    assert selections[0] != selections[1]
@@ -0,0 +1,36 @@
+import pytest
+
+from constants import OBSCURED, UNCLASSIFIED, FILENAME
+from utils import remove_obscured_labels, get_view_mask, get_intersecting_ids, MultiviewIndex
+from stratify import run_stratified_analysis
+
+def make_views(labels_per_ortho):
+    return [[{"id": bld_id, "label": label, FILENAME: "f"} for bld_id, label in views] for views in labels_per_ortho]
+
+def filter_by_copy(labeled_data, ignore_obscured, ignore_lone_unclassified):
+    kept = [[building for building in data if not (ignore_obscured and building["label"] == OBSCURED)] for data in labeled_data]
+    if ignore_lone_unclassified:
+        classified = set(building["id"] for data in kept for building in data if building["label"] != UNCLASSIFIED)
+        kept = [[building for building in data if not (building["label"] == UNCLASSIFIED and building["id"] in classified)] for data in kept]
+    return kept
+
+@pytest.mark.parametrize("ignore_obscured", [True, False])
+@pytest.mark.parametrize("ignore_lone_unclassified", [True, False])
+def test_view_mask_matches_copies(synthetic_dataset, ignore_obscured, ignore_lone_unclassified):
+    satellite_data = list(synthetic_dataset[1].values())
+    mask = get_view_mask(satellite_data, ignore_obscured, ignore_lone_unclassified)
+    flat = [building for data in satellite_data for building in data]
+    expected = [building for data in filter_by_copy(satellite_data, ignore_obscured, ignore_lone_unclassified) for building in data]
+    assert [building for building, keep in zip(flat, mask) if keep] == expected
+
+def test_lone_unclassified_views_are_kept_alone():
+    satellite_data = make_views([[("a", UNCLASSIFIED), ("b", UNCLASSIFIED), ("c", OBSCURED)], [("a", "destroyed"), ("c", UNCLASSIFIED)]])
+    filtered = [list(data) for data in remove_obscured_labels(satellite_data, ignore_lone_unclassified=True)]
+    assert [[building["id"] for building in data] for data in filtered] == [["b"], ["a", "c"]]
+
+@pytest.mark.parametrize("ignore_lone_unclassified", [True, False])
+def test_stratified_analysis_uses_the_pooled_views(synthetic_dataset, ignore_lone_unclassified):
+    suas_data, satellite_data, multiview_df = synthetic_dataset
+    valid_ids = get_intersecting_ids(list(suas_data.values()), remove_obscured_labels(list(satellite_data.values()), ignore_lone_unclassified))
+    table = run_stratified_analysis(suas_data, satellite_data, MultiviewIndex(multiview_df), "ortho", ["oracle"], ignore_lone_unclassified=ignore_lone_unclassified)
+    assert table[table["metric"] == "disagreement_probability"]["n"].sum() == len(valid_ids)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from synthetic_data import make_synthetic_dataset
+from utils import remove_obscured_labels, get_intersecting_ids, MultiviewIndex
+from strategies import STRATEGIES, select_views, get_strategies
+from replicate import compute_paired_difference_views, group_buildings_temporally
+from view_table import ViewTable
+
+# Few dates and buildings with many views, so that strategies often break ties.
+DATASETS = [{"n_buildings": 300, "max_views": 3, "n_dates": 3, "seed": seed} for seed in range(3)] + \
+           [{"n_buildings": 200, "max_views": 6, "n_dates": 6, "agreement": 0.3, "obscured_rate": 0.2, "seed": seed} for seed in range(3, 6)]
+
+def prepare(dataset_kwargs):
+    suas_data, satellite_data, multiview_df = make_synthetic_dataset(**dataset_kwargs)
+    multiview_index = MultiviewIndex(multiview_df)
+    non_obscured_sat_data = remove_obscured_labels(list(satellite_data.values()))
+    valid_ids = get_intersecting_ids(list(suas_data.values()), non_obscured_sat_data)
+    return list(suas_data.values()), non_obscured_sat_data, valid_ids, multiview_index
+
+@pytest.mark.parametrize("dataset_kwargs", DATASETS)
+@pytest.mark.parametrize("ignore_lone_unclassified", [True, False])
+def test_segment_selectors_match_strategies(dataset_kwargs, ignore_lone_unclassified):
+    suas_data, non_obscured_sat_data, valid_ids, multiview_index = prepare(dataset_kwargs)
+    views = ViewTable.from_annotations(non_obscured_sat_data, multiview_index)
+    names = list(STRATEGIES.keys())
+    expected = select_views(suas_data, non_obscured_sat_data, valid_ids, get_strategies(names, ignore_lone_unclassified), multiview_index)
+    selected = views.select_views(suas_data, valid_ids, get_strategies(names, ignore_lone_unclassified))
+    for name in names:
+        assert selected[name] == expected[name], name
+
+@pytest.mark.parametrize("dataset_kwargs", DATASETS)
+@pytest.mark.parametrize("field", ["days", "off_nadir", "sun_elevation"])
+def test_paired_views_match_temporal_groups(dataset_kwargs, field):
+    _, non_obscured_sat_data, _, multiview_index = prepare(dataset_kwargs)
+    views = ViewTable.from_annotations(non_obscured_sat_data, multiview_index)
+    temporal_views = group_buildings_temporally(non_obscured_sat_data, multiview_index)
+    for ignore_unclassified in [True, False]:
+        expected = compute_paired_difference_views(temporal_views, field, ignore_unclassified)
+        paired = compute_paired_difference_views(views, field, ignore_unclassified)
+        for expected_dist, dist in zip(expected, paired):
+            assert np.array_equal(np.asarray(expected_dist), np.asarray(dist))